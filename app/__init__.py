@@ -3,4 +3,4 @@ from flask import Flask
 
 app = Flask(__name__)
 
-from app import main, doogle, settings, resend, manifest
\ No newline at end of file
+from app import main, doogle, settings, resend, manifest, jobs, opencti, lookup, watcher, metrics, profiling
\ No newline at end of file
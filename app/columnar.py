@@ -0,0 +1,181 @@
+# CTIDashy_Flask/app/columnar.py
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from operator import attrgetter
+from datetime import datetime, time, timedelta
+import numpy as np
+import pandas as pd
+from app.config import CACHE_DIR
+from app.dates import manifest_format, parse_datetime, to_epoch
+from app.ingest import MANIFEST_COLUMNS, ManifestRow, read_rows
+from app.metrics import inc
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# One sub-directory of .npy files per manifest version, named after the manifest's fingerprint
+COLUMNAR_DIR = os.path.join(CACHE_DIR, 'columnar')
+
+# Bumped whenever the on-disk layout changes so stale caches are rebuilt
+CACHE_VERSION = 2
+
+# Epoch value for DateTime strings that could not be parsed
+NO_DATE = np.iinfo(np.int64).min
+
+# Stored as UTF-8 byte strings, decoded only for rows that are returned
+TEXT_COLUMNS = ['Filename', 'MD5Hash', 'DateTime', 'FileSize', 'FlowUUID', 'Resend']
+
+_loaded = {}
+_lock = threading.Lock()
+
+def md5_digests(values):
+    """Convert MD5 hex strings to 16-byte digests (dtype S16) for compact set membership"""
+    values = pd.Series(values, dtype=object).fillna('').astype(str).str.strip().str.lower()
+    valid = values.str.fullmatch(r'[0-9a-f]{32}')
+    digests = np.empty(len(values), dtype='S16')
+    if valid.all():
+        digests[:] = np.frombuffer(bytes.fromhex(''.join(values)), dtype='S16')
+    else:
+        # Malformed hashes still need to compare equal to themselves, so digest the raw text
+        for i, (value, ok) in enumerate(zip(values, valid)):
+            digests[i] = bytes.fromhex(value) if ok else hashlib.md5(b'invalid:' + value.encode()).digest()
+    return digests
+
+def parse_epochs(values, fmt=None):
+    """Epoch seconds for each DateTime string, parsing every distinct string only once"""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=False)
+    parsed = np.array([
+        to_epoch(dt) if dt else NO_DATE
+        for dt in (parse_datetime(value, fmt) for value in uniques)
+    ], dtype=np.int64)
+    return parsed[codes] if len(parsed) else np.empty(0, dtype=np.int64)
+
+class ManifestColumns:
+    """Column arrays for one manifest, memory-mapped from the sidecar cache"""
+
+    def __init__(self, name, arrays, feeds):
+        self.name = name
+        self.md5 = arrays['md5']
+        self.epoch = arrays['epoch']
+        self.feed_codes = arrays['feed_codes']
+        self.feeds = feeds
+        self.text = {column: arrays[column] for column in TEXT_COLUMNS}
+
+    def __len__(self):
+        return len(self.md5)
+
+    def rows(self, indices=None):
+        """Materialise ManifestRow records, only for the indices asked for"""
+        if indices is None:
+            indices = np.arange(len(self))
+        if len(indices) == 0:
+            return []
+        values = {column: np.char.decode(self.text[column][indices], 'utf-8').tolist() for column in TEXT_COLUMNS}
+        values['CTIfeed'] = [self.feeds[code] for code in self.feed_codes[indices].tolist()]
+        return [ManifestRow(*row) for row in zip(*(values[column] for column in MANIFEST_COLUMNS))]
+
+def filter_indices(columns, date_from=None, date_to=None, feed_filter=''):
+    """Row indices matching an inclusive date range and a case-insensitive feed substring"""
+    mask = np.ones(len(columns), dtype=bool)
+
+    if feed_filter:
+        needle = feed_filter.lower()
+        codes = [code for code, feed in enumerate(columns.feeds) if needle in feed.lower()]
+        mask &= np.isin(columns.feed_codes, np.array(codes, dtype=np.int32))
+
+    if date_from or date_to:
+        epoch = columns.epoch
+        mask &= epoch != NO_DATE
+        if date_from:
+            mask &= epoch >= to_epoch(datetime.combine(date_from, time.min))
+        if date_to:
+            mask &= epoch < to_epoch(datetime.combine(date_to + timedelta(days=1), time.min))
+
+    return np.flatnonzero(mask)
+
+def _cache_path(file_path, stat):
+    key = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+    return os.path.join(COLUMNAR_DIR, key), f"v{CACHE_VERSION}-{stat.st_size}-{stat.st_mtime_ns}"
+
+def _encode(values):
+    encoded = [value.encode('utf-8') for value in values]
+    width = max((len(value) for value in encoded), default=0) or 1
+    return np.array(encoded, dtype=f'S{width}')
+
+def _build(file_path, stat, target_dir):
+    rows = read_rows(file_path)
+    values = {column: list(map(attrgetter(column), rows)) for column in MANIFEST_COLUMNS}
+    date_format = manifest_format(file_path, stat, values['DateTime'])
+
+    feed_codes, feeds = pd.factorize(pd.Series(values['CTIfeed'], dtype=object), use_na_sentinel=False)
+    arrays = {
+        'md5': md5_digests(values['MD5Hash']),
+        'epoch': parse_epochs(values['DateTime'], date_format),
+        'feed_codes': feed_codes.astype(np.int32)
+    }
+    for column in TEXT_COLUMNS:
+        arrays[column] = _encode(values[column])
+
+    tmp_dir = f"{target_dir}.{os.getpid()}.{threading.get_ident()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    for column, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{column}.npy"), array)
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({'path': file_path, 'rows': len(rows), 'feeds': [str(feed) for feed in feeds]}, f)
+
+    try:
+        os.rename(tmp_dir, target_dir)
+    except OSError:
+        # Another worker finished the same manifest first, its copy is identical
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    logger.info(f"Wrote columnar cache for {file_path} ({len(rows)} rows)")
+
+def _open(name, target_dir):
+    with open(os.path.join(target_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    arrays = {
+        column: np.load(os.path.join(target_dir, f"{column}.npy"), mmap_mode='r')
+        for column in ['md5', 'epoch', 'feed_codes'] + TEXT_COLUMNS
+    }
+    return ManifestColumns(name, arrays, meta['feeds'])
+
+def _remove_stale(base_dir, keep):
+    try:
+        for entry in os.listdir(base_dir):
+            if entry != keep and not entry.endswith('.tmp'):
+                shutil.rmtree(os.path.join(base_dir, entry), ignore_errors=True)
+    except OSError:
+        pass
+
+def load_columns(file_path):
+    """Columns of a manifest, building the sidecar cache the first time a file version is read"""
+    stat = os.stat(file_path)
+    base_dir, version = _cache_path(file_path, stat)
+    target_dir = os.path.join(base_dir, version)
+    key = (file_path, version)
+
+    with _lock:
+        columns = _loaded.get(key)
+    if columns is not None:
+        inc('ctidashy_cache_requests_total', cache='columnar', result='hit')
+        return columns
+
+    if not os.path.exists(os.path.join(target_dir, 'meta.json')):
+        inc('ctidashy_cache_requests_total', cache='columnar', result='miss')
+        os.makedirs(base_dir, exist_ok=True)
+        _build(file_path, stat, target_dir)
+        _remove_stale(base_dir, version)
+    else:
+        # Built by another worker or an earlier run, only mapped into memory here
+        inc('ctidashy_cache_requests_total', cache='columnar', result='disk')
+
+    columns = _open(os.path.basename(file_path), target_dir)
+    with _lock:
+        for stale in [k for k in _loaded if k[0] == file_path]:
+            del _loaded[stale]
+        _loaded[key] = columns
+    return columns
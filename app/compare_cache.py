@@ -0,0 +1,191 @@
+# CTIDashy_Flask/app/compare_cache.py
+import os
+import json
+import time
+import zlib
+import hashlib
+import logging
+import threading
+from app.config import CACHE_DIR, load_config
+from app.db import connect
+from app.metrics import inc
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Shared by every worker and compare process
+CACHE_FILE = os.path.join(CACHE_DIR, 'compare_cache.db')
+
+# Bumped when the shape of a stored result changes, so old entries stop matching
+CACHE_VERSION = 2
+
+# Chunks left behind by a store that never finished are removed after this many seconds
+ORPHAN_SECONDS = 3600
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def fingerprint(file_path):
+    stat = os.stat(file_path)
+    return [os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns]
+
+class CompareCache:
+    """Compare-all differences per low/high manifest pair, in a SQLite file with LRU eviction.
+
+    Entries are keyed on the path, size and mtime of both manifests, so a pair is only
+    compared again once either file changes; the entry for the previous version of the
+    pair is dropped when the new one is stored. Differences are kept as chunks of rows,
+    each a (row count, JSON text) pair stored zlib-compressed in its own table row, so
+    storing or reading an entry never holds all of it in memory or decodes it. The
+    least recently used entries are evicted beyond max_entries or max_bytes of
+    compressed chunks.
+    """
+
+    def __init__(self, max_entries=500, max_bytes=512 * 1024 * 1024, path=CACHE_FILE):
+        self.settings = (max_entries, max_bytes, path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.path = path
+        conn = connect(self.path)
+        try:
+            conn.executescript("""
+                DROP TABLE IF EXISTS entries;
+                CREATE TABLE IF NOT EXISTS pairs (
+                    key TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    chunks INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    stored_at REAL NOT NULL,
+                    accessed REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS pairs_accessed ON pairs(accessed);
+                CREATE INDEX IF NOT EXISTS pairs_pair ON pairs(source, target);
+                CREATE TABLE IF NOT EXISTS chunks (
+                    key TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    written REAL NOT NULL,
+                    rows INTEGER NOT NULL,
+                    value BLOB NOT NULL,
+                    PRIMARY KEY (key, seq)
+                );
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def key(self, source_file, target_file):
+        """Cache key for the current versions of both files; raises OSError if one is missing"""
+        parts = [CACHE_VERSION] + fingerprint(source_file) + fingerprint(target_file)
+        return hashlib.sha1(json.dumps(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """An iterator over the stored (row count, JSON text) chunks for key, or None on a miss"""
+        conn = connect(self.path)
+        try:
+            found = conn.execute('UPDATE pairs SET accessed = ? WHERE key = ?', (time.time(), key)).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        inc('ctidashy_cache_requests_total', cache='compare', result='hit' if found else 'miss')
+        if not found:
+            return None
+        return self._read(key)
+
+    def _read(self, key):
+        # Connecting on the first chunk, an iterator dropped unread holds no connection
+        conn = connect(self.path)
+        try:
+            # One read transaction, so an eviction meanwhile cannot leave out some of the chunks
+            conn.execute('BEGIN')
+            row = conn.execute('SELECT chunks FROM pairs WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                raise LookupError(f"Compare result {key} was evicted while being read")
+            for rows, value in conn.execute('SELECT rows, value FROM chunks WHERE key = ? AND seq < ? ORDER BY seq',
+                                            (key, row[0])):
+                yield rows, zlib.decompress(value).decode('utf-8')
+            conn.rollback()
+        finally:
+            conn.close()
+
+    def store(self, key, source_file, target_file, chunks):
+        """Pass (row count, JSON text) chunks through, storing them under key.
+
+        Each chunk is written as it goes by and the entry becomes visible once chunks
+        are exhausted; an entry that is abandoned part way or grows past max_bytes is
+        not stored.
+        """
+        conn = connect(self.path)
+        stored = 0
+        size = 0
+        try:
+            for rows, text in chunks:
+                if size <= self.max_bytes:
+                    value = zlib.compress(text.encode('utf-8'), 3)
+                    size += len(value)
+                    conn.execute('INSERT OR REPLACE INTO chunks (key, seq, written, rows, value) '
+                                 'VALUES (?, ?, ?, ?, ?)', (key, stored, time.time(), rows, value))
+                    conn.commit()
+                    stored += 1
+                yield rows, text
+
+            if size > self.max_bytes:
+                logger.info(f"Compare result for {source_file} is too big to cache (over {self.max_bytes} bytes)")
+                self._drop(conn, [key])
+                conn.commit()
+                return
+            self._finish(conn, key, source_file, target_file, stored, size)
+        finally:
+            conn.close()
+
+    def _finish(self, conn, key, source_file, target_file, stored, size):
+        source, target = os.path.abspath(source_file), os.path.abspath(target_file)
+        now = time.time()
+        self._drop(conn, [row[0] for row in conn.execute(
+            'SELECT key FROM pairs WHERE source = ? AND target = ? AND key != ?', (source, target, key))])
+        conn.execute(
+            'INSERT OR REPLACE INTO pairs (key, source, target, chunks, size, stored_at, accessed) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (key, source, target, stored, size, now, now)
+        )
+        evicted = [row[0] for row in conn.execute(
+            'SELECT key FROM pairs ORDER BY accessed DESC LIMIT -1 OFFSET ?', (self.max_entries,))]
+        self._drop(conn, evicted)
+        # Running total from the most recently used entry down, anything past max_bytes goes
+        over = [row[0] for row in conn.execute(
+            'SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY accessed DESC, key) AS total FROM pairs) '
+            'WHERE total > ?', (self.max_bytes,))]
+        self._drop(conn, over)
+        conn.execute('DELETE FROM chunks WHERE written < ? AND key NOT IN (SELECT key FROM pairs)',
+                     (now - ORPHAN_SECONDS,))
+        conn.commit()
+        if evicted or over:
+            logger.debug(f"Evicted {len(evicted) + len(over)} compare results")
+
+    def _drop(self, conn, keys):
+        conn.executemany('DELETE FROM pairs WHERE key = ?', [(key,) for key in keys])
+        conn.executemany('DELETE FROM chunks WHERE key = ?', [(key,) for key in keys])
+
+    def stats(self):
+        conn = connect(self.path)
+        try:
+            entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pairs').fetchone()
+        finally:
+            conn.close()
+        return {'entries': entries, 'bytes': size, 'max_entries': self.max_entries, 'max_bytes': self.max_bytes}
+
+def get_compare_cache(config=None):
+    """This process's compare cache, or None when compare_cache_enabled is off"""
+    global _cache
+    config = config or load_config()
+    if not config.get('compare_cache_enabled', True):
+        return None
+    settings = (
+        max(1, int(config.get('compare_cache_size', 500))),
+        int(max(1, float(config.get('compare_cache_max_mb', 512))) * 1024 * 1024),
+        CACHE_FILE
+    )
+    with _cache_lock:
+        if _cache is None or _cache.settings != settings:
+            _cache = CompareCache(*settings)
+        return _cache
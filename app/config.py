@@ -1,8 +1,75 @@
 import json
 import os
+import time
+import logging
 import platform
+import threading
 
 CONFIG_FILE = os.path.join(os.path.dirname(__file__), 'settings', 'config.json')
+# Working data (indexes, caches) that can be rebuilt from the manifests at any time
+CACHE_DIR = os.path.join(os.path.dirname(__file__), 'cache')
+# State that cannot be rebuilt, such as the resend ledger
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+# Seconds between checks of config.json for changes made by another worker or by hand
+CONFIG_CHECK_INTERVAL = 1.0
+
+PATH_FIELDS = [
+    'resend_manifest_dir',
+    'low_side_manifest_dir',
+    'high_side_manifest_dir',
+    'resend_folder'
+]
+
+DEFAULT_CONFIG = {
+    'opencti_url': '',
+    'opencti_api': '',
+    'resend_manifest_dir': '',
+    'low_side_manifest_dir': '',
+    'high_side_manifest_dir': '',
+    'resend_folder': '',
+    'manifest_enabled': True,
+    'resend_enabled': True,
+    'compare_streaming_threshold_mb': 256,
+    'manifest_cache_max_mb': 128,
+    'compare_workers': 4,
+    'compare_executor': 'thread',
+    'job_workers': 2,
+    'reconcile_grace_days': 3,
+    'opencti_pool_size': 10,
+    'opencti_retries': 2,
+    'opencti_backoff': 0.5,
+    'opencti_connect_timeout': 5,
+    'opencti_timeout': 30,
+    'search_cache_size': 1000,
+    'search_cache_ttl': 300,
+    'search_cache_stale_ttl': 600,
+    'search_cache_backend': 'memory',
+    'opencti_instances': [],
+    'search_target_timeout': 15,
+    'search_fanout_workers': 8,
+    'lookup_batch_size': 50,
+    'lookup_max_hashes': 50000,
+    'resend_write_workers': 1,
+    'resend_queue_mode': 'per_hash',
+    'resend_batch_max_records': 10000,
+    'resend_dedupe_days': 7,
+    'resend_trusted_proxies': [],
+    'watcher_enabled': True,
+    'watcher_poll_interval': 5,
+    'profiling_enabled': False,
+    'profiling_max_profiles': 50,
+    'compare_cache_enabled': True,
+    'compare_cache_size': 500,
+    'compare_cache_max_mb': 512
+}
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Parsed config shared by every request in this process, keyed on the file's identity
+_cache = {'path': None, 'signature': None, 'config': None, 'checked': 0.0}
+_cache_lock = threading.Lock()
 
 def normalize_path(path):
     if not path:
@@ -23,56 +90,78 @@ def normalize_path(path):
     # Convert to OS-specific format
     return os.path.normpath(normalized)
 
+def _signature(stat):
+    # os.replace gives the file a new inode, so a rewrite within the same mtime tick is still seen
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+def _read_config():
+    with open(CONFIG_FILE, 'r') as f:
+        config = json.load(f)
+
+    # Normalize path fields
+    for field in PATH_FIELDS:
+        if field in config:
+            config[field] = normalize_path(config[field])
+
+    # Merge with default config
+    return {**DEFAULT_CONFIG, **config}
+
+def _store(signature, config):
+    _cache.update(path=CONFIG_FILE, signature=signature, config=config, checked=time.monotonic())
+
 # app/config.py
 def load_config():
-    default_config = {
-        'opencti_url': '',
-        'opencti_api': '',
-        'resend_manifest_dir': '',
-        'low_side_manifest_dir': '',
-        'high_side_manifest_dir': '',
-        'resend_folder': '',
-        'manifest_enabled': True,
-        'resend_enabled': True
-    }
+    """Current settings, re-read only when config.json has changed.
 
-    os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
+    The file is stat'ed at most once per CONFIG_CHECK_INTERVAL, so every worker
+    picks up a save within that interval. Callers get their own (shallow) copy.
+    """
+    with _cache_lock:
+        cached = _cache['config'] is not None and _cache['path'] == CONFIG_FILE
+        if cached and time.monotonic() - _cache['checked'] < CONFIG_CHECK_INTERVAL:
+            return dict(_cache['config'])
 
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, 'r') as f:
-            config = json.load(f)
-
-            # Normalize path fields
-            path_fields = [
-                'resend_manifest_dir',
-                'low_side_manifest_dir',
-                'high_side_manifest_dir',
-                'resend_folder'
-            ]
-            
-            for field in path_fields:
-                if field in config:
-                    config[field] = normalize_path(config[field])
-            
-            # Merge with default config
-            return {**default_config, **config}
-    else:
-        save_config(default_config)
-        return default_config
+        try:
+            signature = _signature(os.stat(CONFIG_FILE))
+        except FileNotFoundError:
+            signature = None
 
-def save_config(config_data):
+        if cached and signature == _cache['signature']:
+            _cache['checked'] = time.monotonic()
+            return dict(_cache['config'])
+
+        if signature is None:
+            config = dict(DEFAULT_CONFIG)
+            signature = _write_config(config)
+        else:
+            try:
+                config = _read_config()
+            except ValueError as e:
+                if not cached:
+                    raise
+                # A hand edit left invalid JSON, keep serving the last good settings
+                logger.error(f"Invalid {CONFIG_FILE}, keeping previous settings: {str(e)}")
+                config = _cache['config']
+
+        _store(signature, config)
+        return dict(config)
+
+def _write_config(config_data):
     # Save paths in a platform-independent format (forward slashes)
-    path_fields = [
-        'resend_manifest_dir',
-        'low_side_manifest_dir',
-        'high_side_manifest_dir',
-        'resend_folder'
-    ]
-    
     save_data = config_data.copy()
-    for field in path_fields:
+    for field in PATH_FIELDS:
         if field in save_data and save_data[field]:
             save_data[field] = save_data[field].replace('\\', '/')
-    
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(save_data, f, indent=4)
\ No newline at end of file
+
+    # Write beside the target and swap it in, so no reader ever sees a half-written file
+    os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
+    tmp_path = f"{CONFIG_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(save_data, f, indent=4)
+    os.replace(tmp_path, CONFIG_FILE)
+    return _signature(os.stat(CONFIG_FILE))
+
+def save_config(config_data):
+    with _cache_lock:
+        signature = _write_config(config_data)
+        _store(signature, _read_config())
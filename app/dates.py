@@ -0,0 +1,136 @@
+# CTIDashy_Flask/app/dates.py
+import logging
+import threading
+from functools import lru_cache
+from datetime import datetime, timezone
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# DateTime formats seen in manifests, most common first
+DATETIME_FORMATS = [
+    "%a %b %d %H:%M:%S UTC %Y",  # Wed Jan 29 14:23:45 UTC 2025
+    "%Y-%m-%d %H:%M:%S",          # 2025-01-29 14:23:45
+    "%Y-%m-%dT%H:%M:%S",          # 2025-01-29T14:23:45
+    "%d/%m/%Y %H:%M:%S",          # 29/01/2025 14:23:45
+    "%m/%d/%Y %H:%M:%S",          # 01/29/2025 14:23:45
+]
+
+# Distinct DateTime strings remembered by parse_datetime
+PARSE_CACHE_SIZE = 65536
+
+# Values looked at when working out the format of a manifest
+SAMPLE_SIZE = 50
+
+MONTHS = {name: number for number, name in enumerate(
+    ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'], start=1)}
+
+_file_formats = {}
+_file_formats_lock = threading.Lock()
+
+def _clock(value, offset):
+    return int(value[offset:offset + 2]), int(value[offset + 3:offset + 5]), int(value[offset + 6:offset + 8])
+
+def _parse_utc_text(value):
+    # Wed Jan 29 14:23:45 UTC 2025
+    if len(value) != 28 or value[19:24] != ' UTC ':
+        raise ValueError(value)
+    return datetime(int(value[24:28]), MONTHS[value[4:7]], int(value[8:10]), *_clock(value, 11))
+
+def _parse_iso(value):
+    # 2025-01-29 14:23:45 and 2025-01-29T14:23:45
+    if len(value) != 19 or value[10] not in ' T':
+        raise ValueError(value)
+    return datetime.fromisoformat(value)
+
+def _parse_day_first(value):
+    # 29/01/2025 14:23:45
+    if len(value) != 19 or value[2] != '/' or value[5] != '/':
+        raise ValueError(value)
+    return datetime(int(value[6:10]), int(value[3:5]), int(value[0:2]), *_clock(value, 11))
+
+def _parse_month_first(value):
+    # 01/29/2025 14:23:45
+    if len(value) != 19 or value[2] != '/' or value[5] != '/':
+        raise ValueError(value)
+    return datetime(int(value[6:10]), int(value[0:2]), int(value[3:5]), *_clock(value, 11))
+
+# Slicing parsers for the known formats, an order of magnitude faster than strptime
+FAST_PARSERS = {
+    DATETIME_FORMATS[0]: _parse_utc_text,
+    DATETIME_FORMATS[1]: _parse_iso,
+    DATETIME_FORMATS[2]: _parse_iso,
+    DATETIME_FORMATS[3]: _parse_day_first,
+    DATETIME_FORMATS[4]: _parse_month_first,
+}
+
+def parse_with_format(value, fmt):
+    """Parse value in a known format, returning None when it does not fit"""
+    try:
+        return FAST_PARSERS[fmt](value)
+    except (ValueError, KeyError, IndexError):
+        return None
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse(dt_str, fmt):
+    if fmt is not None:
+        dt = parse_with_format(dt_str, fmt)
+        if dt is not None:
+            return dt
+
+    for candidate in DATETIME_FORMATS:
+        dt = parse_with_format(dt_str, candidate)
+        if dt is not None:
+            return dt
+
+    # strptime is more lenient (single digit fields, stray whitespace), keep it as the last resort
+    for candidate in DATETIME_FORMATS:
+        try:
+            return datetime.strptime(dt_str, candidate)
+        except ValueError:
+            continue
+
+    logger.debug(f"Could not parse date from: {dt_str}")
+    return None
+
+def parse_datetime(dt_str, fmt=None):
+    """Parse a manifest DateTime value.
+
+    With fmt (from detect_format) the matching fast parser is tried first; otherwise,
+    or if the value does not fit, each known format is tried in turn. Results are
+    memoised per distinct string.
+    """
+    if not dt_str:
+        return None
+    return _parse(dt_str.strip(), fmt)
+
+def detect_format(values):
+    """Pick the known format that parses the most of a sample of DateTime values"""
+    sample = [value.strip() for value in values[:SAMPLE_SIZE] if value and value.strip()]
+    best_format = None
+    best_count = 0
+    for fmt in DATETIME_FORMATS:
+        count = sum(1 for value in sample if parse_with_format(value, fmt) is not None)
+        if count > best_count:
+            best_format = fmt
+            best_count = count
+    return best_format
+
+def manifest_format(file_path, stat, values):
+    """Format of a manifest's DateTime column, detected once per file version"""
+    key = (file_path, stat.st_size, stat.st_mtime_ns)
+    with _file_formats_lock:
+        if key in _file_formats:
+            return _file_formats[key]
+
+    fmt = detect_format(values)
+    with _file_formats_lock:
+        for stale in [k for k in _file_formats if k[0] == file_path]:
+            del _file_formats[stale]
+        _file_formats[key] = fmt
+    logger.debug(f"Detected DateTime format {fmt!r} for {file_path}")
+    return fmt
+
+def to_epoch(dt):
+    """Seconds since the epoch for a naive manifest timestamp (manifests are written in UTC)"""
+    return int(dt.replace(tzinfo=timezone.utc).timestamp())
@@ -0,0 +1,24 @@
+# CTIDashy_Flask/app/db.py
+import os
+import sqlite3
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Hashes per IN (...) query, below SQLite's default limit of 999 bound parameters
+LOOKUP_CHUNK_SIZE = 500
+
+def connect(path, timeout=30, row_factory=None):
+    """Open one of the app's SQLite files, creating its directory.
+
+    WAL lets readers in other workers carry on while one of them writes, and
+    synchronous=NORMAL is safe with WAL while sparing an fsync per commit.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=timeout)
+    if row_factory is not None:
+        conn.row_factory = row_factory
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
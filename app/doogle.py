@@ -1,144 +1,467 @@
 # CTIDashy_Flask/app/doogle.py
 import os
+import re
 import sys
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor, wait
 import requests
-from urllib.parse import urljoin
 from flask import jsonify, request
 from app import app
 from app.config import load_config
+from app.opencti import get_client
+from app.pagination import InvalidCursor, decode_cursor, encode_cursor
+from app.search_cache import get_search_cache, make_key
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@app.route('/search')
-def search():
-    query = request.args.get('q', '').strip()
-    if not query:
-        return jsonify({'error': 'No search query provided'}), 400
-    
-    try:
-        config = load_config()
-        opencti_url = config.get('opencti_url', '').strip()
-        api_key = config.get('opencti_api', '').strip()
-        
-        if not opencti_url or not api_key:
-            return jsonify({'error': 'OpenCTI configuration missing'}), 400
+class SearchError(Exception):
+    """A search that OpenCTI answered with something other than results"""
 
-        if not opencti_url.startswith(('http://', 'https://')):
-            opencti_url = 'http://' + opencti_url
-        
-        graphql_endpoint = urljoin(opencti_url.rstrip('/') + '/', 'graphql')
-
-        query_string = """
-        query Search($search: String) {
-            stixCoreObjects(search: $search, first: 20) {
-                edges {
-                    node {
-                        id
-                        entity_type
-                        standard_id
-                        created_at
-                        updated_at
-                        createdBy {
-                            name
-                        }
-                        objectMarking {
-                            definition
-                            x_opencti_color
-                        }
-                        objectLabel {
-                            value
-                            color
-                        }
-                        ... on Report {
-                            name
-                            description
-                            report_types
-                            published
-                        }
-                        ... on Organization {
-                            name
-                            description
-                        }
-                        ... on Indicator {
-                            name
-                            pattern
-                            valid_from
-                            valid_until
-                        }
-                    }
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+# Default and largest number of results fetched per page
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+
+# Values worth a targeted observable/indicator lookup: hashes, IPv4 addresses, URLs and domains
+OBSERVABLE_PATTERN = re.compile(
+    r'^(?:[0-9a-fA-F]{32}|[0-9a-fA-F]{40}|[0-9a-fA-F]{64}'
+    r'|\d{1,3}(?:\.\d{1,3}){3}'
+    r'|https?://\S+'
+    r'|(?:[A-Za-z0-9-]+\.)+[A-Za-z]{2,})$'
+)
+
+# Name given to the instance configured by opencti_url/opencti_api
+PRIMARY_INSTANCE = 'primary'
+
+# Object ids and STIX standard ids, e.g. report--0b7c... ; anything else never reaches OpenCTI
+OBJECT_ID_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.:-]{0,127}$')
+
+# Only what a result card shows; heavy fields are fetched by DETAIL_QUERY when a card is expanded
+SEARCH_QUERY = """
+query Search($search: String, $first: Int, $after: ID) {
+    stixCoreObjects(search: $search, first: $first, after: $after) {
+        edges {
+            node {
+                id
+                entity_type
+                standard_id
+                created_at
+                updated_at
+                createdBy {
+                    name
+                }
+                objectMarking {
+                    definition
+                }
+                objectLabel {
+                    value
+                }
+                ... on Report {
+                    name
+                }
+                ... on Organization {
+                    name
+                }
+                ... on Indicator {
+                    name
                 }
             }
         }
-        """
-        
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {api_key}'
+        pageInfo {
+            endCursor
+            hasNextPage
+            globalCount
         }
+    }
+}
+"""
+
+OBSERVABLE_QUERY = """
+query SearchObservables($search: String, $first: Int) {
+    stixCyberObservables(search: $search, first: $first) {
+        edges {
+            node {
+                id
+                entity_type
+                standard_id
+                observable_value
+                created_at
+                updated_at
+                createdBy {
+                    name
+                }
+                objectMarking {
+                    definition
+                }
+                objectLabel {
+                    value
+                }
+            }
+        }
+    }
+}
+"""
+
+INDICATOR_QUERY = """
+query SearchIndicators($search: String, $first: Int) {
+    indicators(search: $search, first: $first) {
+        edges {
+            node {
+                id
+                entity_type
+                standard_id
+                name
+                created_at
+                updated_at
+                createdBy {
+                    name
+                }
+                objectMarking {
+                    definition
+                }
+                objectLabel {
+                    value
+                }
+            }
+        }
+    }
+}
+"""
+
+# kind -> (query, root field); 'search' is the paged general search, the others are first-page extras
+SEARCH_KINDS = {
+    'search': (SEARCH_QUERY, 'stixCoreObjects'),
+    'observables': (OBSERVABLE_QUERY, 'stixCyberObservables'),
+    'indicators': (INDICATOR_QUERY, 'indicators')
+}
+
+DETAIL_QUERY = """
+query SearchDetail($id: String!) {
+    stixCoreObject(id: $id) {
+        id
+        entity_type
+        standard_id
+        objectMarking {
+            definition
+            x_opencti_color
+        }
+        objectLabel {
+            value
+            color
+        }
+        ... on Report {
+            description
+            report_types
+            published
+        }
+        ... on Organization {
+            description
+        }
+        ... on Indicator {
+            description
+            pattern
+            pattern_type
+            valid_from
+            valid_until
+        }
+    }
+}
+"""
+
+def graphql_data(response):
+    try:
+        data = response.json()
+    except ValueError:
+        raise SearchError('Invalid JSON response', 500)
+
+    if data is None:
+        raise SearchError('Empty response', 500)
         
-        response = requests.post(
-            graphql_endpoint,
-            json={'query': query_string, 'variables': {'search': query}},
-            headers=headers,
-            verify=False,
-            timeout=30
-        )
-        
-        try:
-            data = response.json()
-        except ValueError:
-            return jsonify({'error': 'Invalid JSON response'}), 500
+    if 'errors' in data:
+        error_msg = data.get('errors', [{}])[0].get('message', 'Unknown GraphQL error')
+        raise SearchError(f'GraphQL error: {error_msg}', 400)
 
-        if data is None:
-            return jsonify({'error': 'Empty response'}), 500
-            
-        if 'errors' in data:
-            error_msg = data.get('errors', [{}])[0].get('message', 'Unknown GraphQL error')
-            return jsonify({'error': f'GraphQL error: {error_msg}'}), 400
+    return data.get('data') or {}
 
-        stix_objects = data.get('data', {}).get('stixCoreObjects', {})
-        if stix_objects is None:
-            return jsonify({'results': []})
+def opencti_instances(config):
+    """Every OpenCTI instance to search: the primary one plus opencti_instances entries"""
+    instances = []
+    if config.get('opencti_url', '').strip() and config.get('opencti_api', '').strip():
+        instances.append({
+            'name': PRIMARY_INSTANCE,
+            'opencti_url': config['opencti_url'].strip(),
+            'opencti_api': config['opencti_api'].strip()
+        })
+    for index, instance in enumerate(config.get('opencti_instances') or []):
+        if instance.get('url') and instance.get('api_key'):
+            instances.append({
+                'name': instance.get('name') or f"instance {index + 1}",
+                'opencti_url': instance['url'].strip(),
+                'opencti_api': instance['api_key'].strip()
+            })
+    return instances
 
-        edges = stix_objects.get('edges', [])
-        if not edges:
-            return jsonify({'results': []})
+def run_search(instance, query, after=None, first=SEARCH_PAGE_SIZE, kind='search', timeout=30):
+    """Query one OpenCTI instance for one page of results as shown by Doogle"""
+    graphql_query, root = SEARCH_KINDS[kind]
+    response = get_client().post(
+        instance['opencti_url'],
+        instance['opencti_api'],
+        graphql_query,
+        variables={'search': query, 'first': first, 'after': after},
+        timeout=timeout,
+        operation=kind
+    )
+    
+    page = {'results': [], 'next_cursor': None, 'has_more': False, 'total': 0}
+    stix_objects = graphql_data(response).get(root, {})
+    if stix_objects is None:
+        return page
 
-        results = []
-        for edge in edges:
-            if not edge:
-                continue
-                
-            node = edge.get('node')
-            if not node:
-                continue
+    page_info = stix_objects.get('pageInfo') or {}
+    page['has_more'] = bool(page_info.get('hasNextPage'))
+    page['next_cursor'] = page_info.get('endCursor') if page['has_more'] else None
+    page['total'] = page_info.get('globalCount')
+
+    edges = stix_objects.get('edges', [])
+    if not edges:
+        return page
+
+    for edge in edges:
+        if not edge:
+            continue
             
-            created_by = node.get('createdBy') or {}
-            result = {
-                'id': node.get('id'),
-                'type': node.get('entity_type'),
-                'created': node.get('created_at'),
-                'updated': node.get('updated_at'),
-                'author': created_by.get('name'),
-                'markings': [m.get('definition') for m in node.get('objectMarking', []) if m and m.get('definition')],
-                'labels': [l.get('value') for l in node.get('objectLabel', []) if l and l.get('value')],
-                'name': node.get('name', 'Unnamed Item'),
-                'description': node.get('description', '')
-            }
-            results.append(result)
+        node = edge.get('node')
+        if not node:
+            continue
         
-        return jsonify({'results': results})
-            
-    except requests.exceptions.SSLError as e:
+        created_by = node.get('createdBy') or {}
+        result = {
+            'id': node.get('id'),
+            'standard_id': node.get('standard_id'),
+            'type': node.get('entity_type'),
+            'created': node.get('created_at'),
+            'updated': node.get('updated_at'),
+            'author': created_by.get('name'),
+            'markings': [m.get('definition') for m in node.get('objectMarking', []) if m and m.get('definition')],
+            'labels': [l.get('value') for l in node.get('objectLabel', []) if l and l.get('value')],
+            'name': node.get('name') or node.get('observable_value') or 'Unnamed Item'
+        }
+        page['results'].append(result)
+    
+    return page
+
+def _create_executor(config, target_count):
+    # One pool per search: a target still running after the timeout is left to finish in
+    # its own pool rather than holding workers that other users' searches need
+    workers = max(1, min(int(config.get('search_fanout_workers', 8)), target_count))
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='doogle')
+
+def search_targets(config, query, cursors=None):
+    """(instance, kind, after) for every query of one page.
+
+    The first page searches every instance and, for observable-looking input, also
+    asks for matching observables and indicators. Later pages only continue the
+    general searches that still have a cursor.
+    """
+    targets = []
+    for instance in opencti_instances(config):
+        if cursors is None:
+            targets.append((instance, 'search', None))
+            if OBSERVABLE_PATTERN.match(query):
+                targets.append((instance, 'observables', None))
+                targets.append((instance, 'indicators', None))
+        elif instance['name'] in cursors:
+            targets.append((instance, 'search', cursors[instance['name']]))
+    return targets
+
+def _run_target(instance, kind, query, after, first, timeout):
+    start = time.perf_counter()
+    page, cache_state = get_search_cache().get_or_fetch(
+        make_key(query, instance, kind, after, first),
+        lambda: run_search(instance, query, after, first, kind, timeout)
+    )
+    return page, cache_state, (time.perf_counter() - start) * 1000
+
+def fan_out_search(config, query, cursors=None, first=SEARCH_PAGE_SIZE):
+    """Run every query of a page in parallel and merge the results.
+
+    Each target gets search_target_timeout seconds; slow or failing targets become
+    warnings and the rest is returned. Results are de-duplicated by standard_id,
+    keeping the first seen (primary instance, general search first) and listing
+    every instance that had it. Raises the first error if no target answered.
+    """
+    targets = search_targets(config, query, cursors)
+    timeout = float(config.get('search_target_timeout', 15))
+    read_timeout = min(float(config.get('opencti_timeout', 30)), timeout)
+
+    executor = _create_executor(config, len(targets))
+    try:
+        futures = [
+            executor.submit(_run_target, instance, kind, query, after, first, read_timeout)
+            for instance, kind, after in targets
+        ]
+        wait(futures, timeout=timeout)
+    finally:
+        # Targets not started by now are dropped, running ones are not waited for
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    merged = {'results': [], 'next_cursor': None, 'has_more': False, 'total': 0, 'warnings': [], 'targets': []}
+    seen = {}
+    next_cursors = {}
+    errors = []
+    for (instance, kind, after), future in zip(targets, futures):
+        status = {'instance': instance['name'], 'query': kind}
+        merged['targets'].append(status)
+        if not future.done():
+            status['error'] = 'timed out'
+            merged['warnings'].append(f"{instance['name']} ({kind}) did not answer within {timeout:g}s")
+            continue
+        try:
+            page, status['cache'], elapsed_ms = future.result()
+            status['elapsed_ms'] = round(elapsed_ms, 1)
+        except Exception as e:
+            errors.append(e)
+            status['error'] = getattr(e, 'message', None) or str(e)
+            merged['warnings'].append(f"{instance['name']} ({kind}) failed: {status['error']}")
+            continue
+
+        if kind == 'search':
+            merged['total'] += page.get('total') or 0
+            if page['next_cursor']:
+                next_cursors[instance['name']] = page['next_cursor']
+
+        for result in page['results']:
+            key = result.get('standard_id') or f"{instance['name']}:{result['id']}"
+            if key in seen:
+                if instance['name'] not in seen[key]['sources']:
+                    seen[key]['sources'].append(instance['name'])
+                continue
+            result = {**result, 'instance': instance['name'], 'sources': [instance['name']]}
+            seen[key] = result
+            merged['results'].append(result)
+
+    # Only fail outright when no target answered at all
+    answered = sum(1 for status in merged['targets'] if 'cache' in status)
+    if targets and not answered:
+        if errors:
+            raise errors[0]
+        raise SearchError('Request timed out', 504)
+
+    if next_cursors:
+        merged['has_more'] = True
+        merged['next_cursor'] = encode_cursor(next_cursors)
+
+    states = [status.get('cache') for status in merged['targets'] if status.get('cache')]
+    merged['cache'] = 'miss' if 'miss' in states or not states else ('stale' if 'stale' in states else 'hit')
+    return merged
+
+def fetch_detail(config, instance, object_id):
+    """Heavy fields of one object, fetched when its result card is expanded"""
+    response = get_client().post(
+        instance['opencti_url'],
+        instance['opencti_api'],
+        DETAIL_QUERY,
+        variables={'id': object_id},
+        timeout=config.get('opencti_timeout', 30),
+        operation='detail'
+    )
+
+    node = graphql_data(response).get('stixCoreObject')
+    if not node:
+        raise SearchError('Object not found', 404)
+
+    return {
+        'id': node.get('id'),
+        'type': node.get('entity_type'),
+        'standard_id': node.get('standard_id'),
+        'description': node.get('description', ''),
+        'pattern': node.get('pattern'),
+        'pattern_type': node.get('pattern_type'),
+        'valid_from': node.get('valid_from'),
+        'valid_until': node.get('valid_until'),
+        'report_types': node.get('report_types') or [],
+        'published': node.get('published'),
+        'markings': [
+            {'definition': m.get('definition'), 'color': m.get('x_opencti_color')}
+            for m in node.get('objectMarking', []) if m and m.get('definition')
+        ],
+        'labels': [
+            {'value': l.get('value'), 'color': l.get('color')}
+            for l in node.get('objectLabel', []) if l and l.get('value')
+        ]
+    }
+
+def _opencti_errors(e):
+    """Map request failures to the responses Doogle has always returned"""
+    if isinstance(e, SearchError):
+        return jsonify({'error': e.message}), e.status
+    if isinstance(e, requests.exceptions.SSLError):
         return jsonify({'error': 'SSL verification failed'}), 500
-        
-    except requests.exceptions.Timeout as e:
+    if isinstance(e, requests.exceptions.Timeout):
         return jsonify({'error': 'Request timed out'}), 504
-        
-    except requests.exceptions.ConnectionError as e:
+    if isinstance(e, requests.exceptions.ConnectionError):
         return jsonify({'error': 'Failed to connect to OpenCTI server'}), 503
-        
+    logger.error(f"Search error: {str(e)}")
+    return jsonify({'error': 'An unexpected error occurred'}), 500
+
+@app.route('/search')
+def search():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'No search query provided'}), 400
+
+    first = max(1, min(request.args.get('first', SEARCH_PAGE_SIZE, type=int), MAX_SEARCH_PAGE_SIZE))
+    
+    try:
+        config = load_config()
+        if not opencti_instances(config):
+            return jsonify({'error': 'OpenCTI configuration missing'}), 400
+
+        # The cursor holds one OpenCTI endCursor per instance that has more results
+        cursors = decode_cursor(request.args.get('after', '').strip())
+        if cursors is not None and not isinstance(cursors, dict):
+            raise InvalidCursor('Invalid cursor')
+
+        return jsonify(fan_out_search(config, query, cursors, first))
+
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+            
+    except Exception as e:
+        return _opencti_errors(e)
+
+@app.route('/search/<object_id>')
+def search_detail(object_id):
+    if not OBJECT_ID_PATTERN.match(object_id):
+        return jsonify({'error': 'Invalid object id'}), 400
+
+    try:
+        config = load_config()
+        name = request.args.get('instance', PRIMARY_INSTANCE)
+        instance = next((i for i in opencti_instances(config) if i['name'] == name), None)
+        if instance is None:
+            return jsonify({'error': 'OpenCTI configuration missing'}), 400
+
+        detail, cache_state = get_search_cache().get_or_fetch(
+            make_key(object_id, instance, 'detail'),
+            lambda: fetch_detail(config, instance, object_id)
+        )
+        return jsonify({'result': detail, 'cache': cache_state})
+
+    except Exception as e:
+        return _opencti_errors(e)
+
+@app.route('/search_cache_stats')
+def search_cache_stats():
+    try:
+        return jsonify({'status': 'success', 'cache': get_search_cache().stats()})
     except Exception as e:
-        return jsonify({'error': 'An unexpected error occurred'}), 500
\ No newline at end of file
+        logger.error(f"Search cache stats error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
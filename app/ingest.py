@@ -0,0 +1,186 @@
+# CTIDashy_Flask/app/ingest.py
+import io
+import os
+import csv
+import sys
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from app.config import load_config
+from app.metrics import inc
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+MANIFEST_COLUMNS = ['Filename', 'CTIfeed', 'MD5Hash', 'DateTime', 'FileSize', 'FlowUUID', 'Resend']
+
+# Bytes at the start of a manifest used to tell an append apart from a rewrite
+HEAD_BYTES = 4096
+
+# Memory held by a cached row on top of its CSV text (ManifestRow object, string
+# headers, list slot), used to size the cache against manifest_cache_max_mb
+ROW_OVERHEAD_BYTES = 320
+
+class ManifestRow:
+    """One manifest row, kept as slots instead of a dict per row.
+
+    Parsed manifests hold millions of these in memory, so rows stay in this form
+    internally and are turned into dicts with as_dict() only where they are sent
+    to a client.
+    """
+    __slots__ = MANIFEST_COLUMNS
+
+    def __init__(self, Filename, CTIfeed, MD5Hash, DateTime, FileSize, FlowUUID, Resend):
+        self.Filename = Filename
+        self.CTIfeed = CTIfeed
+        self.MD5Hash = MD5Hash
+        self.DateTime = DateTime
+        self.FileSize = FileSize
+        self.FlowUUID = FlowUUID
+        self.Resend = Resend
+
+    def values(self):
+        """Field values in MANIFEST_COLUMNS order"""
+        return (self.Filename, self.CTIfeed, self.MD5Hash, self.DateTime, self.FileSize, self.FlowUUID, self.Resend)
+
+    def as_dict(self, **extra):
+        """A new dict of the row, with extra keys added or replacing fields"""
+        row = {'Filename': self.Filename, 'CTIfeed': self.CTIfeed, 'MD5Hash': self.MD5Hash, 'DateTime': self.DateTime,
+               'FileSize': self.FileSize, 'FlowUUID': self.FlowUUID, 'Resend': self.Resend}
+        if extra:
+            row.update(extra)
+        return row
+
+class ManifestState:
+    """What has been parsed from one manifest so far"""
+
+    def __init__(self, path):
+        self.path = path
+        self.size = 0
+        self.mtime = 0.0
+        self.offset = 0
+        self.head_len = 0
+        self.head = hashlib.sha1(b'').hexdigest()
+        self.rows = []
+        self.partial_rows = 0
+        # Estimated memory of the rows, and the tuple handed to callers until the next refresh
+        self.bytes = 0
+        self.snapshot = ()
+
+_states = OrderedDict()
+_cached_bytes = 0
+_lock = threading.Lock()
+
+def is_manifest_name(name):
+    return name.startswith('CTImanifest_') and name.endswith('.csv')
+
+def list_manifests(directory):
+    """List CTImanifest_*.csv files in a directory as [{'name', 'size'}] sorted by name"""
+    try:
+        if not os.path.exists(directory):
+            logger.warning(f"Directory not found: {directory}")
+            return []
+
+        files = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if is_manifest_name(entry.name):
+                    size_kb = entry.stat().st_size / 1024
+                    files.append({
+                        'name': entry.name,
+                        'size': f"{size_kb:.1f}"
+                    })
+        return sorted(files, key=lambda x: x['name'])
+    except Exception as e:
+        logger.error(f"Error reading directory {directory}: {e}")
+        return []
+
+def prefix_digest(file_path, length):
+    """Digest of the first bytes of a file, used to check a grown file is the same file appended to"""
+    with open(file_path, 'rb') as f:
+        return hashlib.sha1(f.read(min(length, HEAD_BYTES))).hexdigest()
+
+def _parse_lines(data, skip_header):
+    rows = []
+    reader = csv.reader(io.StringIO(data.decode('utf-8')))
+    if skip_header:
+        next(reader, None)
+    for row in reader:
+        if len(row) >= 7:
+            # Feed names and Resend flags repeat on every row, one shared copy of each is enough
+            rows.append(ManifestRow(row[0], sys.intern(row[1]), row[2], row[3], row[4], row[5], sys.intern(row[6])))
+    return rows
+
+def _refresh(state, stat):
+    """Parse whatever has been appended to the manifest since the last refresh"""
+    with open(state.path, 'rb') as f:
+        prefix = f.read(HEAD_BYTES)
+
+        # A shrunk file or a changed start means the manifest was rewritten, start over
+        if stat.st_size < state.offset or hashlib.sha1(prefix[:state.head_len]).hexdigest() != state.head:
+            logger.info(f"Manifest rewritten, re-reading: {state.path}")
+            state.offset = 0
+            state.rows = []
+            state.partial_rows = 0
+
+        f.seek(state.offset)
+        data = f.read(stat.st_size - state.offset)
+
+    # A last line without a newline may still be being written: parse it now but
+    # keep the offset before it so the next refresh reads it again in full
+    del state.rows[len(state.rows) - state.partial_rows:]
+    end = data.rfind(b'\n') + 1
+    complete_rows = _parse_lines(data[:end], skip_header=state.offset == 0)
+    partial_rows = _parse_lines(data[end:], skip_header=False) if state.offset + end > 0 else []
+
+    state.rows.extend(complete_rows)
+    state.rows.extend(partial_rows)
+    state.partial_rows = len(partial_rows)
+    state.offset += end
+    state.head_len = min(len(prefix), state.offset)
+    state.head = hashlib.sha1(prefix[:state.head_len]).hexdigest()
+    state.size = stat.st_size
+    state.mtime = stat.st_mtime
+    return len(complete_rows) + len(partial_rows)
+
+def _evict(max_bytes):
+    global _cached_bytes
+    while _cached_bytes > max_bytes and len(_states) > 1:
+        path, state = _states.popitem(last=False)
+        _cached_bytes -= state.bytes
+        logger.debug(f"Evicted {path} from manifest cache")
+
+def read_rows(file_path):
+    """Return every row of a manifest as ManifestRow records, parsing only data not seen before.
+
+    The returned tuple and its records are shared between callers until the manifest
+    changes, so an unchanged manifest costs a stat. Per worker, the least recently
+    read manifests are dropped beyond manifest_cache_max_mb.
+    """
+    global _cached_bytes
+
+    stat = os.stat(file_path)
+    max_bytes = float(load_config().get('manifest_cache_max_mb', 128)) * 1024 * 1024
+    with _lock:
+        state = _states.get(file_path)
+        if state is None:
+            state = ManifestState(file_path)
+            _states[file_path] = state
+        _states.move_to_end(file_path)
+
+        if state.size != stat.st_size or state.mtime != stat.st_mtime:
+            before = state.bytes
+            parsed = _refresh(state, stat)
+            state.bytes = state.size + len(state.rows) * ROW_OVERHEAD_BYTES
+            state.snapshot = tuple(state.rows)
+            _cached_bytes += state.bytes - before
+            if parsed:
+                logger.debug(f"Parsed {parsed} new rows from {file_path}")
+                inc('ctidashy_manifest_rows_parsed_total', parsed, reader='csv')
+            inc('ctidashy_cache_requests_total', cache='manifest_rows', result='miss')
+            _evict(max_bytes)
+        else:
+            inc('ctidashy_cache_requests_total', cache='manifest_rows', result='hit')
+
+        return state.snapshot
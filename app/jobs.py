@@ -0,0 +1,283 @@
+# CTIDashy_Flask/app/jobs.py
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import jsonify, request
+from app import app
+from app.config import CACHE_DIR, load_config
+from app.profiling import job_profile
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Job state lives on disk so any gunicorn worker can answer a poll or a cancel
+JOBS_DIR = os.path.join(CACHE_DIR, 'jobs')
+
+# Finished jobs are removed after this many seconds
+JOB_RETENTION = 3600
+
+# Unfinished jobs whose state has not changed for this long are taken to belong to a
+# worker that died; a live job writes its state whenever it records progress
+ABANDONED_JOB_RETENTION = 86400
+
+# Minimum seconds between progress writes and cancel-marker checks
+STATE_WRITE_INTERVAL = 0.5
+
+_executor = None
+_executor_lock = threading.Lock()
+_jobs = {}
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    """A unit of background work with progress, partial results and cancellation"""
+
+    def __init__(self, kind, total=0):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = 'queued'
+        self.total = total
+        self.done = 0
+        self.summary = {}
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result_count = 0
+        self._cancel_requested = False
+        self._last_write = 0.0
+        self._last_cancel_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state_path(self):
+        return os.path.join(JOBS_DIR, f"{self.id}.json")
+
+    @property
+    def results_path(self):
+        return os.path.join(JOBS_DIR, f"{self.id}.results.jsonl")
+
+    @property
+    def cancel_path(self):
+        return os.path.join(JOBS_DIR, f"{self.id}.cancel")
+
+    @property
+    def cancel_requested(self):
+        now = time.time()
+        if not self._cancel_requested and now - self._last_cancel_check >= STATE_WRITE_INTERVAL:
+            self._last_cancel_check = now
+            self._cancel_requested = os.path.exists(self.cancel_path)
+        return self._cancel_requested
+
+    def check_cancelled(self):
+        if self.cancel_requested:
+            raise JobCancelled()
+
+    def add_results(self, results, advance=None):
+        """Record finished items; results are appended to the job's partial result stream"""
+        with self._lock:
+            if results:
+                with open(self.results_path, 'a', encoding='utf-8') as f:
+                    for result in results:
+                        f.write(json.dumps(result) + '\n')
+                self.result_count += len(results)
+            self.done += len(results) if advance is None else advance
+        self.write_state()
+
+    def state(self):
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0
+        throughput = self.done / elapsed if elapsed > 0 else 0
+        remaining = max(self.total - self.done, 0)
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': {
+                'done': self.done,
+                'total': self.total,
+                'elapsed_seconds': round(elapsed, 1),
+                'throughput': round(throughput, 2),
+                'eta_seconds': round(remaining / throughput, 1) if throughput and self.status == 'running' else None
+            },
+            'summary': self.summary,
+            'result_count': self.result_count,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+
+    def write_state(self, force=False):
+        now = time.time()
+        if not force and now - self._last_write < STATE_WRITE_INTERVAL:
+            return
+        self._last_write = now
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state(), f)
+        os.replace(tmp_path, self.state_path)
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = max(1, int(load_config().get('job_workers', 2)))
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        return _executor
+
+def _expired(job_id, state_path, now):
+    """True once a job's files can go: finished over JOB_RETENTION ago, or abandoned"""
+    job = _jobs.get(job_id)
+    if job is not None:
+        return bool(job.finished_at) and job.finished_at < now - JOB_RETENTION
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            finished_at = json.load(f).get('finished_at')
+        if finished_at:
+            return finished_at < now - JOB_RETENTION
+        return os.path.getmtime(state_path) < now - ABANDONED_JOB_RETENTION
+    except FileNotFoundError:
+        # Results or a cancel marker left without a state file
+        return True
+    except (OSError, ValueError):
+        # Being replaced by another worker
+        return False
+
+def _cleanup_old_jobs():
+    now = time.time()
+    try:
+        files = os.listdir(JOBS_DIR)
+        expired = {}
+        for file in files:
+            job_id = file.split('.', 1)[0]
+            if not _valid_job_id(job_id):
+                continue
+            if job_id not in expired:
+                expired[job_id] = _expired(job_id, os.path.join(JOBS_DIR, f"{job_id}.json"), now)
+            if expired[job_id] and os.path.getmtime(os.path.join(JOBS_DIR, file)) < now - JOB_RETENTION:
+                os.remove(os.path.join(JOBS_DIR, file))
+    except OSError as e:
+        logger.warning(f"Job cleanup failed: {str(e)}")
+    for job_id, job in list(_jobs.items()):
+        if job.finished_at and job.finished_at < now - JOB_RETENTION:
+            _jobs.pop(job_id, None)
+
+def _run(job, func, args, profile=None):
+    job.status = 'running'
+    job.started_at = time.time()
+    job.write_state(force=True)
+    if profile is not None:
+        profile.start()
+    try:
+        job.check_cancelled()
+        func(job, *args)
+        job.status = 'completed'
+    except JobCancelled:
+        job.status = 'cancelled'
+        logger.info(f"Job {job.id} ({job.kind}) cancelled after {job.done}/{job.total}")
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+        logger.error(f"Job {job.id} ({job.kind}) failed: {str(e)}")
+    finally:
+        job.finished_at = time.time()
+        job.write_state(force=True)
+        if profile is not None:
+            profile.stop(status=job.status)
+
+def submit_job(kind, func, *args, total=0):
+    """Queue func(job, *args) on the job pool and return the Job immediately"""
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    _cleanup_old_jobs()
+
+    job = Job(kind, total)
+    _jobs[job.id] = job
+    job.write_state(force=True)
+    # Jobs submitted by a profiled request are profiled too, under their own id
+    _get_executor().submit(_run, job, func, args, job_profile(job))
+    logger.info(f"Queued job {job.id} ({kind}, {total} items)")
+    return job
+
+def read_job_results(job_id, cursor=0, limit=None):
+    """Results from byte position cursor on, with the position to continue from"""
+    results = []
+    path = os.path.join(JOBS_DIR, f"{job_id}.results.jsonl")
+    if not os.path.exists(path):
+        return results, cursor
+    with open(path, 'rb') as f:
+        f.seek(cursor)
+        while limit is None or len(results) < limit:
+            line = f.readline()
+            # A line still being appended is picked up by the next poll
+            if not line.endswith(b'\n'):
+                break
+            results.append(json.loads(line))
+            cursor += len(line)
+    return results, cursor
+
+def get_job_state(job_id):
+    job = _jobs.get(job_id)
+    if job is not None:
+        return job.state()
+
+    path = os.path.join(JOBS_DIR, f"{job_id}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _valid_job_id(job_id):
+    return len(job_id) == 32 and all(c in '0123456789abcdef' for c in job_id)
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    try:
+        if not _valid_job_id(job_id):
+            return jsonify({'status': 'error', 'message': 'Invalid job id'}), 400
+
+        state = get_job_state(job_id)
+        if state is None:
+            return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+
+        cursor = max(request.args.get('cursor', 0, type=int), 0)
+        limit = request.args.get('limit', None, type=int)
+        results, next_cursor = read_job_results(job_id, cursor, limit)
+        return jsonify({
+            'status': 'success',
+            'job': state,
+            'cursor': cursor,
+            'next_cursor': next_cursor,
+            'results': results
+        })
+
+    except Exception as e:
+        logger.error(f"Job status error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    try:
+        if not _valid_job_id(job_id):
+            return jsonify({'status': 'error', 'message': 'Invalid job id'}), 400
+
+        state = get_job_state(job_id)
+        if state is None:
+            return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+        if state['status'] not in ('queued', 'running'):
+            return jsonify({'status': 'error', 'message': f"Job already {state['status']}"}), 409
+
+        # The marker file reaches the job even when it runs in another worker process
+        open(os.path.join(JOBS_DIR, f"{job_id}.cancel"), 'w').close()
+        job = _jobs.get(job_id)
+        if job is not None:
+            job._cancel_requested = True
+
+        return jsonify({'status': 'success', 'message': 'Cancellation requested'})
+
+    except Exception as e:
+        logger.error(f"Job cancel error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -0,0 +1,259 @@
+# CTIDashy_Flask/app/lookup.py
+import os
+import re
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from flask import render_template, request, jsonify
+from app import app
+from app.config import load_config
+from app.columnar import load_columns, md5_digests
+from app.doogle import opencti_instances, graphql_data
+from app.ingest import list_manifests
+from app.manifest_index import lookup_md5s
+from app.opencti import get_client
+from app.pagination import ndjson_response
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# MD5, SHA-1 and SHA-256; longer hex runs are not split into shorter hashes
+HASH_PATTERN = re.compile(r'\b(?:[0-9a-fA-F]{64}|[0-9a-fA-F]{40}|[0-9a-fA-F]{32})\b')
+HASH_TYPES = {32: 'md5', 40: 'sha1', 64: 'sha256'}
+
+# Manifest directories a hash is looked up in, with the label shown for each
+MANIFEST_SOURCES = [
+    ('resend_manifest_dir', 'resend'),
+    ('low_side_manifest_dir', 'low side'),
+    ('high_side_manifest_dir', 'high side')
+]
+
+# Batches resolved at the same time; results are still streamed in input order
+LOOKUP_WINDOW = 4
+
+# OpenCTI objects returned per hash and per query type
+MATCHES_PER_HASH = 5
+
+OBSERVABLE_FIELDS = 'edges { node { id entity_type standard_id observable_value } }'
+INDICATOR_FIELDS = 'edges { node { id entity_type standard_id name } }'
+
+def parse_hashes(text):
+    """Unique lowercase hashes in text, in the order they first appear.
+
+    Anything that is not a hash is ignored, so CSV exports and manifests can be pasted as is.
+    """
+    return list(dict.fromkeys(match.lower() for match in HASH_PATTERN.findall(text)))
+
+def build_lookup_query(count):
+    """One GraphQL request resolving count hashes, two aliased lookups per hash"""
+    variables = ', '.join(f'$h{i}: String' for i in range(count))
+    fields = '\n'.join(
+        f'    o{i}: stixCyberObservables(search: $h{i}, first: {MATCHES_PER_HASH}) {{ {OBSERVABLE_FIELDS} }}\n'
+        f'    i{i}: indicators(search: $h{i}, first: {MATCHES_PER_HASH}) {{ {INDICATOR_FIELDS} }}'
+        for i in range(count)
+    )
+    return f'query BulkLookup({variables}) {{\n{fields}\n}}'
+
+def lookup_opencti(instance, hashes, timeout):
+    """Map each hash to the observables and indicators one OpenCTI instance has for it"""
+    response = get_client().post(
+        instance['opencti_url'],
+        instance['opencti_api'],
+        build_lookup_query(len(hashes)),
+        variables={f'h{i}': value for i, value in enumerate(hashes)},
+        timeout=timeout,
+        operation='bulk_lookup'
+    )
+    # An unavailable instance must not read as "no matches"
+    response.raise_for_status()
+    data = graphql_data(response)
+
+    found = {}
+    for i, value in enumerate(hashes):
+        for alias in (f'o{i}', f'i{i}'):
+            for edge in (data.get(alias) or {}).get('edges') or []:
+                node = (edge or {}).get('node')
+                if not node:
+                    continue
+                found.setdefault(value, []).append({
+                    'instance': instance['name'],
+                    'id': node.get('id'),
+                    'standard_id': node.get('standard_id'),
+                    'type': node.get('entity_type'),
+                    'name': node.get('observable_value') or node.get('name') or 'Unnamed Item'
+                })
+    return found
+
+def scan_md5s(manifest_dir, md5s):
+    """Map each lowercase MD5 in md5s to the manifest rows that have it, from the columnar cache.
+
+    One pass over the MD5 column of every manifest for all of md5s. Only the resend
+    manifests are in the manifest index, and only while the watcher keeps it current;
+    building the full-text index here would take far longer than a lookup should.
+    """
+    found = {}
+    if not md5s or not manifest_dir or not os.path.isdir(manifest_dir):
+        return found
+    wanted = np.unique(md5_digests(md5s))
+    for manifest in list_manifests(manifest_dir):
+        columns = load_columns(os.path.join(manifest_dir, manifest['name']))
+        indices = np.flatnonzero(np.isin(columns.md5, wanted))
+        for row in columns.rows(indices):
+            found.setdefault(row.MD5Hash.strip().lower(), []).append(row.as_dict(ManifestFile=manifest['name']))
+    return found
+
+def _scanned_lookup(manifest_dirs, md5s, indexed=()):
+    """A lookup_md5s stand-in answering from one scan_md5s of each directory not in indexed"""
+    scanned = {}
+    for _, manifest_dir in manifest_dirs:
+        if manifest_dir in indexed:
+            continue
+        try:
+            scanned[manifest_dir] = scan_md5s(manifest_dir, md5s)
+        except Exception as e:
+            # Reported as a warning with every batch, like a failed index lookup
+            scanned[manifest_dir] = e
+
+    def find_md5s(manifest_dir, batch):
+        if manifest_dir in indexed:
+            return lookup_md5s(manifest_dir, batch)
+        found = scanned[manifest_dir]
+        if isinstance(found, Exception):
+            raise found
+        return {value: found[value] for value in batch if value in found}
+    return find_md5s
+
+def lookup_batch(manifest_dirs, instances, hashes, timeout, find_md5s=lookup_md5s):
+    """Resolve one batch against every manifest directory and OpenCTI instance.
+
+    Manifest rows come from find_md5s(manifest_dir, md5s). Returns the merged rows in
+    input order and a warning for each source that failed.
+    """
+    warnings = []
+    md5s = [value for value in hashes if len(value) == 32]
+
+    in_manifests = {}
+    for source, manifest_dir in manifest_dirs:
+        try:
+            for value, results in find_md5s(manifest_dir, md5s).items():
+                in_manifests.setdefault(value, []).extend({**result, 'source': source} for result in results)
+        except Exception as e:
+            logger.error(f"Manifest lookup error ({source}): {str(e)}")
+            warnings.append(f"{source} manifests failed: {str(e)}")
+
+    in_opencti = {}
+    for instance in instances:
+        try:
+            for value, matches in lookup_opencti(instance, hashes, timeout).items():
+                in_opencti.setdefault(value, []).extend(matches)
+        except Exception as e:
+            message = getattr(e, 'message', None) or str(e)
+            logger.error(f"OpenCTI lookup error ({instance['name']}): {message}")
+            warnings.append(f"{instance['name']} failed: {message}")
+
+    rows = [{
+        'hash': value,
+        'hash_type': HASH_TYPES[len(value)],
+        'manifests': in_manifests.get(value, []),
+        'opencti': in_opencti.get(value, [])
+    } for value in hashes]
+    return rows, warnings
+
+def iter_lookup(config, hashes):
+    """Yield (position, line) pairs for the NDJSON response.
+
+    A {"total": ...} line comes first, then one line per hash (and a {"warning": ...}
+    line per failed source) as each batch resolves, then a {"done": true, ...} summary.
+    Up to LOOKUP_WINDOW batches are in flight while earlier ones are being sent.
+    """
+    batch_size = max(1, int(config.get('lookup_batch_size', 50)))
+    timeout = float(config.get('search_target_timeout', 15))
+    instances = opencti_instances(config)
+
+    manifest_dirs = []
+    for key, source in MANIFEST_SOURCES:
+        manifest_dir = config.get(key, '')
+        if manifest_dir and manifest_dir not in (d for _, d in manifest_dirs):
+            manifest_dirs.append((source, manifest_dir))
+
+    # The watcher keeps the resend manifests indexed, the other directories (and the
+    # resend one too with the watcher off) are scanned once for every hash up front
+    indexed = ()
+    if config.get('watcher_enabled', True):
+        indexed = (config.get('resend_manifest_dir', ''),)
+    find_md5s = _scanned_lookup(manifest_dirs, [value for value in hashes if len(value) == 32], indexed)
+
+    position = 0
+    yield position, {'total': len(hashes), 'manifest_sources': [s for s, _ in manifest_dirs],
+                     'instances': [i['name'] for i in instances]}
+
+    summary = {'done': True, 'found_in_manifests': 0, 'found_in_opencti': 0, 'not_found': 0}
+    batches = (hashes[start:start + batch_size] for start in range(0, len(hashes), batch_size))
+    with ThreadPoolExecutor(max_workers=LOOKUP_WINDOW, thread_name_prefix='lookup') as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append(executor.submit(lookup_batch, manifest_dirs, instances, batch, timeout, find_md5s))
+            if len(pending) < LOOKUP_WINDOW:
+                continue
+            for line in _batch_lines(pending.popleft().result(), summary):
+                position += 1
+                yield position, line
+        while pending:
+            for line in _batch_lines(pending.popleft().result(), summary):
+                position += 1
+                yield position, line
+
+    yield position + 1, summary
+
+def _batch_lines(batch, summary):
+    rows, warnings = batch
+    for warning in warnings:
+        yield {'warning': warning}
+    for row in rows:
+        summary['found_in_manifests'] += bool(row['manifests'])
+        summary['found_in_opencti'] += bool(row['opencti'])
+        summary['not_found'] += not row['manifests'] and not row['opencti']
+        yield row
+
+@app.route('/lookup')
+def lookup():
+    return render_template('lookup.html', active_tab='lookup')
+
+@app.route('/bulk_lookup', methods=['POST'])
+def bulk_lookup():
+    """Look up a pasted or uploaded list of hashes, streamed back as NDJSON"""
+    try:
+        config = load_config()
+
+        if request.is_json:
+            data = request.get_json(silent=True) or {}
+            text = data.get('hashes', '')
+            if isinstance(text, list):
+                text = '\n'.join(str(value) for value in text)
+        else:
+            text = request.form.get('hashes', '')
+            upload = request.files.get('file')
+            if upload:
+                text += '\n' + upload.read().decode('utf-8', errors='ignore')
+
+        hashes = parse_hashes(text)
+        if not hashes:
+            return jsonify({'status': 'error', 'message': 'No MD5, SHA-1 or SHA-256 hashes found'}), 400
+
+        max_hashes = int(config.get('lookup_max_hashes', 50000))
+        if len(hashes) > max_hashes:
+            return jsonify({
+                'status': 'error',
+                'message': f'Too many hashes ({len(hashes)}), at most {max_hashes} per lookup'
+            }), 400
+
+        if not opencti_instances(config) and not any(config.get(key) for key, _ in MANIFEST_SOURCES):
+            return jsonify({'status': 'error', 'message': 'No OpenCTI instance or manifest directory configured'}), 400
+
+        logger.info(f"Bulk lookup of {len(hashes)} hashes")
+        return ndjson_response(iter_lookup(config, hashes))
+
+    except Exception as e:
+        logger.error(f"Bulk lookup error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
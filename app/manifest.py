@@ -1,103 +1,358 @@
 import os
+import re
+import json
+import time
+import tempfile
 import logging
+from itertools import islice
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 from flask import render_template, jsonify, request
 from app import app
 from app.config import load_config
+from app.jobs import JobCancelled, submit_job
+from app.columnar import load_columns, md5_digests
+from app.compare_cache import get_compare_cache
+from app.ingest import list_manifests
+from app.metrics import inc
+from app.pagination import InvalidCursor, ndjson_response, page_request, take_page
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# Rows per chunk when streaming a source manifest
+STREAMING_CHUNK_ROWS = 100_000
+
+# Difference rows materialised at a time from the columnar cache
+DIFFERENCE_CHUNK_ROWS = 5000
+
+# Upper bound on compare_workers regardless of what config.json asks for
+MAX_COMPARE_WORKERS = 32
+
+MANIFEST_DATE_PATTERN = re.compile(r'(\d{4})-?(\d{2})-?(\d{2})')
+
 def get_manifest_files(directory):
-    try:
-        if not os.path.exists(directory):
-            logger.warning(f"Directory not found: {directory}")
-            return []
-            
-        files = []
-        for file in os.listdir(directory):
-            if file.startswith('CTImanifest_') and file.endswith('.csv'):
-                file_path = os.path.join(directory, file)
-                size_kb = os.path.getsize(file_path) / 1024
-                files.append({
-                    'name': file,
-                    'size': f"{size_kb:.1f}"
-                })
-        return sorted(files, key=lambda x: x['name'])
-    except Exception as e:
-        logger.error(f"Error reading directory {directory}: {e}")
-        return []
+    return list_manifests(directory)
 
-def read_manifest_file(file_path):
-    try:
-        df = pd.read_csv(file_path)
-        if 'MD5Hash' in df.columns:
-            df['MD5Hash'] = df['MD5Hash'].str.lower()
-        df = df.where(pd.notnull(df), None)
-        return df
-    except Exception as e:
-        logger.error(f"Error reading {file_path}: {str(e)}")
-        return None
+def _streaming_threshold():
+    return load_config().get('compare_streaming_threshold_mb', 256) * 1024 * 1024
+
+def load_md5_set(file_path, chunksize=STREAMING_CHUNK_ROWS):
+    """Read only the MD5Hash column of a manifest into a sorted array of unique digests"""
+    parts = []
+    for chunk in pd.read_csv(file_path, usecols=['MD5Hash'], dtype={'MD5Hash': str},
+                             keep_default_na=False, chunksize=chunksize):
+        inc('ctidashy_manifest_rows_parsed_total', len(chunk), reader='pandas')
+        parts.append(np.unique(md5_digests(chunk['MD5Hash'])))
+    if not parts:
+        return np.empty(0, dtype='S16')
+    return np.unique(np.concatenate(parts))
 
-def compare_manifests(source_file, target_file):
+def manifest_md5s(file_path):
+    """Unique digests of a manifest, from the columnar cache unless the file is too big to cache"""
+    if os.path.getsize(file_path) > _streaming_threshold():
+        return load_md5_set(file_path)
+    return np.unique(load_columns(file_path).md5)
+
+def stream_missing_rows(source_file, target_file, chunksize=STREAMING_CHUNK_ROWS):
+    """Yield source rows whose MD5Hash is absent from the target, holding one chunk at a time"""
+    target_digests = load_md5_set(target_file, chunksize)
+    logger.info(f"Loaded {len(target_digests)} target hashes ({target_digests.nbytes / 1024:.0f} KB)")
+
+    for chunk in pd.read_csv(source_file, dtype=str, keep_default_na=False, chunksize=chunksize):
+        inc('ctidashy_manifest_rows_parsed_total', len(chunk), reader='pandas')
+        chunk['MD5Hash'] = chunk['MD5Hash'].str.lower()
+        missing = ~np.isin(md5_digests(chunk['MD5Hash']), target_digests)
+        if missing.any():
+            yield from chunk[missing].to_dict('records')
+
+def _iter_missing_columns(source, missing, offset):
+    for start in range(0, len(missing), DIFFERENCE_CHUNK_ROWS):
+        for position, row in enumerate(source.rows(missing[start:start + DIFFERENCE_CHUNK_ROWS]), offset + start):
+            yield position, row.as_dict(MD5Hash=row.MD5Hash.lower())
+
+def find_differences(source_file, target_file, streaming=None, offset=0):
+    """Source rows missing from the target as (total, iterator of (position, row)).
+
+    Rows are produced lazily from offset onwards. total is None in streaming mode,
+    where it is only known once the whole source has been read.
+    """
+    if streaming is None:
+        streaming = os.path.getsize(source_file) + os.path.getsize(target_file) > _streaming_threshold()
+
+    if streaming:
+        return None, islice(enumerate(stream_missing_rows(source_file, target_file)), offset, None)
+
+    source = load_columns(source_file)
+    target = load_columns(target_file)
+    missing = np.flatnonzero(~np.isin(source.md5, target.md5))
+    return len(missing), _iter_missing_columns(source, missing[offset:], offset)
+
+def compare_manifests(source_file, target_file, streaming=None):
+    """Every difference of a pair in one list; compare-all streams them instead"""
     try:
-        source_df = read_manifest_file(source_file)
-        target_df = read_manifest_file(target_file)
-        
-        if source_df is None or target_df is None:
-            raise ValueError("Failed to read manifest files")
-            
-        missing_df = source_df[~source_df['MD5Hash'].isin(target_df['MD5Hash'])]
-        differences = missing_df.to_dict('records')
-        logger.info(f"Found {len(differences)} differences")
-        
-        clean_differences = []
-        for diff in differences:
-            clean_diff = {k: ('' if pd.isna(v) else v) for k, v in diff.items()}
-            clean_differences.append(clean_diff)
-            
-        return clean_differences
+        total, rows = find_differences(source_file, target_file, streaming)
+        differences = [diff for _, diff in rows]
+        logger.info(f"Found {len(differences)} differences{' (streaming)' if total is None else ''}")
+        return differences
         
     except Exception as e:
         logger.error(f"Error comparing manifests: {str(e)}")
         raise
 
-def compare_all_manifests(low_side_dir, high_side_dir):
+def _difference_chunks(source_file, target_file):
+    """Differences of a pair as (row count, JSON list) chunks of up to DIFFERENCE_CHUNK_ROWS rows, produced lazily"""
+    _, rows = find_differences(source_file, target_file)
+    rows = (row for _, row in rows)
+    chunk = list(islice(rows, DIFFERENCE_CHUNK_ROWS))
+    while chunk:
+        yield len(chunk), json.dumps(chunk)
+        chunk = list(islice(rows, DIFFERENCE_CHUNK_ROWS))
+
+def _pair_chunks(source_file, target_file):
+    """(chunks, cached) for a pair, reading the stored result while neither file has changed"""
+    cache = get_compare_cache()
+    if cache is None:
+        return _difference_chunks(source_file, target_file), False
+
+    key = cache.key(source_file, target_file)
+    chunks = cache.get(key)
+    if chunks is not None:
+        return chunks, True
+    return cache.store(key, source_file, target_file, _difference_chunks(source_file, target_file)), False
+
+def compare_manifest_pair(name, source_file, target_file, spool_path=None):
+    """Compare one low/high pair for compare-all.
+
+    The differences are written to spool_path, one JSON list of up to DIFFERENCE_CHUNK_ROWS
+    rows per line, and only their count is returned, so the result stays small however
+    many there are (it may come back from a compare process). Without a spool_path they
+    only go to the compare cache.
+    """
+    start = time.perf_counter()
+    result = {'manifest': name, 'difference_count': 0, 'error': None, 'cached': False}
+
+    if not os.path.exists(target_file):
+        result['error'] = 'Target file not found on high side'
+    else:
+        try:
+            chunks, result['cached'] = _pair_chunks(source_file, target_file)
+            try:
+                with open(spool_path or os.devnull, 'w', encoding='utf-8') as spool:
+                    for rows, text in chunks:
+                        spool.write(text + '\n')
+                        result['difference_count'] += rows
+            finally:
+                chunks.close()
+        except Exception as e:
+            result['error'] = str(e)
+
+    result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+def _pair_results(result, spool_path):
+    """The compare-all results of one pair: its spooled differences chunk by chunk, all
+    but the last marked continued, and the last one carrying the pair's summary"""
+    previous = []
+    if result['error'] is None and os.path.exists(spool_path):
+        with open(spool_path, 'r', encoding='utf-8') as spool:
+            for index, line in enumerate(spool):
+                if index > 0:
+                    yield {'manifest': result['manifest'], 'differences': previous, 'continued': True}
+                previous = json.loads(line)
+    if os.path.exists(spool_path):
+        os.remove(spool_path)
+    yield {**result, 'differences': previous, 'continued': False}
+
+def _create_executor(config, pair_count):
+    workers = max(1, min(int(config.get('compare_workers', 4)), MAX_COMPARE_WORKERS, pair_count))
+    if config.get('compare_executor', 'thread') == 'process':
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='compare')
+
+def iter_compare_all_manifests(low_side_dir, high_side_dir, config=None):
+    """Yield compare results for every low-side manifest, in name order, as they complete.
+
+    A manifest's differences come in results of up to DIFFERENCE_CHUNK_ROWS rows (see
+    _pair_results). Each pair is compared into a spool file, so memory does not grow
+    with the size of the manifests or the number of differences.
+    """
+    config = config or load_config()
+    pairs = [
+        (file['name'], os.path.join(low_side_dir, file['name']), os.path.join(high_side_dir, file['name']))
+        for file in get_manifest_files(low_side_dir)
+    ]
+    if not pairs:
+        return
+
+    with tempfile.TemporaryDirectory(prefix='ctidashy-compare-') as spool_dir:
+        spools = [os.path.join(spool_dir, f"{index}.jsonl") for index in range(len(pairs))]
+        executor = _create_executor(config, len(pairs))
+        try:
+            for result, spool_path in zip(executor.map(compare_manifest_pair, *zip(*pairs), spools), spools):
+                yield from _pair_results(result, spool_path)
+        finally:
+            # Closing the generator early (e.g. a cancelled job) drops the pairs not yet started
+            executor.shutdown(wait=True, cancel_futures=True)
+
+def compare_all_manifests(low_side_dir, high_side_dir, config=None):
+    """One result per manifest with all its differences in a list, so everything is held in memory"""
     try:
-        low_side_files = get_manifest_files(low_side_dir)
         results = []
-        
-        for file in low_side_files:
-            source_file = os.path.join(low_side_dir, file['name'])
-            target_file = os.path.join(high_side_dir, file['name'])
-            
-            if not os.path.exists(target_file):
-                results.append({
-                    'manifest': file['name'],
-                    'differences': [],
-                    'error': 'Target file not found on high side'
-                })
-                continue
-                
-            try:
-                differences = compare_manifests(source_file, target_file)
-                results.append({
-                    'manifest': file['name'],
-                    'differences': differences,
-                    'error': None
-                })
-            except Exception as e:
-                results.append({
-                    'manifest': file['name'],
-                    'differences': [],
-                    'error': str(e)
-                })
-                
+        differences = []
+        for result in iter_compare_all_manifests(low_side_dir, high_side_dir, config):
+            differences.extend(result['differences'])
+            if not result['continued']:
+                results.append({**result, 'differences': differences})
+                differences = []
         return results
     except Exception as e:
         logger.error(f"Error in compare_all_manifests: {str(e)}")
         raise
 
+def _run_compare_all_job(job, low_side_dir, high_side_dir, config):
+    job.total = len(get_manifest_files(low_side_dir))
+    differences = 0
+    cached = 0
+    for result in iter_compare_all_manifests(low_side_dir, high_side_dir, config):
+        job.check_cancelled()
+        differences += len(result['differences'])
+        if result['continued']:
+            job.add_results([result], advance=0)
+            continue
+        cached += result['cached']
+        job.summary = {'manifests': job.done + 1, 'differences': differences, 'cached': cached}
+        job.add_results([result])
+
+def manifest_date(directory, name):
+    """Date a manifest covers, taken from its name (CTImanifest_20250129.csv) or else its mtime"""
+    match = MANIFEST_DATE_PATTERN.search(name)
+    if match:
+        try:
+            return datetime(*(int(part) for part in match.groups())).date()
+        except ValueError:
+            pass
+    return datetime.fromtimestamp(os.path.getmtime(os.path.join(directory, name))).date()
+
+def manifests_in_window(directory, date_from=None, date_to=None):
+    names = []
+    for file in get_manifest_files(directory):
+        day = manifest_date(directory, file['name'])
+        if (date_from and day < date_from) or (date_to and day > date_to):
+            continue
+        names.append(file['name'])
+    return names
+
+def build_hash_locator(high_side_dir, names):
+    """Sorted digests of every high-side hash, with the index of the first manifest each landed in"""
+    digests = []
+    owners = []
+    for index, name in enumerate(names):
+        manifest_digests = manifest_md5s(os.path.join(high_side_dir, name))
+        digests.append(manifest_digests)
+        owners.append(np.full(len(manifest_digests), index, dtype=np.int32))
+
+    if not digests:
+        return np.empty(0, dtype='S16'), np.empty(0, dtype=np.int32)
+
+    digests = np.concatenate(digests)
+    owners = np.concatenate(owners)
+    # Stable sort keeps the earliest manifest first among duplicates, np.unique then picks it
+    order = np.argsort(digests, kind='stable')
+    digests, first = np.unique(digests[order], return_index=True)
+    return digests, owners[order][first]
+
+def reconcile_manifest(source_file, name, locator, high_names, own_digests=None, chunksize=STREAMING_CHUNK_ROWS):
+    """Check every row of one low-side manifest against the whole high side.
+
+    own_digests are the digests of the high-side manifest of the same name; rows found
+    there landed where expected, the locator is only asked about the rest.
+
+    Yields the missing and relocated rows in results of up to DIFFERENCE_CHUNK_ROWS rows
+    each, marked continued, then a last one with the rest and the manifest's counts.
+    """
+    digests, owners = locator
+    if own_digests is None:
+        own_digests = np.empty(0, dtype='S16')
+    result = {'manifest': name, 'rows': 0, 'matched': 0, 'missing': [], 'relocated': [], 'landed_in': {},
+              'missing_count': 0, 'relocated_count': 0}
+
+    for chunk in pd.read_csv(source_file, dtype=str, keep_default_na=False, chunksize=chunksize):
+        inc('ctidashy_manifest_rows_parsed_total', len(chunk), reader='pandas')
+        chunk['MD5Hash'] = chunk['MD5Hash'].str.lower()
+        chunk_digests = md5_digests(chunk['MD5Hash'])
+        positions = np.searchsorted(digests, chunk_digests)
+        positions[positions >= len(digests)] = 0
+        found = (digests[positions] == chunk_digests) if len(digests) else np.zeros(len(chunk), dtype=bool)
+
+        at_home = np.isin(chunk_digests, own_digests)
+        found |= at_home
+        result['rows'] += len(chunk)
+        result['missing'].extend(chunk[~found].to_dict('records'))
+        result['missing_count'] += int((~found).sum())
+
+        if at_home.any():
+            result['landed_in'][name] = result['landed_in'].get(name, 0) + int(at_home.sum())
+        elsewhere = found & ~at_home
+        landed = owners[positions[elsewhere]]
+        for high_index, count in zip(*np.unique(landed, return_counts=True)):
+            landed_name = high_names[high_index]
+            result['landed_in'][landed_name] = result['landed_in'].get(landed_name, 0) + int(count)
+
+        result['matched'] += int(found.sum())
+        result['relocated_count'] += len(landed)
+        for row, high_index in zip(chunk[elsewhere].to_dict('records'), landed):
+            row['LandedIn'] = high_names[high_index]
+            result['relocated'].append(row)
+
+        while len(result['missing']) >= DIFFERENCE_CHUNK_ROWS or len(result['relocated']) >= DIFFERENCE_CHUNK_ROWS:
+            yield {'manifest': name, 'missing': result['missing'][:DIFFERENCE_CHUNK_ROWS],
+                   'relocated': result['relocated'][:DIFFERENCE_CHUNK_ROWS], 'continued': True}
+            del result['missing'][:DIFFERENCE_CHUNK_ROWS]
+            del result['relocated'][:DIFFERENCE_CHUNK_ROWS]
+
+    yield {**result, 'continued': False}
+
+def _run_reconcile_job(job, low_side_dir, high_side_dir, low_window, high_window):
+    low_names = manifests_in_window(low_side_dir, *low_window)
+    high_names = manifests_in_window(high_side_dir, *high_window)
+    job.total = len(low_names)
+
+    locator = build_hash_locator(high_side_dir, high_names)
+    job.summary = {'high_manifests': len(high_names), 'high_hashes': len(locator[0]),
+                   'manifests': 0, 'missing': 0, 'relocated': 0}
+    logger.info(f"Reconciling {len(low_names)} low-side manifests against {len(locator[0])} high-side hashes")
+
+    for name in low_names:
+        job.check_cancelled()
+        start = time.perf_counter()
+        try:
+            own_digests = manifest_md5s(os.path.join(high_side_dir, name)) if name in high_names else None
+            for result in reconcile_manifest(os.path.join(low_side_dir, name), name, locator, high_names, own_digests):
+                if result['continued']:
+                    job.check_cancelled()
+                    job.add_results([result], advance=0)
+            result['error'] = None
+        except JobCancelled:
+            raise
+        except Exception as e:
+            result = {'manifest': name, 'error': str(e), 'continued': False}
+        result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+
+        job.summary = {
+            **job.summary,
+            'manifests': job.summary['manifests'] + 1,
+            'missing': job.summary['missing'] + result.get('missing_count', 0),
+            'relocated': job.summary['relocated'] + result.get('relocated_count', 0)
+        }
+        job.add_results([result])
+
+def _parse_window_date(value):
+    value = (value or '').strip()
+    return datetime.strptime(value, "%Y-%m-%d").date() if value else None
+
 @app.route('/manifest')
 def manifest():
     config = load_config()
@@ -156,10 +411,21 @@ def compare_manifests_endpoint():
             
         source_file = os.path.join(config['low_side_manifest_dir'], data['source_file'])
         target_file = os.path.join(config['high_side_manifest_dir'], data['target_file'])
+        limit, cursor, stream = page_request(data)
+
+        # Differences are numbered in source order, the cursor is the position of the last one sent
+        if cursor is not None and not isinstance(cursor, int):
+            raise InvalidCursor('Invalid cursor')
+        offset = cursor + 1 if cursor is not None else 0
+        total, rows = find_differences(source_file, target_file, data.get('streaming'), offset)
+        if stream:
+            return ndjson_response(rows, limit)
+
+        differences, next_cursor = take_page(rows, limit)
+        return jsonify({'status': 'success', 'differences': differences, 'total': total, 'next_cursor': next_cursor})
         
-        differences = compare_manifests(source_file, target_file)
-        return jsonify({'status': 'success', 'differences': differences})
-        
+    except InvalidCursor as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     except Exception as e:
         logger.error(f"Comparison error: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -177,9 +443,39 @@ def compare_all_manifests_endpoint():
         low_side_dir = config.get('low_side_manifest_dir', '')
         high_side_dir = config.get('high_side_manifest_dir', '')
         
-        results = compare_all_manifests(low_side_dir, high_side_dir)
-        return jsonify({'status': 'success', 'results': results})
+        job = submit_job('compare_all', _run_compare_all_job, low_side_dir, high_side_dir, config)
+        return jsonify({'status': 'success', 'job_id': job.id}), 202
         
     except Exception as e:
         logger.error(f"Compare all error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/reconcile_manifests', methods=['POST'])
+def reconcile_manifests_endpoint():
+    try:
+        config = load_config()
+        if not config.get('manifest_enabled', True):
+            return jsonify({
+                'status': 'error',
+                'message': 'Manifest feature is disabled'
+            }), 403
+
+        data = request.get_json(silent=True) or {}
+        try:
+            date_from = _parse_window_date(data.get('date_from'))
+            date_to = _parse_window_date(data.get('date_to'))
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'Dates must be YYYY-MM-DD'}), 400
+
+        # Files can land on the high side a few days after the low-side manifest that listed them
+        grace = timedelta(days=int(config.get('reconcile_grace_days', 3)))
+        high_window = (date_from, date_to + grace if date_to else None)
+
+        job = submit_job('reconcile', _run_reconcile_job,
+                         config.get('low_side_manifest_dir', ''), config.get('high_side_manifest_dir', ''),
+                         (date_from, date_to), high_window)
+        return jsonify({'status': 'success', 'job_id': job.id}), 202
+
+    except Exception as e:
+        logger.error(f"Reconcile error: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
\ No newline at end of file
@@ -0,0 +1,253 @@
+# CTIDashy_Flask/app/manifest_index.py
+import os
+import re
+import sqlite3
+import logging
+import threading
+from app.config import CACHE_DIR
+from app.db import LOOKUP_CHUNK_SIZE, connect
+from app.ingest import MANIFEST_COLUMNS, is_manifest_name, prefix_digest, read_rows
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = os.path.join(CACHE_DIR, 'manifest_index.db')
+
+# Bumped whenever the tables or what goes in them change, older index files are dropped and rebuilt
+# (3: only the resend manifests are indexed)
+SCHEMA_VERSION = 3
+
+MD5_PATTERN = re.compile(r'^[0-9a-fA-F]{32}$')
+
+# Trigram tokens need at least three characters, shorter terms fall back to a scan
+MIN_FTS_TERM_LENGTH = 3
+
+_INSERT_ROW = ('INSERT INTO rows (path, directory, manifest, rowno, md5, Filename, CTIfeed, MD5Hash, '
+               'DateTime, FileSize, FlowUUID, Resend) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)')
+
+_sync_lock = threading.Lock()
+_fts_available = None
+
+def _init_schema(conn):
+    global _fts_available
+
+    if conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+        conn.executescript("""
+            DROP TABLE IF EXISTS rows_fts;
+            DROP TABLE IF EXISTS rows;
+            DROP TABLE IF EXISTS manifests;
+        """)
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS manifests (
+            path TEXT PRIMARY KEY,
+            directory TEXT NOT NULL,
+            name TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime REAL NOT NULL,
+            head TEXT NOT NULL,
+            row_count INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS rows (
+            id INTEGER PRIMARY KEY,
+            path TEXT NOT NULL,
+            directory TEXT NOT NULL,
+            manifest TEXT NOT NULL,
+            rowno INTEGER NOT NULL,
+            md5 TEXT NOT NULL,
+            Filename TEXT, CTIfeed TEXT, MD5Hash TEXT, DateTime TEXT,
+            FileSize TEXT, FlowUUID TEXT, Resend TEXT
+        );
+        CREATE INDEX IF NOT EXISTS rows_md5 ON rows(md5);
+        CREATE INDEX IF NOT EXISTS rows_path ON rows(path, rowno);
+        CREATE INDEX IF NOT EXISTS rows_order ON rows(directory, manifest, rowno);
+    """)
+
+    if _fts_available is None:
+        try:
+            conn.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS rows_fts USING fts5(
+                    Filename, CTIfeed, MD5Hash, DateTime, FileSize, FlowUUID, Resend,
+                    content='rows', content_rowid='id', tokenize='trigram'
+                );
+                CREATE TRIGGER IF NOT EXISTS rows_ai AFTER INSERT ON rows BEGIN
+                    INSERT INTO rows_fts(rowid, Filename, CTIfeed, MD5Hash, DateTime, FileSize, FlowUUID, Resend)
+                    VALUES (new.id, new.Filename, new.CTIfeed, new.MD5Hash, new.DateTime,
+                            new.FileSize, new.FlowUUID, new.Resend);
+                END;
+                CREATE TRIGGER IF NOT EXISTS rows_ad AFTER DELETE ON rows BEGIN
+                    INSERT INTO rows_fts(rows_fts, rowid, Filename, CTIfeed, MD5Hash, DateTime,
+                                         FileSize, FlowUUID, Resend)
+                    VALUES ('delete', old.id, old.Filename, old.CTIfeed, old.MD5Hash, old.DateTime,
+                            old.FileSize, old.FlowUUID, old.Resend);
+                END;
+            """)
+            _fts_available = True
+        except sqlite3.OperationalError as e:
+            # Older SQLite builds ship without the fts5 trigram tokenizer
+            logger.warning(f"Full-text index unavailable, using table scans: {str(e)}")
+            _fts_available = False
+
+def _index_manifest(conn, directory, name, stat, indexed):
+    """Add a manifest's rows to the index, only inserting the new tail when it was appended to"""
+    file_path = os.path.join(directory, name)
+
+    start = 0
+    if indexed is not None and stat.st_size >= indexed['size'] \
+            and prefix_digest(file_path, indexed['size']) == indexed['head']:
+        # The last indexed row may have been written without its newline yet, so re-read it too
+        start = max(indexed['row_count'] - 1, 0)
+    conn.execute('DELETE FROM rows WHERE path = ? AND rowno >= ?', (file_path, start))
+
+    rows = read_rows(file_path)
+    batch = []
+    for rowno in range(start, len(rows)):
+        row = rows[rowno]
+        batch.append((file_path, directory, name, rowno, row.MD5Hash.strip().lower(), *row.values()))
+        if len(batch) >= 5000:
+            conn.executemany(_INSERT_ROW, batch)
+            batch = []
+    if batch:
+        conn.executemany(_INSERT_ROW, batch)
+
+    conn.execute('INSERT OR REPLACE INTO manifests (path, directory, name, size, mtime, head, row_count) '
+                 'VALUES (?,?,?,?,?,?,?)',
+                 (file_path, directory, name, stat.st_size, stat.st_mtime,
+                  prefix_digest(file_path, stat.st_size), len(rows)))
+    return len(rows) - start
+
+def sync_index(manifest_dir):
+    """Bring the index in line with manifest_dir, re-reading only new or changed manifests"""
+    if not manifest_dir or not os.path.exists(manifest_dir):
+        return
+
+    on_disk = {}
+    for file in os.listdir(manifest_dir):
+        if is_manifest_name(file):
+            on_disk[file] = os.stat(os.path.join(manifest_dir, file))
+
+    with _sync_lock:
+        conn = connect(INDEX_FILE, row_factory=sqlite3.Row)
+        try:
+            _init_schema(conn)
+            indexed = {
+                row['name']: row for row in
+                conn.execute('SELECT name, size, mtime, head, row_count FROM manifests WHERE directory = ?',
+                             (manifest_dir,))
+            }
+
+            changed = [
+                name for name, stat in on_disk.items()
+                if name not in indexed
+                or indexed[name]['size'] != stat.st_size
+                or indexed[name]['mtime'] != stat.st_mtime
+            ]
+            removed = [name for name in indexed if name not in on_disk]
+
+            if not changed and not removed:
+                return
+
+            # IMMEDIATE takes the write lock up front so concurrent workers queue instead of failing
+            conn.execute('BEGIN IMMEDIATE')
+            for name in removed:
+                file_path = os.path.join(manifest_dir, name)
+                conn.execute('DELETE FROM rows WHERE path = ?', (file_path,))
+                conn.execute('DELETE FROM manifests WHERE path = ?', (file_path,))
+            for name in sorted(changed):
+                try:
+                    count = _index_manifest(conn, manifest_dir, name, on_disk[name], indexed.get(name))
+                    logger.info(f"Indexed {count} rows from {name}")
+                except Exception as e:
+                    logger.error(f"Error indexing {name}: {str(e)}")
+            conn.commit()
+        finally:
+            conn.close()
+
+def _row_to_result(row):
+    result = {column: row[column] or '' for column in MANIFEST_COLUMNS}
+    result['ManifestFile'] = row['manifest']
+    return result
+
+def iter_search(manifest_dir, search_term, after=None):
+    """Yield ((manifest, rowno), result) for matching rows in manifest/row order.
+
+    after is the (manifest, rowno) of the last row already returned, so large result
+    sets can be read page by page without materialising them.
+    """
+    sync_index(manifest_dir)
+
+    term = search_term.strip()
+    if not term:
+        return
+
+    conn = connect(INDEX_FILE, row_factory=sqlite3.Row)
+    try:
+        _init_schema(conn)
+        columns = 'r.manifest, r.rowno, ' + ', '.join(f'r.{c}' for c in MANIFEST_COLUMNS)
+        keyset = ''
+        keyset_params = ()
+        if after is not None:
+            keyset = ' AND (r.manifest, r.rowno) > (?, ?)'
+            keyset_params = (after[0], after[1])
+
+        md5_match = MD5_PATTERN.match(term) and conn.execute(
+            'SELECT 1 FROM rows WHERE directory = ? AND md5 = ? LIMIT 1', (manifest_dir, term.lower())
+        ).fetchone()
+
+        if md5_match:
+            cursor = conn.execute(
+                f'SELECT {columns} FROM rows r WHERE r.directory = ? AND r.md5 = ?{keyset} '
+                f'ORDER BY r.manifest, r.rowno',
+                (manifest_dir, term.lower(), *keyset_params)
+            )
+        elif _fts_available and len(term) >= MIN_FTS_TERM_LENGTH:
+            phrase = '"' + term.replace('"', '""') + '"'
+            cursor = conn.execute(
+                # CROSS JOIN pins the full-text match as the outer loop of the query plan
+                f'SELECT {columns} FROM rows_fts CROSS JOIN rows r ON r.id = rows_fts.rowid '
+                f'WHERE rows_fts MATCH ? AND r.directory = ?{keyset} ORDER BY r.manifest, r.rowno',
+                (phrase, manifest_dir, *keyset_params)
+            )
+        else:
+            pattern = '%' + term.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            conditions = ' OR '.join(f"lower(r.{c}) LIKE ? ESCAPE '\\'" for c in MANIFEST_COLUMNS)
+            cursor = conn.execute(
+                f'SELECT {columns} FROM rows r WHERE r.directory = ? AND ({conditions}){keyset} '
+                f'ORDER BY r.manifest, r.rowno',
+                (manifest_dir, *([pattern] * len(MANIFEST_COLUMNS)), *keyset_params)
+            )
+
+        for row in cursor:
+            yield (row['manifest'], row['rowno']), _row_to_result(row)
+    finally:
+        conn.close()
+
+def search_index(manifest_dir, search_term):
+    """Case-insensitive substring search across every column of every indexed manifest"""
+    return [result for _, result in iter_search(manifest_dir, search_term)]
+
+def lookup_md5s(manifest_dir, md5s):
+    """Map each lowercase MD5 in md5s to the manifest rows that have it.
+
+    Hashes are looked up LOOKUP_CHUNK_SIZE at a time through the md5 index; hashes
+    with no rows are left out. Call sync_index first.
+    """
+    found = {}
+    conn = connect(INDEX_FILE, row_factory=sqlite3.Row)
+    try:
+        _init_schema(conn)
+        columns = 'manifest, rowno, md5, ' + ', '.join(MANIFEST_COLUMNS)
+        for start in range(0, len(md5s), LOOKUP_CHUNK_SIZE):
+            chunk = md5s[start:start + LOOKUP_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            cursor = conn.execute(
+                f'SELECT {columns} FROM rows WHERE directory = ? AND md5 IN ({placeholders}) '
+                f'ORDER BY manifest, rowno',
+                (manifest_dir, *chunk)
+            )
+            for row in cursor:
+                found.setdefault(row['md5'], []).append(_row_to_result(row))
+    finally:
+        conn.close()
+    return found
@@ -0,0 +1,291 @@
+# CTIDashy_Flask/app/metrics.py
+import os
+import json
+import time
+import logging
+import threading
+from bisect import bisect_left
+from flask import Response, g, request
+from app import app
+from app.config import CACHE_DIR
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: snapshots of exited processes are never folded together
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# One snapshot file per worker process, /metrics adds them up
+METRICS_DIR = os.path.join(CACHE_DIR, 'metrics')
+
+# Seconds between snapshot writes of a process that has recorded something new
+SNAPSHOT_INTERVAL = 1.0
+
+# Totals of exited processes, so their snapshot files do not pile up
+RETIRED_FILE = 'retired.json'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    'ctidashy_http_requests_total': ('counter', 'HTTP requests by endpoint, method and status', None),
+    'ctidashy_http_request_duration_seconds': (
+        'histogram', 'Seconds from the start of a request until its response was sent', LATENCY_BUCKETS),
+    'ctidashy_http_request_size_bytes': ('histogram', 'Request body size in bytes', SIZE_BUCKETS),
+    'ctidashy_http_response_size_bytes': (
+        'histogram', 'Response body size in bytes, counted as sent for streamed responses', SIZE_BUCKETS),
+    'ctidashy_manifest_rows_parsed_total': ('counter', 'Manifest rows parsed from CSV', None),
+    'ctidashy_opencti_request_duration_seconds': (
+        'histogram', 'Seconds per OpenCTI GraphQL call, including retries', LATENCY_BUCKETS),
+    'ctidashy_cache_requests_total': ('counter', 'Cache lookups by cache and result', None),
+}
+
+class Registry:
+    """Counters and histograms of this process, written to METRICS_DIR/<pid>.json.
+
+    Every gunicorn worker (and compare process) keeps its own values and a background
+    thread writes them out at most once per SNAPSHOT_INTERVAL; /metrics sums the files
+    of all processes. Files of exited processes are added to RETIRED_FILE rather than
+    dropped, so totals never go backwards.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        # (name, labels) -> per-bucket counts (the last one is +Inf) followed by the sum
+        self.histograms = {}
+        self._pid = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+
+    def _start(self):
+        """Called with the lock held before every change"""
+        if self._pid == os.getpid():
+            return
+        # First use in this process, or a worker forked from a process that already
+        # recorded values: those belong to the parent's file
+        self._pid = os.getpid()
+        self.counters = {}
+        self.histograms = {}
+        threading.Thread(target=self._flush_loop, name='metrics-snapshot', daemon=True).start()
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._start()
+            self.counters[key] = self.counters.get(key, 0) + amount
+            self._dirty = True
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._start()
+            counts = self.histograms.get(key)
+            if counts is None:
+                counts = self.histograms[key] = [0] * (len(buckets) + 2)
+            counts[bisect_left(buckets, value)] += 1
+            counts[-1] += value
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            # Also skips values a forked worker inherited but has not taken over yet
+            if not self._dirty or self._pid != os.getpid():
+                return
+            snapshot = _snapshot(self.counters, self.histograms)
+            self._dirty = False
+
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.path)
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(SNAPSHOT_INTERVAL)
+            try:
+                self.save()
+            except Exception as e:
+                logger.error(f"Could not write metrics snapshot: {str(e)}")
+
+def _snapshot(counters, histograms):
+    return {
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, list(counts)] for (name, labels), counts in histograms.items()]
+    }
+
+def _read_snapshot(path):
+    counters = {}
+    histograms = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return counters, histograms
+
+    for name, labels, value in snapshot.get('counters', []):
+        counters[(name, tuple(tuple(label) for label in labels))] = value
+    for name, labels, counts in snapshot.get('histograms', []):
+        histograms[(name, tuple(tuple(label) for label in labels))] = counts
+    return counters, histograms
+
+registry = Registry()
+
+def inc(name, amount=1, **labels):
+    registry.inc(name, amount, **labels)
+
+def observe(name, value, **labels):
+    registry.observe(name, value, **labels)
+
+def _merge(counters, histograms, file_counters, file_histograms):
+    for key, value in file_counters.items():
+        counters[key] = counters.get(key, 0) + value
+    for key, counts in file_histograms.items():
+        if key[0] not in METRICS or len(counts) != len(METRICS[key[0]][2]) + 2:
+            # Written with other buckets by an older version
+            continue
+        total = histograms.setdefault(key, [0] * len(counts))
+        for index, count in enumerate(counts):
+            total[index] += count
+
+def _running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _retire_exited():
+    """Fold the snapshots of processes that have exited into RETIRED_FILE; called with the lock held"""
+    exited = [
+        file for file in os.listdir(METRICS_DIR)
+        if file.endswith('.json') and file[:-5].isdigit() and not _running(int(file[:-5]))
+    ]
+    if not exited:
+        return
+
+    retired_path = os.path.join(METRICS_DIR, RETIRED_FILE)
+    counters, histograms = _read_snapshot(retired_path)
+    for file in exited:
+        _merge(counters, histograms, *_read_snapshot(os.path.join(METRICS_DIR, file)))
+    tmp_path = f"{retired_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(_snapshot(counters, histograms), f)
+    os.replace(tmp_path, retired_path)
+    for file in exited:
+        os.remove(os.path.join(METRICS_DIR, file))
+
+def collect():
+    """Counters and histograms summed over the snapshot files of every process"""
+    counters = {}
+    histograms = {}
+    os.makedirs(METRICS_DIR, exist_ok=True)
+
+    # Scrapes served by different workers must not retire the same file twice
+    with open(os.path.join(METRICS_DIR, 'collect.lock'), 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            _retire_exited()
+        for file in os.listdir(METRICS_DIR):
+            if file.endswith('.json'):
+                _merge(counters, histograms, *_read_snapshot(os.path.join(METRICS_DIR, file)))
+    return counters, histograms
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+def _number(value):
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+def render(counters, histograms):
+    """Prometheus text exposition format"""
+    lines = []
+    for name, (kind, description, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+            continue
+
+        for (metric, labels), counts in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], counts[:-1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else _number(float(bound))
+                lines.append(f"{name}_bucket{_labels(labels, [('le', le)])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(counts[-1])}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+def _count_sent(body, sent):
+    """Pass a streamed body through, adding the bytes of each chunk to sent[0]"""
+    try:
+        for chunk in body:
+            sent[0] += len(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            yield chunk
+    finally:
+        close = getattr(body, 'close', None)
+        if close:
+            close()
+
+@app.before_request
+def start_request_timer():
+    g.metrics_start = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return response
+
+    # The endpoint, not the path, so ids and 404 probes do not each become a series
+    endpoint = request.endpoint or 'unmatched'
+    method = request.method
+    request_size = request.content_length or 0
+    sent = [0]
+    if response.is_streamed and not response.direct_passthrough:
+        response.response = _count_sent(response.response, sent)
+    else:
+        sent[0] = response.calculate_content_length() or 0
+
+    def finish():
+        # Runs once the body has been sent, so streamed responses are timed in full
+        inc('ctidashy_http_requests_total', endpoint=endpoint, method=method, status=str(response.status_code))
+        observe('ctidashy_http_request_duration_seconds', time.perf_counter() - start, endpoint=endpoint, method=method)
+        observe('ctidashy_http_request_size_bytes', request_size, endpoint=endpoint)
+        observe('ctidashy_http_response_size_bytes', sent[0], endpoint=endpoint)
+
+    response.call_on_close(finish)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    try:
+        # This worker's latest values, without waiting for its next snapshot
+        registry.save()
+        return Response(render(*collect()), mimetype=PROMETHEUS_MIMETYPE)
+    except Exception as e:
+        logger.error(f"Metrics error: {str(e)}")
+        return Response(f"# error: {str(e)}\n", status=500, mimetype=PROMETHEUS_MIMETYPE)
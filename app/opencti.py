@@ -0,0 +1,162 @@
+# CTIDashy_Flask/app/opencti.py
+import time
+import logging
+import threading
+from collections import deque
+from urllib.parse import urljoin
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask import jsonify
+from app import app
+from app.config import load_config
+from app.metrics import observe
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Responses from OpenCTI (or a proxy in front of it) worth retrying
+RETRY_STATUSES = (429, 502, 503, 504)
+
+# Recent call latencies kept for percentiles
+LATENCY_WINDOW = 500
+
+_client = None
+_client_lock = threading.Lock()
+
+def graphql_endpoint(url):
+    """GraphQL endpoint for a configured OpenCTI URL, adding a scheme when none is given"""
+    url = url.strip()
+    if not url.startswith(('http://', 'https://')):
+        url = 'http://' + url
+    return urljoin(url.rstrip('/') + '/', 'graphql')
+
+class LatencyStats:
+    """Call counts and latencies for one kind of OpenCTI request"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.recent = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def record(self, elapsed_ms, failed):
+        with self._lock:
+            self.calls += 1
+            self.errors += failed
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+            self.recent.append(elapsed_ms)
+
+    def summary(self):
+        with self._lock:
+            recent = sorted(self.recent)
+        percentile = lambda p: round(recent[min(len(recent) - 1, int(len(recent) * p))], 1) if recent else None
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'avg_ms': round(self.total_ms / self.calls, 1) if self.calls else None,
+            'max_ms': round(self.max_ms, 1),
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95)
+        }
+
+class OpenCTIClient:
+    """Keep-alive GraphQL client with a bounded connection pool and retries with backoff"""
+
+    def __init__(self, pool_size=10, retries=2, backoff=0.5, connect_timeout=5):
+        self.settings = (pool_size, retries, backoff, connect_timeout)
+        self.connect_timeout = connect_timeout
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            # A query that timed out reading is likely to time out again, don't multiply the wait
+            read=0,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            # GraphQL queries are read-only, so retrying a POST is safe
+            allowed_methods=frozenset(['POST']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _stats_for(self, operation):
+        with self._stats_lock:
+            if operation not in self.stats:
+                self.stats[operation] = LatencyStats()
+            return self.stats[operation]
+
+    def post(self, url, api_key, query, variables=None, timeout=30, operation='query', verify=False):
+        """POST a GraphQL query to an OpenCTI instance and return the requests.Response"""
+        payload = {'query': query}
+        if variables is not None:
+            payload['variables'] = variables
+        headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {api_key}'
+        }
+
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = self.session.post(
+                graphql_endpoint(url),
+                json=payload,
+                headers=headers,
+                timeout=(self.connect_timeout, timeout),
+                verify=verify
+            )
+            failed = response.status_code >= 400
+            return response
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._stats_for(operation).record(elapsed_ms, failed)
+            observe('ctidashy_opencti_request_duration_seconds', elapsed_ms / 1000,
+                    operation=operation, outcome='error' if failed else 'ok')
+            logger.debug(f"OpenCTI {operation} took {elapsed_ms:.0f}ms{' (failed)' if failed else ''}")
+
+    def latency_stats(self):
+        with self._stats_lock:
+            operations = list(self.stats.items())
+        return {operation: stats.summary() for operation, stats in operations}
+
+    def close(self):
+        """Close the pooled connections; requests still running finish and then close theirs"""
+        self.session.close()
+
+def get_client():
+    """This worker's shared client, rebuilt when the pool or retry settings change"""
+    global _client
+    config = load_config()
+    settings = (
+        max(1, int(config.get('opencti_pool_size', 10))),
+        max(0, int(config.get('opencti_retries', 2))),
+        float(config.get('opencti_backoff', 0.5)),
+        float(config.get('opencti_connect_timeout', 5))
+    )
+    with _client_lock:
+        if _client is None or _client.settings != settings:
+            # Requests still running on the old session finish on it; the stats carry over
+            previous = _client
+            _client = OpenCTIClient(*settings)
+            if previous is not None:
+                _client.stats = previous.stats
+                previous.close()
+        return _client
+
+@app.route('/opencti_stats')
+def opencti_stats():
+    try:
+        return jsonify({'status': 'success', 'latency': get_client().latency_stats()})
+    except Exception as e:
+        logger.error(f"OpenCTI stats error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -0,0 +1,105 @@
+# CTIDashy_Flask/app/pagination.py
+import json
+import base64
+import logging
+from flask import Response, request
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Page size used when a client asks for paging without giving a limit
+DEFAULT_PAGE_SIZE = 500
+
+# Largest page a client may ask for in one request
+MAX_PAGE_SIZE = 10000
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(position):
+    """Opaque cursor for the position of the last item on a page"""
+    return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except Exception:
+        raise InvalidCursor('Invalid cursor')
+
+def row_position(cursor):
+    """Check a (manifest, row) cursor position as used by the manifest row endpoints"""
+    if cursor is None:
+        return None
+    if not (isinstance(cursor, list) and len(cursor) == 2 and isinstance(cursor[0], str) and isinstance(cursor[1], int)):
+        raise InvalidCursor('Invalid cursor')
+    return cursor
+
+def page_request(data):
+    """Read limit, cursor and stream options from a request body.
+
+    limit is None when the client asked for neither a limit nor a cursor, in which
+    case endpoints return everything as before. Streaming is requested with
+    "stream": true, ?format=ndjson or an Accept: application/x-ndjson header.
+    """
+    limit = data.get('limit')
+    cursor = data.get('cursor')
+    if limit is not None or cursor:
+        try:
+            limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+        except (TypeError, ValueError):
+            raise InvalidCursor('Invalid limit')
+
+    stream = (
+        bool(data.get('stream'))
+        or request.args.get('format') == 'ndjson'
+        or request.accept_mimetypes.best == NDJSON_MIMETYPE
+    )
+    return limit, decode_cursor(cursor), stream
+
+def take_page(items, limit):
+    """Collect up to limit items from (position, item) pairs.
+
+    Returns the page and the cursor for the next one, or None when nothing is left.
+    One extra item is read to tell the two apart.
+    """
+    page = []
+    last_position = None
+    for position, item in items:
+        if limit is not None and len(page) == limit:
+            return page, encode_cursor(last_position)
+        page.append(item)
+        last_position = position
+    return page, None
+
+def ndjson_response(items, limit=None):
+    """Stream (position, item) pairs as one JSON document per line.
+
+    With a limit the last line is {"next_cursor": ...} so a client can resume.
+    """
+    def generate():
+        count = 0
+        last_position = None
+        try:
+            for position, item in items:
+                if limit is not None and count == limit:
+                    yield json.dumps({'next_cursor': encode_cursor(last_position)}) + '\n'
+                    return
+                yield json.dumps(item) + '\n'
+                count += 1
+                last_position = position
+            if limit is not None:
+                yield json.dumps({'next_cursor': None}) + '\n'
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band
+            logger.error(f"Streaming error: {str(e)}")
+            yield json.dumps({'error': str(e)}) + '\n'
+        finally:
+            close = getattr(items, 'close', None)
+            if close:
+                close()
+
+    return Response(generate(), mimetype=NDJSON_MIMETYPE)
@@ -0,0 +1,279 @@
+# CTIDashy_Flask/app/profiling.py
+import os
+import sys
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from flask import g, has_request_context, jsonify, request, send_file
+from app import app
+from app.config import CACHE_DIR, load_config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Summary (.json) plus raw data of each profile: pstats (.prof) or folded stacks (.folded)
+PROFILES_DIR = os.path.join(CACHE_DIR, 'profiles')
+
+# A request is profiled when profiling_enabled is on and it carries this header or ?_profile=
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ARG = '_profile'
+
+# "sample" records the stacks of every thread doing the work (job and compare pools
+# included) every PROFILE_SAMPLE_INTERVAL seconds; "cprofile" traces every call, but
+# only in the thread the request or job runs on
+PROFILE_MODES = ('sample', 'cprofile')
+
+PROFILE_SAMPLE_INTERVAL = 0.005
+
+# Functions listed in a profile summary
+HOTSPOTS = 20
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler:
+    """Counts the Python stacks of the profiled threads, in flamegraph folded-stack form.
+
+    The profiled threads are the one that started the sampler and every thread that
+    did not exist yet at that point, which covers pools created for the request such
+    as the compare executor, while the watcher and idle workers stay out.
+    """
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._existing = set(sys._current_frames()) - {self._target}
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or thread_id in self._existing:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def hotspots(self):
+        """Frames with the most samples at the top of the stack"""
+        own = Counter()
+        for stack, count in self.stacks.items():
+            own[stack.rsplit(';', 1)[-1]] += count
+        total = sum(own.values()) or 1
+        return [{'function': frame, 'samples': count, 'percent': round(count * 100 / total, 1)}
+                for frame, count in own.most_common(HOTSPOTS)]
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+class Profile:
+    """One profiled request or background job; stop() writes it to PROFILES_DIR"""
+
+    def __init__(self, mode, info):
+        self.id = uuid.uuid4().hex
+        self.mode = mode
+        self.info = info
+        self._profiler = None
+        self._start = None
+
+    def start(self):
+        if self.mode == 'cprofile':
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:
+                # Python 3.12+ allows one cProfile at a time in the whole process
+                logger.warning(f"Profile {self.id} not started: {str(e)}")
+                return False
+        else:
+            profiler = StackSampler()
+            profiler.start()
+        self._profiler = profiler
+        self._start = time.perf_counter()
+        return True
+
+    def stop(self, **details):
+        if self._profiler is None:
+            return
+        elapsed_ms = round((time.perf_counter() - self._start) * 1000, 1)
+        profiler, self._profiler = self._profiler, None
+        try:
+            os.makedirs(PROFILES_DIR, exist_ok=True)
+            if self.mode == 'cprofile':
+                profiler.disable()
+                data_file = f"{self.id}.prof"
+                profiler.dump_stats(os.path.join(PROFILES_DIR, data_file))
+                hotspots = _cprofile_hotspots(profiler)
+            else:
+                profiler.stop()
+                data_file = f"{self.id}.folded"
+                profiler.save(os.path.join(PROFILES_DIR, data_file))
+                hotspots = profiler.hotspots()
+
+            summary = {
+                **self.info,
+                **details,
+                'id': self.id,
+                'mode': self.mode,
+                'created': time.time(),
+                'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'elapsed_ms': elapsed_ms,
+                'data_file': data_file,
+                'hotspots': hotspots
+            }
+            tmp_path = os.path.join(PROFILES_DIR, f".{self.id}.json.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(summary, f)
+            os.replace(tmp_path, os.path.join(PROFILES_DIR, f"{self.id}.json"))
+            logger.info(f"Saved profile {self.id} of {self.info.get('path')} ({elapsed_ms} ms)")
+            _prune(int(load_config().get('profiling_max_profiles', 50)))
+        except Exception as e:
+            logger.error(f"Could not save profile {self.id}: {str(e)}")
+
+def _cprofile_hotspots(profiler):
+    """Functions with the most time spent in their own code"""
+    stats = pstats.Stats(profiler).stats
+    ranked = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:HOTSPOTS]
+    return [{
+        # Built-ins have no file ('~')
+        'function': name if file == '~' else f"{name} ({os.path.basename(file)}:{line})",
+        'calls': calls,
+        'own_ms': round(own * 1000, 1),
+        'cumulative_ms': round(cumulative * 1000, 1)
+    } for (file, line, name), (_, calls, own, cumulative, _) in ranked]
+
+def _prune(keep):
+    summaries = list_profiles()
+    for summary in summaries[max(keep, 1):]:
+        for file in (f"{summary['id']}.json", summary.get('data_file')):
+            try:
+                os.remove(os.path.join(PROFILES_DIR, file))
+            except FileNotFoundError:
+                # Pruned by another worker meanwhile
+                pass
+
+def list_profiles(limit=None):
+    """Saved profile summaries, newest first"""
+    if not os.path.isdir(PROFILES_DIR):
+        return []
+    summaries = []
+    for file in os.listdir(PROFILES_DIR):
+        if not file.endswith('.json') or file.startswith('.'):
+            continue
+        try:
+            with open(os.path.join(PROFILES_DIR, file), 'r', encoding='utf-8') as f:
+                summaries.append(json.load(f))
+        except (OSError, ValueError):
+            # Pruned by another worker meanwhile
+            continue
+    summaries.sort(key=lambda summary: summary['created'], reverse=True)
+    return summaries[:limit] if limit else summaries
+
+def requested_mode():
+    """The mode this request asked to be profiled with, or None"""
+    value = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_ARG)
+    if not value or value.lower() in ('0', 'false', 'off'):
+        return None
+    if not load_config().get('profiling_enabled', False):
+        return None
+    value = value.lower()
+    return value if value in PROFILE_MODES else PROFILE_MODES[0]
+
+def job_profile(job):
+    """A Profile for a background job submitted by a profiled request, otherwise None"""
+    profile = g.get('profile') if has_request_context() else None
+    if profile is None:
+        return None
+    background = Profile(profile.mode, {
+        'kind': 'job',
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'job_id': job.id,
+        'request_profile': profile.id
+    })
+    g.profile_job_id = background.id
+    return background
+
+def _valid_profile_id(profile_id):
+    return len(profile_id) == 32 and all(c in '0123456789abcdef' for c in profile_id)
+
+@app.before_request
+def start_profile():
+    mode = requested_mode()
+    if mode is None:
+        return
+    profile = Profile(mode, {'kind': 'request', 'method': request.method, 'path': request.path,
+                             'endpoint': request.endpoint})
+    if profile.start():
+        g.profile = profile
+
+@app.after_request
+def finish_profile(response):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return response
+
+    response.headers['X-Profile-Id'] = profile.id
+    if g.get('profile_job_id'):
+        response.headers['X-Profile-Job-Id'] = g.profile_job_id
+    # Streamed bodies are generated after this point, so stop once the response is sent
+    response.call_on_close(lambda: profile.stop(status=response.status_code))
+    return response
+
+@app.route('/profiles')
+def profiles():
+    try:
+        limit = request.args.get('limit', 50, type=int)
+        return jsonify({
+            'status': 'success',
+            'enabled': load_config().get('profiling_enabled', False),
+            'profiles': list_profiles(max(1, limit))
+        })
+    except Exception as e:
+        logger.error(f"Profile list error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/profiles/<profile_id>')
+def profile_summary(profile_id):
+    if not _valid_profile_id(profile_id):
+        return jsonify({'status': 'error', 'message': 'Invalid profile id'}), 400
+    path = os.path.join(PROFILES_DIR, f"{profile_id}.json")
+    if not os.path.exists(path):
+        return jsonify({'status': 'error', 'message': 'Profile not found'}), 404
+    with open(path, 'r', encoding='utf-8') as f:
+        return jsonify({'status': 'success', 'profile': json.load(f)})
+
+@app.route('/profiles/<profile_id>/download')
+def download_profile(profile_id):
+    """The raw data: pstats for snakeviz or pstats.Stats, folded stacks for flamegraph.pl or speedscope"""
+    if not _valid_profile_id(profile_id):
+        return jsonify({'status': 'error', 'message': 'Invalid profile id'}), 400
+    for extension in ('.prof', '.folded'):
+        path = os.path.join(PROFILES_DIR, f"{profile_id}{extension}")
+        if os.path.exists(path):
+            return send_file(path, as_attachment=True, download_name=f"profile_{profile_id}{extension}")
+    return jsonify({'status': 'error', 'message': 'Profile not found'}), 404
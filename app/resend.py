@@ -1,130 +1,167 @@
 import os
 import logging
-import csv
+from itertools import islice
 from datetime import datetime
+import numpy as np
 from flask import render_template, jsonify, request
 from app import app
+from app.columnar import filter_indices, load_columns
 from app.config import load_config
+from app.dates import parse_datetime
+from app.ingest import list_manifests, read_rows
+from app.jobs import submit_job
+from app.manifest_index import iter_search
+from app.pagination import (InvalidCursor, decode_cursor, encode_cursor, ndjson_response, page_request,
+                            row_position, take_page)
+from app.resend_ledger import get_resend_ledger
+from app.resend_writer import make_writer
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# Files handled between progress updates and cancellation checks in a bulk resend job
+BULK_RESEND_BATCH = 100
+
+# Rows materialised at a time when walking filter results
+FILTER_CHUNK_ROWS = 5000
+
+# Default and largest number of /resend_history entries per page
+HISTORY_PAGE_SIZE = 100
+MAX_HISTORY_PAGE_SIZE = 1000
+
 def get_manifest_contents(manifest_dir):
-    try:
-        if not os.path.exists(manifest_dir):
-            logger.warning(f"Directory not found: {manifest_dir}")
-            return []
-            
-        files = []
-        for file in os.listdir(manifest_dir):
-            if file.startswith('CTImanifest_') and file.endswith('.csv'):
-                file_path = os.path.join(manifest_dir, file)
-                size_kb = os.path.getsize(file_path) / 1024
-                files.append({
-                    'name': file,
-                    'size': f"{size_kb:.1f}"
-                })
-        return sorted(files, key=lambda x: x['name'])
-    except Exception as e:
-        logger.error(f"Error reading directory {manifest_dir}: {e}")
-        return []
+    return list_manifests(manifest_dir)
 
 def read_manifest_file(file_path):
     try:
-        results = []
-        with open(file_path, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            next(reader)  # Skip header
-            for row in reader:
-                if len(row) >= 7:
-                    results.append({
-                        'Filename': row[0] or '',
-                        'CTIfeed': row[1] or '',
-                        'MD5Hash': row[2] or '',
-                        'DateTime': row[3] or '',
-                        'FileSize': row[4] or '',
-                        'FlowUUID': row[5] or '',
-                        'Resend': row[6] or ''
-                    })
-        return results
+        return read_rows(file_path)
     except Exception as e:
         logger.error(f"Error reading manifest {file_path}: {str(e)}")
         return []
 
 def parse_date_from_datetime(dt_str):
     """Parse date object from datetime string for filtering - tries multiple formats"""
-    if not dt_str:
-        return None
-
-    dt_str = dt_str.strip()
-
-    # Try multiple date formats
-    formats = [
-        "%a %b %d %H:%M:%S UTC %Y",  # Wed Jan 29 14:23:45 UTC 2025
-        "%Y-%m-%d %H:%M:%S",          # 2025-01-29 14:23:45
-        "%Y-%m-%dT%H:%M:%S",          # 2025-01-29T14:23:45
-        "%d/%m/%Y %H:%M:%S",          # 29/01/2025 14:23:45
-        "%m/%d/%Y %H:%M:%S",          # 01/29/2025 14:23:45
-    ]
+    dt = parse_datetime(dt_str)
+    return dt.date() if dt else None
+
+def iter_manifest_rows(file_path, after=None):
+    """Yield ((manifest, row index), row dict) for one manifest, resuming after a cursor position"""
+    name = os.path.basename(file_path)
+    start = after[1] + 1 if after is not None and after[0] == name else 0
+    rows = read_manifest_file(file_path)
+    for index in range(start, len(rows)):
+        yield (name, index), rows[index].as_dict()
+
+def parse_filter_criteria(data, manifest_dir):
+    """Manifest names, date range and feed filter from a /filter_files style request"""
+    manifest_names = data.get('manifest_files', [])
+    date_from_str = data.get('date_from', '').strip()
+    date_to_str = data.get('date_to', '').strip()
+    feed_filter = data.get('feed_filter', '').strip()
+
+    # Parse date filters
+    date_from = None
+    date_to = None
+    if date_from_str:
+        try:
+            date_from = datetime.strptime(date_from_str, "%Y-%m-%d").date()
+        except Exception as e:
+            logger.error(f"Invalid date_from format: {date_from_str}")
 
-    for fmt in formats:
+    if date_to_str:
         try:
-            dt = datetime.strptime(dt_str, fmt)
-            return dt.date()
-        except ValueError:
+            date_to = datetime.strptime(date_to_str, "%Y-%m-%d").date()
+        except Exception as e:
+            logger.error(f"Invalid date_to format: {date_to_str}")
+
+    # If no manifests specified, use all
+    if not manifest_names:
+        all_manifests = get_manifest_contents(manifest_dir)
+        manifest_names = [m['name'] for m in all_manifests]
+
+    return manifest_names, date_from, date_to, feed_filter
+
+def filtered_indices(manifest_dir, criteria):
+    """(manifest name, columns, matching row indices) for each existing manifest in the criteria"""
+    manifest_names, date_from, date_to, feed_filter = criteria
+    matches = []
+    for manifest_name in manifest_names:
+        file_path = os.path.join(manifest_dir, manifest_name)
+        if not os.path.exists(file_path):
             continue
 
-    # If no format matched, log at debug level and return None
-    logger.debug(f"Could not parse date from: {dt_str}")
-    return None
+        columns = load_columns(file_path)
+        matches.append((manifest_name, columns, filter_indices(columns, date_from, date_to, feed_filter)))
+    return matches
 
-def process_single_resend(file_data, config):
+def iter_filtered_files(matches, after=None):
+    """Yield ((manifest, row index), row) over filtered_indices results, resuming after a cursor position"""
+    names = [name for name, _, _ in matches]
+    for manifest_name, columns, indices in matches:
+        if after is not None:
+            if after[0] not in names or names.index(manifest_name) < names.index(after[0]):
+                continue
+            if manifest_name == after[0]:
+                indices = indices[np.searchsorted(indices, after[1], side='right'):]
+
+        for start in range(0, len(indices), FILTER_CHUNK_ROWS):
+            chunk = indices[start:start + FILTER_CHUNK_ROWS]
+            for index, row in zip(chunk.tolist(), columns.rows(chunk)):
+                yield (manifest_name, index), row.as_dict(ManifestFile=manifest_name)
+
+def requester_name():
+    """Who asked for a resend: the user set by an authenticating proxy, else the client address.
+
+    The user headers are only honoured on requests coming from an address listed in
+    resend_trusted_proxies, any other client could set them to whatever it likes.
+    """
+    if request.remote_addr in load_config().get('resend_trusted_proxies', []):
+        user = request.headers.get('X-Remote-User') or request.headers.get('X-Forwarded-User')
+        if user:
+            return user
+    return request.remote_addr
+
+def process_single_resend(file_data, config, requester=None, force=False):
     """Process a single file resend operation - creates a .txt file with file metadata"""
+    writer = make_writer(config, get_resend_ledger())
     try:
-        md5_hash = file_data.get('MD5Hash', '').strip()
-        filename = file_data.get('Filename', '').strip()
-        feed = file_data.get('CTIfeed', '').strip()
-
-        logger.info(f"Processing: {filename}, MD5: {md5_hash[:20] if md5_hash else 'EMPTY'}...")
-
-        if not md5_hash or not filename:
-            return {
-                'file': filename or 'Unknown',
-                'status': 'error',
-                'message': 'Missing MD5Hash or Filename'
-            }
-
-        resend_folder = config.get('resend_folder', '').strip()
-        if not resend_folder:
-            # Default to app/resend_queue
-            resend_folder = os.path.join(os.path.dirname(__file__), 'resend_queue')
-
-        os.makedirs(resend_folder, exist_ok=True)
-
-        txt_filename = f"{md5_hash}.txt"
-        txt_path = os.path.join(resend_folder, txt_filename)
-
-        content = f"file name: {filename}\nCTIfeed: {feed}\nMD5Hash: {md5_hash}\n"
-
-        with open(txt_path, 'w') as f:
-            f.write(content)
-
-        logger.info(f"Created resend request: {txt_path}")
-
-        return {
-            'file': filename,
-            'status': 'success',
-            'message': 'Resend request created',
-            'txt_path': txt_path
-        }
-
-    except Exception as e:
-        logger.error(f"Error processing {file_data.get('Filename', 'Unknown')}: {str(e)}")
-        return {
-            'file': file_data.get('Filename', 'Unknown'),
-            'status': 'error',
-            'message': str(e)
-        }
+        result = writer.write_one(file_data, requester, force)
+    finally:
+        writer.close()
+    if result['status'] != 'error':
+        location = result.get('txt_path') or result.get('batch_path', '')
+        logger.info(f"Resend request for {result['file']}: {result['message']} ({location})")
+    return result
+
+def _resend_summary(job, writer):
+    return {
+        'total': job.total,
+        'succeeded': writer.counters['written'],
+        'skipped': writer.counters['skipped'],
+        'failed': writer.counters['failed'],
+        'files_per_second': writer.throughput(),
+        'batch_files': [batch['file'] for batch in writer.batches]
+    }
+
+def _run_bulk_resend_job(job, files, config, requester=None, force=False):
+    """Resend files (any iterable of row dicts, job.total long) in batches"""
+    writer = make_writer(config, get_resend_ledger())
+    files = iter(files)
+    try:
+        while True:
+            job.check_cancelled()
+            batch = list(islice(files, BULK_RESEND_BATCH))
+            if not batch:
+                break
+            job.add_results(writer.write_batch(batch, requester, force, job.id))
+            job.summary = _resend_summary(job, writer)
+    finally:
+        # Closing finishes the last batch file in batch mode
+        writer.close()
+        job.summary = _resend_summary(job, writer)
+
+    logger.info(f"Bulk resend complete: {writer.counters['written']} succeeded, {writer.counters['skipped']} "
+                f"already queued, {writer.counters['failed']} failed ({writer.throughput()} files/s)")
 
 @app.route('/resend')
 def resend():
@@ -168,35 +205,34 @@ def search_manifest():
         data = request.get_json()
         config = load_config()
         manifest_dir = config.get('resend_manifest_dir', '')
+        limit, cursor, stream = page_request(data)
+        cursor = row_position(cursor)
         
         if 'manifest_name' in data and data['manifest_name']:
             file_path = os.path.join(manifest_dir, data['manifest_name'])
-            if os.path.exists(file_path):
-                results = read_manifest_file(file_path)
-                return jsonify({'results': results})
-            return jsonify({'error': 'Manifest file not found'}), 404
+            if not os.path.exists(file_path):
+                return jsonify({'error': 'Manifest file not found'}), 404
+            results = iter_manifest_rows(file_path, cursor)
+        else:
+            search_term = data.get('search_term', '').strip()
+            if not search_term:
+                return jsonify({'error': 'No search term provided'}), 400
+            results = iter_search(manifest_dir, search_term, cursor)
 
-        search_term = data.get('search_term', '').strip()
-        if not search_term:
-            return jsonify({'error': 'No search term provided'}), 400
+        if stream:
+            return ndjson_response(results, limit)
 
-        all_results = []
-        manifest_files = get_manifest_contents(manifest_dir)
-        
-        for manifest in manifest_files:
-            file_path = os.path.join(manifest_dir, manifest['name'])
-            try:
-                manifest_results = read_manifest_file(file_path)
-                for row in manifest_results:
-                    if any(search_term.lower() in str(value).lower() 
-                          for value in row.values()):
-                        row['ManifestFile'] = manifest['name']
-                        all_results.append(row)
-            except Exception as e:
-                logger.error(f"Error processing {manifest['name']}: {str(e)}")
-
-        return jsonify({'results': all_results})
+        page, next_cursor = take_page(results, limit)
+        results.close()
+
+        # Lets the UI show which files were already sent across
+        resent = get_resend_ledger().last_queued([row['MD5Hash'].strip().lower() for row in page])
+        # Annotated copies, rows can come straight from a cache shared with other requests
+        page = [{**row, 'last_resent': resent.get(row['MD5Hash'].strip().lower())} for row in page]
+        return jsonify({'results': page, 'next_cursor': next_cursor})
 
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Search error: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -213,14 +249,19 @@ def initiate_resend():
                 'message': 'Missing required file information (Filename, MD5Hash)'
             }), 400
 
-        result = process_single_resend(data, config)
+        result = process_single_resend(data, config, requester_name(), bool(data.get('force')))
 
-        if result['status'] == 'success':
+        # A request already queued or recently resent is not an error, it just is not written twice
+        if result['status'] in ('success', 'skipped'):
             return jsonify({
                 'status': 'success',
                 'message': result['message'],
                 'details': {
-                    'txt_path': result.get('txt_path', '')
+                    'txt_path': result.get('txt_path', ''),
+                    'batch_path': result.get('batch_path', ''),
+                    'already_queued': result['status'] == 'skipped',
+                    'resent_at': result.get('resent_at'),
+                    'resent_by': result.get('resent_by')
                 }
             })
         else:
@@ -246,65 +287,30 @@ def filter_files():
 
         data = request.get_json()
         manifest_dir = config.get('resend_manifest_dir', '')
+        limit, cursor, stream = page_request(data)
+        cursor = row_position(cursor)
 
-        manifest_names = data.get('manifest_files', [])
-        date_from_str = data.get('date_from', '').strip()
-        date_to_str = data.get('date_to', '').strip()
-        feed_filter = data.get('feed_filter', '').strip()
-
-        # Parse date filters
-        date_from = None
-        date_to = None
-        if date_from_str:
-            try:
-                date_from = datetime.strptime(date_from_str, "%Y-%m-%d").date()
-            except Exception as e:
-                logger.error(f"Invalid date_from format: {date_from_str}")
-
-        if date_to_str:
-            try:
-                date_to = datetime.strptime(date_to_str, "%Y-%m-%d").date()
-            except Exception as e:
-                logger.error(f"Invalid date_to format: {date_to_str}")
-
-        # If no manifests specified, use all
-        if not manifest_names:
-            all_manifests = get_manifest_contents(manifest_dir)
-            manifest_names = [m['name'] for m in all_manifests]
-
-        # Read and filter files
-        filtered_files = []
-        for manifest_name in manifest_names:
-            file_path = os.path.join(manifest_dir, manifest_name)
-            if not os.path.exists(file_path):
-                continue
+        criteria = parse_filter_criteria(data, manifest_dir)
+        matches = filtered_indices(manifest_dir, criteria)
+        files = iter_filtered_files(matches, cursor)
+
+        if stream:
+            return ndjson_response(files, limit)
 
-            manifest_results = read_manifest_file(file_path)
-            for row in manifest_results:
-                # Apply feed filter
-                if feed_filter and feed_filter.lower() not in row.get('CTIfeed', '').lower():
-                    continue
-
-                # Apply date filter
-                if date_from or date_to:
-                    file_date = parse_date_from_datetime(row.get('DateTime', ''))
-                    if not file_date:
-                        continue
-                    if date_from and file_date < date_from:
-                        continue
-                    if date_to and file_date > date_to:
-                        continue
-
-                row['ManifestFile'] = manifest_name
-                filtered_files.append(row)
-
-        logger.info(f"Filtered {len(filtered_files)} files from {len(manifest_names)} manifests")
+        filtered_files, next_cursor = take_page(files, limit)
+        total = sum(len(indices) for _, _, indices in matches)
+
+        logger.info(f"Filtered {total} files from {len(criteria[0])} manifests")
         return jsonify({
             'status': 'success',
             'files': filtered_files,
-            'count': len(filtered_files)
+            'count': len(filtered_files),
+            'total': total,
+            'next_cursor': next_cursor
         })
 
+    except InvalidCursor as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     except Exception as e:
         logger.error(f"Filter error: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -322,42 +328,56 @@ def bulk_resend():
 
         data = request.get_json()
         files = data.get('files', [])
+        total = len(files)
+
+        # Criteria resend every file /filter_files would list, without the client holding them all
+        if data.get('criteria'):
+            manifest_dir = config.get('resend_manifest_dir', '')
+            matches = filtered_indices(manifest_dir, parse_filter_criteria(data['criteria'], manifest_dir))
+            files = (row for _, row in iter_filtered_files(matches))
+            total = sum(len(indices) for _, _, indices in matches)
 
-        if not files:
+        if not total:
             return jsonify({
                 'status': 'error',
                 'message': 'No files provided for bulk resend'
             }), 400
 
-        logger.info(f"Processing bulk resend for {len(files)} files")
-        logger.info(f"Files received: {[f.get('Filename', 'Unknown') for f in files]}")
-
-        success_results = []
-        failed_results = []
+        logger.info(f"Queueing bulk resend for {total} files")
+        job = submit_job('bulk_resend', _run_bulk_resend_job, files, config,
+                         requester_name(), bool(data.get('force')), total=total)
+        return jsonify({'status': 'success', 'job_id': job.id}), 202
 
-        for file_data in files:
-            result = process_single_resend(file_data, config)
+    except Exception as e:
+        logger.error(f"Bulk resend error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
 
-            if result['status'] == 'success':
-                success_results.append(result)
-            else:
-                failed_results.append(result)
+@app.route('/resend_history')
+def resend_history():
+    """Resend ledger entries, newest first, optionally for one MD5 (?md5=), paged with ?cursor="""
+    try:
+        config = load_config()
+        if not config.get('resend_enabled', True):
+            return jsonify({
+                'status': 'error',
+                'message': 'Resend feature is disabled'
+            }), 403
 
-        logger.info(f"Bulk resend complete: {len(success_results)} succeeded, {len(failed_results)} failed")
+        limit = max(1, min(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), MAX_HISTORY_PAGE_SIZE))
+        before = decode_cursor(request.args.get('cursor', '').strip())
+        if before is not None and not isinstance(before, int):
+            raise InvalidCursor('Invalid cursor')
 
+        entries = get_resend_ledger().history(request.args.get('md5', '').strip() or None, before, limit + 1)
+        next_cursor = encode_cursor(entries[limit - 1]['id']) if len(entries) > limit else None
         return jsonify({
             'status': 'success',
-            'summary': {
-                'total': len(files),
-                'succeeded': len(success_results),
-                'failed': len(failed_results)
-            },
-            'results': {
-                'success': success_results,
-                'failed': failed_results
-            }
+            'history': entries[:limit],
+            'next_cursor': next_cursor
         })
 
+    except InvalidCursor as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     except Exception as e:
-        logger.error(f"Bulk resend error: {str(e)}")
-        return jsonify({'status': 'error', 'message': str(e)}), 500
\ No newline at end of file
+        logger.error(f"Resend history error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -0,0 +1,143 @@
+# CTIDashy_Flask/app/resend_ledger.py
+import os
+import time
+import sqlite3
+import logging
+import threading
+from app.config import DATA_DIR, load_config
+from app.db import LOOKUP_CHUNK_SIZE, connect
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Unlike app/cache this cannot be rebuilt from the manifests, so it lives in app/data
+LEDGER_FILE = os.path.join(DATA_DIR, 'resend_ledger.db')
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+class ResendLedger:
+    """Every resend request queued or attempted, in a SQLite file shared by all workers.
+
+    Before queuing, hashes are looked up through the md5 index; a hash queued within
+    dedupe_days is skipped unless forced, so files are not sent across the diode twice.
+    dedupe_days of 0 keeps the history but never skips.
+    """
+
+    def __init__(self, path=LEDGER_FILE, dedupe_days=7):
+        self.settings = (path, dedupe_days)
+        self.path = path
+        self.dedupe_days = dedupe_days
+        conn = connect(self.path, row_factory=sqlite3.Row)
+        try:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS resends (
+                    id INTEGER PRIMARY KEY,
+                    md5 TEXT NOT NULL,
+                    filename TEXT,
+                    feed TEXT,
+                    manifest TEXT,
+                    requester TEXT,
+                    status TEXT NOT NULL,
+                    message TEXT,
+                    location TEXT,
+                    job_id TEXT,
+                    queued_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS resends_md5 ON resends(md5, queued_at);
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def last_queued(self, md5s, within_days=None):
+        """Map each lowercase MD5 to its latest successful resend, optionally only recent ones"""
+        since = time.time() - within_days * 86400 if within_days is not None else 0
+        md5s = list(dict.fromkeys(md5s))
+        found = {}
+        conn = connect(self.path, row_factory=sqlite3.Row)
+        try:
+            for start in range(0, len(md5s), LOOKUP_CHUNK_SIZE):
+                chunk = md5s[start:start + LOOKUP_CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                # With MAX() SQLite takes the other columns from the row holding the maximum
+                cursor = conn.execute(
+                    f"SELECT md5, MAX(queued_at) AS queued_at, requester, manifest, job_id FROM resends "
+                    f"WHERE status = 'queued' AND queued_at >= ? AND md5 IN ({placeholders}) GROUP BY md5",
+                    (since, *chunk)
+                )
+                for row in cursor:
+                    found[row['md5']] = _entry(row)
+        finally:
+            conn.close()
+        return found
+
+    def recently_queued(self, md5s):
+        """Hashes that should be skipped: queued within dedupe_days"""
+        if self.dedupe_days <= 0:
+            return {}
+        return self.last_queued(md5s, self.dedupe_days)
+
+    def record(self, files, results, requester=None, job_id=None):
+        """Add the outcome of each written request; skipped requests are not recorded"""
+        now = time.time()
+        entries = [
+            (result['md5'].lower(), file_data.get('Filename', ''), file_data.get('CTIfeed', ''),
+             file_data.get('ManifestFile', ''), requester, 'queued' if result['status'] == 'success' else 'failed',
+             result['message'], result.get('txt_path') or result.get('batch_path', ''), job_id, now)
+            for file_data, result in zip(files, results)
+            if result['status'] != 'skipped' and result.get('md5')
+        ]
+        if not entries:
+            return
+
+        conn = connect(self.path, row_factory=sqlite3.Row)
+        try:
+            conn.executemany(
+                'INSERT INTO resends (md5, filename, feed, manifest, requester, status, message, location, job_id, queued_at) '
+                'VALUES (?,?,?,?,?,?,?,?,?,?)',
+                entries
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def history(self, md5=None, before=None, limit=100):
+        """Latest entries first, optionally for one hash; before is the id of the last entry already seen"""
+        conditions = []
+        params = []
+        if md5:
+            conditions.append('md5 = ?')
+            params.append(md5.strip().lower())
+        if before is not None:
+            conditions.append('id < ?')
+            params.append(before)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ''
+
+        conn = connect(self.path, row_factory=sqlite3.Row)
+        try:
+            rows = conn.execute(
+                f'SELECT * FROM resends {where}ORDER BY id DESC LIMIT ?', (*params, limit)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [{**_entry(row), 'id': row['id'], 'filename': row['filename'], 'feed': row['feed'],
+                 'status': row['status'], 'message': row['message'], 'location': row['location']} for row in rows]
+
+def _entry(row):
+    return {
+        'md5': row['md5'],
+        'queued_at': row['queued_at'],
+        'requester': row['requester'],
+        'manifest': row['manifest'],
+        'job_id': row['job_id']
+    }
+
+def get_resend_ledger():
+    """This worker's ledger, rebuilt when resend_dedupe_days changes"""
+    global _ledger
+    settings = (LEDGER_FILE, max(0, float(load_config().get('resend_dedupe_days', 7))))
+    with _ledger_lock:
+        if _ledger is None or _ledger.settings != settings:
+            _ledger = ResendLedger(*settings)
+        return _ledger
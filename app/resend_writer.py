@@ -0,0 +1,270 @@
+# CTIDashy_Flask/app/resend_writer.py
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESEND_FOLDER = os.path.join(os.path.dirname(__file__), 'resend_queue')
+
+# resend_queue_mode values: one {MD5Hash}.txt per request, or rotated JSON Lines batch files
+QUEUE_MODES = ('per_hash', 'batch')
+
+# Appended once per finished batch file: name, record count, sha256 and creation time
+BATCH_INDEX_FILE = 'resend_index.jsonl'
+
+def resend_folder(config):
+    return config.get('resend_folder', '').strip() or DEFAULT_RESEND_FOLDER
+
+def request_content(filename, feed, md5_hash):
+    return f"file name: {filename}\nCTIfeed: {feed}\nMD5Hash: {md5_hash}\n"
+
+class ResendWriter:
+    """Writes {MD5Hash}.txt resend requests into the resend folder.
+
+    The folder is created once per writer, and listed once before the first batch
+    instead of checking every file. Each request is written to a hidden temp file and
+    renamed into place, so a consumer never reads a partial file. Hashes that already
+    have a request waiting in the folder, or that were written earlier by this writer,
+    are skipped. With workers > 1 a batch is written by a thread pool, which helps on
+    slow network mounts. With a ledger, hashes it reports as recently queued are
+    skipped too and every written request is recorded in it.
+    """
+
+    def __init__(self, folder, workers=1, ledger=None):
+        self.folder = folder
+        self.ledger = ledger
+        self.workers = max(1, int(workers))
+        self.counters = {'written': 0, 'skipped': 0, 'failed': 0, 'seconds': 0.0}
+        # Index entries of the batch files finished so far (batch mode only)
+        self.batches = []
+        os.makedirs(folder, exist_ok=True)
+        self._queued = set()
+        self._listed = False
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _claim(self, txt_filename):
+        """True if this call should write txt_filename, False if it is already queued"""
+        with self._lock:
+            if txt_filename in self._queued:
+                return False
+            if not self._listed and os.path.exists(os.path.join(self.folder, txt_filename)):
+                return False
+            self._queued.add(txt_filename)
+            return True
+
+    def write(self, file_data):
+        """Write one request; returns the per-file result shown by the resend UI"""
+        filename = file_data.get('Filename', '').strip()
+        try:
+            md5_hash = file_data.get('MD5Hash', '').strip()
+            feed = file_data.get('CTIfeed', '').strip()
+
+            if not md5_hash or not filename:
+                return {'file': filename or 'Unknown', 'status': 'error', 'message': 'Missing MD5Hash or Filename'}
+            if os.path.basename(md5_hash) != md5_hash or md5_hash.startswith('.'):
+                return {'file': filename, 'status': 'error', 'message': 'Invalid MD5Hash'}
+
+            txt_filename = f"{md5_hash}.txt"
+            if not self._claim(txt_filename):
+                return {'file': filename, 'md5': md5_hash, 'status': 'skipped',
+                        'message': 'Resend request already queued', **self._location(txt_filename)}
+
+            try:
+                location = self._store(txt_filename, filename, feed, md5_hash)
+            except Exception:
+                with self._lock:
+                    self._queued.discard(txt_filename)
+                raise
+
+            return {'file': filename, 'md5': md5_hash, 'status': 'success', 'message': 'Resend request created', **location}
+
+        except Exception as e:
+            logger.error(f"Error writing resend request for {filename or 'Unknown'}: {str(e)}")
+            return {'file': filename or 'Unknown', 'status': 'error', 'message': str(e)}
+
+    def _location(self, txt_filename):
+        return {'txt_path': os.path.join(self.folder, txt_filename)}
+
+    def _store(self, txt_filename, filename, feed, md5_hash):
+        txt_path = os.path.join(self.folder, txt_filename)
+        tmp_path = os.path.join(self.folder, f".{txt_filename}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(request_content(filename, feed, md5_hash))
+            os.replace(tmp_path, txt_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return {'txt_path': txt_path}
+
+    def _sent_before(self, file_data, entry):
+        queued_at = datetime.fromtimestamp(entry['queued_at']).strftime('%Y-%m-%d %H:%M')
+        return {
+            'file': file_data.get('Filename', '').strip() or 'Unknown',
+            'md5': file_data.get('MD5Hash', '').strip(),
+            'status': 'skipped',
+            'message': f"Already resent {queued_at} by {entry['requester'] or 'unknown'}",
+            'resent_at': entry['queued_at'],
+            'resent_by': entry['requester']
+        }
+
+    def write_one(self, file_data, requester=None, force=False):
+        """Write a single request without listing the folder: one exists check and one ledger lookup"""
+        entry = None
+        if self.ledger is not None and not force:
+            md5_hash = file_data.get('MD5Hash', '').strip().lower()
+            entry = self.ledger.recently_queued([md5_hash]).get(md5_hash)
+        result = self._sent_before(file_data, entry) if entry else self.write(file_data)
+        if self.ledger is not None:
+            self.ledger.record([file_data], [result], requester)
+        return result
+
+    def write_batch(self, files, requester=None, force=False, job_id=None):
+        """Write a batch of requests, logging one summary line with its throughput.
+
+        force writes hashes the ledger has seen recently; requester and job_id are recorded with each request.
+        """
+        start = time.perf_counter()
+        if not self._listed:
+            with self._lock:
+                self._queued.update(name for name in os.listdir(self.folder) if name.endswith('.txt'))
+                self._listed = True
+
+        previous = {}
+        if self.ledger is not None and not force:
+            previous = self.ledger.recently_queued([f.get('MD5Hash', '').strip().lower() for f in files])
+
+        def write(file_data):
+            entry = previous.get(file_data.get('MD5Hash', '').strip().lower())
+            return self._sent_before(file_data, entry) if entry else self.write(file_data)
+
+        if self.workers > 1 and len(files) > 1:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='resend-writer')
+            results = list(self._executor.map(write, files))
+        else:
+            results = [write(file_data) for file_data in files]
+
+        if self.ledger is not None:
+            self.ledger.record(files, results, requester, job_id)
+        elapsed = time.perf_counter() - start
+
+        counts = {'success': 0, 'skipped': 0, 'error': 0}
+        for result in results:
+            counts[result['status']] += 1
+        self.counters['written'] += counts['success']
+        self.counters['skipped'] += counts['skipped']
+        self.counters['failed'] += counts['error']
+        self.counters['seconds'] += elapsed
+
+        logger.info(
+            f"Resend batch: {counts['success']} written, {counts['skipped']} already queued, "
+            f"{counts['error']} failed in {elapsed:.3f}s ({len(results) / elapsed if elapsed > 0 else 0:.0f} files/s)"
+        )
+        return results
+
+    def throughput(self):
+        """Requests handled per second of writing so far"""
+        handled = self.counters['written'] + self.counters['skipped'] + self.counters['failed']
+        return round(handled / self.counters['seconds'], 1) if self.counters['seconds'] > 0 else None
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+class BatchResendWriter(ResendWriter):
+    """Appends resend requests to JSON Lines batch files instead of one file per hash.
+
+    Records go to a hidden temp file that is renamed to resend_batch_<time>_<id>_<seq>.jsonl
+    once it holds max_records or the writer is closed, so a bulk resend produces a
+    handful of files. Every finished file gets a line in resend_index.jsonl with its
+    record count and sha256; a poller reads the index rather than listing the folder.
+    Only hashes repeated within this writer are skipped, queued batch files are not read.
+    """
+
+    def __init__(self, folder, max_records=10000, ledger=None):
+        # Appends to one open file, so there is nothing to gain from writer threads
+        super().__init__(folder, workers=1, ledger=ledger)
+        self._listed = True
+        self.max_records = max(1, int(max_records))
+        self._prefix = f"resend_batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        self._sequence = 0
+        self._file = None
+        self._tmp_path = None
+        self._digest = None
+        self._records = 0
+
+    @property
+    def _batch_name(self):
+        return f"{self._prefix}_{self._sequence:03d}.jsonl"
+
+    def _location(self, txt_filename):
+        # The earlier request may be in any batch of this writer
+        return {}
+
+    def _store(self, txt_filename, filename, feed, md5_hash):
+        line = json.dumps({
+            'Filename': filename,
+            'CTIfeed': feed,
+            'MD5Hash': md5_hash,
+            'queued_at': datetime.now().isoformat(timespec='seconds')
+        }) + '\n'
+        with self._lock:
+            if self._file is None:
+                self._sequence += 1
+                self._tmp_path = os.path.join(self.folder, f".{self._batch_name}.tmp")
+                self._file = open(self._tmp_path, 'w', encoding='utf-8')
+                self._digest = hashlib.sha256()
+                self._records = 0
+            location = {'batch_path': os.path.join(self.folder, self._batch_name)}
+            self._file.write(line)
+            self._digest.update(line.encode('utf-8'))
+            self._records += 1
+            if self._records >= self.max_records:
+                self._finish_batch()
+        return location
+
+    def _finish_batch(self):
+        """Move the current batch file into place and add it to the index; called with the lock held"""
+        self._file.close()
+        self._file = None
+        batch_path = os.path.join(self.folder, self._batch_name)
+        os.replace(self._tmp_path, batch_path)
+
+        entry = {
+            'file': self._batch_name,
+            'records': self._records,
+            'sha256': self._digest.hexdigest(),
+            'created': datetime.now().isoformat(timespec='seconds')
+        }
+        # One short line per write, appends from several workers do not interleave
+        with open(os.path.join(self.folder, BATCH_INDEX_FILE), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+        self.batches.append(entry)
+        logger.info(f"Finished resend batch {entry['file']} ({entry['records']} records)")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._finish_batch()
+        super().close()
+
+def make_writer(config, ledger=None):
+    """The writer for the configured resend_queue_mode"""
+    mode = config.get('resend_queue_mode', 'per_hash')
+    if mode not in QUEUE_MODES:
+        raise ValueError(f"Unknown resend_queue_mode: {mode}")
+    if mode == 'batch':
+        return BatchResendWriter(resend_folder(config), config.get('resend_batch_max_records', 10000), ledger)
+    return ResendWriter(resend_folder(config), config.get('resend_write_workers', 1), ledger)
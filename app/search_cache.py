@@ -0,0 +1,208 @@
+# CTIDashy_Flask/app/search_cache.py
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from app.config import CACHE_DIR, load_config
+from app.db import connect
+from app.metrics import inc
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Shared by every worker when search_cache_backend is 'sqlite'
+CACHE_FILE = os.path.join(CACHE_DIR, 'search_cache.db')
+
+# Counters also exported as ctidashy_cache_requests_total results
+LOOKUP_RESULTS = {'hits': 'hit', 'stale_hits': 'stale', 'misses': 'miss'}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def normalize_query(query):
+    """Searches differing only in case or spacing share a cache entry"""
+    return ' '.join(query.split()).lower()
+
+def make_key(query, config, *extra):
+    """Cache key for a search against the configured OpenCTI instance.
+
+    The API key is part of it (hashed) because different keys can see different data.
+    """
+    parts = [
+        normalize_query(query),
+        config.get('opencti_url', '').strip().rstrip('/'),
+        hashlib.sha256(config.get('opencti_api', '').strip().encode('utf-8')).hexdigest()
+    ] + [str(part) for part in extra]
+    return hashlib.sha1(json.dumps(parts).encode('utf-8')).hexdigest()
+
+class SearchCache:
+    """TTL + LRU cache with stale-while-revalidate.
+
+    Fresh entries (younger than ttl) are returned as hits. Entries up to ttl + stale_ttl
+    old are returned at once while one background refresh fetches a new value. Older
+    entries count as misses. With a path the entries also live in a SQLite file shared
+    by all workers; the in-memory LRU stays in front of it.
+    """
+
+    def __init__(self, max_entries=1000, ttl=300, stale_ttl=600, path=None):
+        self.settings = (max_entries, ttl, stale_ttl, path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.path = path
+        self.entries = OrderedDict()
+        self.counters = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'evictions': 0, 'refreshes': 0, 'refresh_errors': 0}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        if path:
+            conn = connect(self.path, timeout=5)
+            try:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS entries (
+                        key TEXT PRIMARY KEY,
+                        stored_at REAL NOT NULL,
+                        accessed REAL NOT NULL,
+                        value TEXT NOT NULL
+                    )
+                """)
+                conn.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)')
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] += amount
+        if counter in LOOKUP_RESULTS:
+            inc('ctidashy_cache_requests_total', amount, cache='search', result=LOOKUP_RESULTS[counter])
+
+    def _remember(self, key, stored_at, value):
+        with self._lock:
+            self.entries[key] = (stored_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                if not self.path:
+                    self.counters['evictions'] += 1
+
+    def _read(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        if entry is not None and (time.time() - entry[0] < self.ttl or not self.path):
+            return entry
+
+        # Another worker may have stored a fresher copy
+        if self.path:
+            conn = connect(self.path, timeout=5)
+            try:
+                row = conn.execute('SELECT stored_at, value FROM entries WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    conn.execute('UPDATE entries SET accessed = ? WHERE key = ?', (time.time(), key))
+                    conn.commit()
+            finally:
+                conn.close()
+            if row is not None and (entry is None or row[0] > entry[0]):
+                entry = (row[0], json.loads(row[1]))
+                self._remember(key, *entry)
+        return entry
+
+    def _write(self, key, value):
+        stored_at = time.time()
+        self._remember(key, stored_at, value)
+        if not self.path:
+            return
+
+        conn = connect(self.path, timeout=5)
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO entries (key, stored_at, accessed, value) VALUES (?, ?, ?, ?)',
+                (key, stored_at, stored_at, json.dumps(value))
+            )
+            # Drop entries past their stale window, then the least recently used beyond the limit
+            conn.execute('DELETE FROM entries WHERE stored_at < ?', (stored_at - self.ttl - self.stale_ttl,))
+            evicted = conn.execute(
+                'DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            ).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        if evicted > 0:
+            self._count('evictions', evicted)
+
+    def _refresh(self, key, fetch):
+        try:
+            self._write(key, fetch())
+            self._count('refreshes')
+        except Exception as e:
+            self._count('refresh_errors')
+            logger.warning(f"Background refresh of cached search failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_or_fetch(self, key, fetch):
+        """Return (value, state) where state is 'hit', 'stale' or 'miss'.
+
+        fetch() is called on a miss, and in a background thread for a stale hit.
+        Exceptions from fetch() on a miss propagate and nothing is cached.
+        """
+        entry = self._read(key)
+        if entry is not None:
+            age = time.time() - entry[0]
+            if age < self.ttl:
+                self._count('hits')
+                return entry[1], 'hit'
+            if age < self.ttl + self.stale_ttl:
+                self._count('stale_hits')
+                with self._lock:
+                    start_refresh = key not in self._refreshing
+                    self._refreshing.add(key)
+                if start_refresh:
+                    threading.Thread(target=self._refresh, args=(key, fetch), daemon=True).start()
+                return entry[1], 'stale'
+
+        self._count('misses')
+        value = fetch()
+        self._write(key, value)
+        return value, 'miss'
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+        if self.path:
+            conn = connect(self.path, timeout=5)
+            try:
+                conn.execute('DELETE FROM entries')
+                conn.commit()
+            finally:
+                conn.close()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['entries'] = len(self.entries)
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['hits'] + stats['stale_hits']) / lookups, 3) if lookups else None
+        stats['backend'] = 'sqlite' if self.path else 'memory'
+        return stats
+
+def get_search_cache():
+    """This worker's search cache, rebuilt when the cache settings change"""
+    global _cache
+    config = load_config()
+    settings = (
+        max(1, int(config.get('search_cache_size', 1000))),
+        max(0, float(config.get('search_cache_ttl', 300))),
+        max(0, float(config.get('search_cache_stale_ttl', 600))),
+        CACHE_FILE if config.get('search_cache_backend', 'memory') == 'sqlite' else None
+    )
+    with _cache_lock:
+        if _cache is None or _cache.settings != settings:
+            _cache = SearchCache(*settings)
+        return _cache
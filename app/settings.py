@@ -2,28 +2,41 @@
 from flask import render_template, request, jsonify
 from app import app
 from app.config import load_config, save_config
+from app.opencti import get_client
+from app.resend_writer import QUEUE_MODES
+from app.profiling import list_profiles
+import time
 import requests
-from urllib.parse import urljoin
 
 @app.route('/settings')
 def settings():
     config = load_config()
     return render_template('settings.html', 
                          config=config, 
+                         profiles=list_profiles(10),
                          active_tab='settings')
 
 @app.route('/update_settings', methods=['POST'])
 def update_settings():
     try:
+        config = load_config()
+        queue_mode = request.form.get('resend_queue_mode', config.get('resend_queue_mode', 'per_hash'))
+        if queue_mode not in QUEUE_MODES:
+            return jsonify({'status': 'error', 'message': f'Unknown resend queue format: {queue_mode}'}), 400
+
+        # Keep settings that are not on the form (tuning values edited in config.json)
         config_data = {
+            **config,
             'opencti_url': request.form.get('opencti_url', ''),
             'opencti_api': request.form.get('opencti_api', ''),
             'low_side_manifest_dir': request.form.get('low_side_manifest_dir', ''),
             'high_side_manifest_dir': request.form.get('high_side_manifest_dir', ''),
             'resend_manifest_dir': request.form.get('resend_manifest_dir', ''),
             'resend_folder': request.form.get('resend_folder', ''),
+            'resend_queue_mode': queue_mode,
             'manifest_enabled': request.form.get('manifest_enabled') == 'on',
-            'resend_enabled': request.form.get('resend_enabled') == 'on'
+            'resend_enabled': request.form.get('resend_enabled') == 'on',
+            'profiling_enabled': request.form.get('profiling_enabled') == 'on'
         }
         save_config(config_data)
         return jsonify({'status': 'success', 'message': 'Settings saved successfully'})
@@ -38,13 +51,6 @@ def test_opencti():
     if not url or not api_key:
         return jsonify({'status': 'error', 'message': 'URL and API key are required'})
 
-    # Ensure URL has proper structure
-    if not url.startswith(('http://', 'https://')):
-        url = 'http://' + url
-
-    # Ensure URL ends with /graphql
-    graphql_endpoint = urljoin(url.rstrip('/') + '/', 'graphql')
-
     query = """
     query {
         about {
@@ -53,19 +59,10 @@ def test_opencti():
     }
     """
     
-    headers = {
-        'Content-Type': 'application/json',
-        'Authorization': f'Bearer {api_key}'
-    }
-    
     try:
-        response = requests.post(
-            graphql_endpoint,
-            json={'query': query},
-            headers=headers,
-            timeout=10,
-            verify=False  # Add this if dealing with self-signed certs
-        )
+        start = time.perf_counter()
+        response = get_client().post(url, api_key, query, timeout=10, operation='test_connection')
+        elapsed_ms = (time.perf_counter() - start) * 1000
         
         response.raise_for_status()
         data = response.json()
@@ -75,7 +72,7 @@ def test_opencti():
             
         return jsonify({
             'status': 'success', 
-            'message': f"Connected successfully! OpenCTI version: {data['data']['about']['version']}"
+            'message': f"Connected successfully! OpenCTI version: {data['data']['about']['version']} ({elapsed_ms:.0f} ms)"
         })
             
     except requests.exceptions.RequestException as e:
@@ -0,0 +1,65 @@
+// CTIDashy_Flask/app/static/js/jobs.js
+
+// Results fetched per poll, a backlog is read with back-to-back polls
+const JOB_RESULTS_PER_POLL = 20;
+
+// Poll a background job until it finishes, handing over new results as they arrive.
+// handlers: onProgress(job, newResults), onComplete(job), onError(message)
+function pollJob(jobId, handlers, interval = 1000) {
+    let cursor = 0;
+    let received = 0;
+    let stopped = false;
+
+    function poll() {
+        if (stopped) return;
+
+        fetch(`/jobs/${jobId}?cursor=${cursor}&limit=${JOB_RESULTS_PER_POLL}`)
+            .then(response => response.json())
+            .then(data => {
+                if (data.status !== 'success') {
+                    if (handlers.onError) handlers.onError(data.message || 'Job status unavailable');
+                    return;
+                }
+
+                cursor = data.next_cursor;
+                received += data.results.length;
+                if (handlers.onProgress) handlers.onProgress(data.job, data.results);
+
+                if (['completed', 'failed', 'cancelled'].includes(data.job.status)) {
+                    // Pick up any results written after this poll's read before finishing
+                    if (received < data.job.result_count) {
+                        poll();
+                    } else if (handlers.onComplete) {
+                        handlers.onComplete(data.job);
+                    }
+                    return;
+                }
+                setTimeout(poll, received < data.job.result_count ? 0 : interval);
+            })
+            .catch(error => {
+                if (handlers.onError) handlers.onError(error.message);
+            });
+    }
+
+    poll();
+    return {
+        stop: () => { stopped = true; }
+    };
+}
+
+function cancelJob(jobId) {
+    return fetch(`/jobs/${jobId}/cancel`, { method: 'POST' })
+        .then(response => response.json());
+}
+
+function formatJobProgress(job, noun) {
+    const progress = job.progress;
+    let text = `${progress.done} of ${progress.total || '?'} ${noun}`;
+    if (progress.throughput) {
+        text += ` · ${progress.throughput.toFixed(1)}/s`;
+    }
+    if (progress.eta_seconds !== null && progress.eta_seconds !== undefined) {
+        text += ` · ETA ${Math.ceil(progress.eta_seconds)}s`;
+    }
+    return text;
+}
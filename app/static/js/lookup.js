@@ -0,0 +1,165 @@
+// CTIDashy_Flask/app/static/js/lookup.js
+document.addEventListener('DOMContentLoaded', function() {
+    const hashInput = document.getElementById('hash-input');
+    const hashFile = document.getElementById('hash-file');
+    const lookupButton = document.getElementById('lookup-btn');
+    const exportButton = document.getElementById('export-btn');
+    const foundOnly = document.getElementById('found-only');
+    const statusLine = document.getElementById('lookup-status');
+    const warningsBox = document.getElementById('lookup-warnings');
+    const table = document.getElementById('lookup-results');
+    const tbody = table.querySelector('tbody');
+
+    // Every row received so far, for the CSV export
+    let rows = [];
+    let total = 0;
+
+    function matchLines(cell, lines) {
+        lines.forEach(line => {
+            const span = document.createElement('span');
+            span.className = 'lookup-match';
+            const source = document.createElement('span');
+            source.className = 'lookup-source';
+            source.textContent = line.source + ': ';
+            span.appendChild(source);
+            span.appendChild(document.createTextNode(line.text));
+            cell.appendChild(span);
+        });
+    }
+
+    function renderRow(row) {
+        const found = row.manifests.length > 0 || row.opencti.length > 0;
+        const tr = document.createElement('tr');
+        tr.className = found ? 'found' : 'not-found';
+        if (!found && foundOnly.checked) tr.style.display = 'none';
+
+        const hashCell = document.createElement('td');
+        hashCell.className = 'hash-cell';
+        hashCell.textContent = row.hash;
+        const typeCell = document.createElement('td');
+        typeCell.textContent = row.hash_type.toUpperCase();
+
+        const manifestCell = document.createElement('td');
+        matchLines(manifestCell, row.manifests.map(m => ({
+            source: m.source,
+            text: `${m.ManifestFile} – ${m.Filename} (${m.CTIfeed}, ${m.DateTime})`
+        })));
+        if (row.hash_type !== 'md5') manifestCell.textContent = 'n/a';
+        else if (!row.manifests.length) manifestCell.textContent = 'Not found';
+
+        const openctiCell = document.createElement('td');
+        matchLines(openctiCell, row.opencti.map(o => ({source: o.instance, text: `${o.type}: ${o.name}`})));
+        if (!row.opencti.length) openctiCell.textContent = 'Not found';
+
+        tr.append(hashCell, typeCell, manifestCell, openctiCell);
+        return tr;
+    }
+
+    function updateStatus(summary) {
+        const done = summary ? ' – done' : '';
+        const counts = summary
+            ? ` – ${summary.found_in_manifests} in manifests, ${summary.found_in_opencti} in OpenCTI, ${summary.not_found} not found`
+            : '';
+        statusLine.textContent = `${rows.length} of ${total} hashes checked${counts}${done}`;
+    }
+
+    function handleLine(line, fragment) {
+        if (line.total !== undefined) {
+            total = line.total;
+        } else if (line.warning) {
+            const div = document.createElement('div');
+            div.textContent = line.warning;
+            warningsBox.appendChild(div);
+        } else if (line.error) {
+            statusLine.textContent = 'Error: ' + line.error;
+        } else if (line.done) {
+            updateStatus(line);
+        } else if (line.hash) {
+            rows.push(line);
+            fragment.appendChild(renderRow(line));
+        }
+    }
+
+    async function readStream(response) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const {done, value} = await reader.read();
+            if (value) buffer += decoder.decode(value, {stream: true});
+
+            // Render every complete line of this chunk in one DOM update
+            const lines = buffer.split('\n');
+            buffer = done ? '' : lines.pop();
+            const fragment = document.createDocumentFragment();
+            lines.filter(line => line.trim()).forEach(line => handleLine(JSON.parse(line), fragment));
+            tbody.appendChild(fragment);
+            if (!done && rows.length) updateStatus(null);
+
+            if (done) break;
+        }
+    }
+
+    async function performLookup() {
+        const body = new FormData();
+        body.append('hashes', hashInput.value);
+        if (hashFile.files.length) body.append('file', hashFile.files[0]);
+
+        rows = [];
+        total = 0;
+        tbody.innerHTML = '';
+        warningsBox.innerHTML = '';
+        table.style.display = 'none';
+        exportButton.disabled = true;
+        lookupButton.disabled = true;
+        statusLine.textContent = 'Looking up...';
+
+        try {
+            const response = await fetch('/bulk_lookup', {method: 'POST', body: body});
+            if (!response.ok) {
+                const data = await response.json();
+                throw new Error(data.message || 'Lookup failed');
+            }
+            table.style.display = '';
+            await readStream(response);
+        } catch (error) {
+            console.error('Lookup error:', error);
+            statusLine.textContent = 'Error: ' + error.message;
+        } finally {
+            lookupButton.disabled = false;
+            exportButton.disabled = rows.length === 0;
+        }
+    }
+
+    function csvField(value) {
+        const text = String(value);
+        return /[",\n]/.test(text) ? `"${text.replace(/"/g, '""')}"` : text;
+    }
+
+    function exportCsv() {
+        const lines = [['Hash', 'Type', 'Manifests', 'OpenCTI'].join(',')];
+        rows.forEach(row => {
+            lines.push([
+                row.hash,
+                row.hash_type,
+                row.manifests.map(m => `${m.source}:${m.ManifestFile}:${m.Filename}`).join('; '),
+                row.opencti.map(o => `${o.instance}:${o.type}:${o.name}`).join('; ')
+            ].map(csvField).join(','));
+        });
+
+        const link = document.createElement('a');
+        link.href = URL.createObjectURL(new Blob([lines.join('\n')], {type: 'text/csv'}));
+        link.download = 'hash_lookup.csv';
+        link.click();
+        URL.revokeObjectURL(link.href);
+    }
+
+    foundOnly.addEventListener('change', function() {
+        tbody.querySelectorAll('tr.not-found').forEach(tr => {
+            tr.style.display = foundOnly.checked ? 'none' : '';
+        });
+    });
+
+    lookupButton.addEventListener('click', performLookup);
+    exportButton.addEventListener('click', exportCsv);
+});
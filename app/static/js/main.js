@@ -4,6 +4,10 @@ document.addEventListener('DOMContentLoaded', function() {
     const searchButton = document.getElementById('search-button');
     const resultsContainer = document.getElementById('search-results');
 
+    // Query and OpenCTI cursor of the results on screen, for "Load more"
+    let currentQuery = '';
+    let nextCursor = null;
+
     function formatDate(dateString) {
         if (!dateString) return 'N/A';
         return new Date(dateString).toLocaleString();
@@ -12,6 +16,7 @@ document.addEventListener('DOMContentLoaded', function() {
     function renderResult(result) {
         const div = document.createElement('div');
         div.className = 'search-result';
+        div.title = 'Click to show details';
         
         const icon = result.type === 'Organization' ? '🔍' : '📄';
         let content = `
@@ -20,6 +25,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 <div class="result-title">
                     <h3>${result.name || result.type || 'Unnamed Item'}</h3>
                 </div>
+                ${result.sources && result.sources.length ? `<span class="result-sources">${result.sources.join(', ')}</span>` : ''}
             </div>
             <div class="result-details">
                 <div class="type-value">
@@ -38,18 +44,135 @@ document.addEventListener('DOMContentLoaded', function() {
         `;
         
         div.innerHTML = content;
+        div.addEventListener('click', () => toggleDetail(div, result.id, result.instance));
         return div;
     }
 
+    function renderDetail(detail) {
+        const rows = [];
+        if (detail.description) {
+            rows.push(`<div class="detail-description">${detail.description}</div>`);
+        }
+        if (detail.pattern) {
+            rows.push(`<div class="detail-row"><span class="detail-label">Pattern${detail.pattern_type ? ` (${detail.pattern_type})` : ''}:</span> <code>${detail.pattern}</code></div>`);
+        }
+        if (detail.valid_from || detail.valid_until) {
+            rows.push(`<div class="detail-row"><span class="detail-label">Valid:</span> ${formatDate(detail.valid_from)} – ${formatDate(detail.valid_until)}</div>`);
+        }
+        if (detail.report_types && detail.report_types.length) {
+            rows.push(`<div class="detail-row"><span class="detail-label">Report types:</span> ${detail.report_types.join(', ')}</div>`);
+        }
+        if (detail.published) {
+            rows.push(`<div class="detail-row"><span class="detail-label">Published:</span> ${formatDate(detail.published)}</div>`);
+        }
+        if (detail.labels && detail.labels.length) {
+            rows.push(`<div class="detail-row"><span class="detail-label">Labels:</span> ${detail.labels.map(label =>
+                `<span class="detail-label-chip" style="border-color: ${label.color || '#ccc'}">${label.value}</span>`).join(' ')}</div>`);
+        }
+        if (detail.standard_id) {
+            rows.push(`<div class="detail-row"><span class="detail-label">Standard ID:</span> ${detail.standard_id}</div>`);
+        }
+        return rows.length ? rows.join('') : '<div class="detail-row">No further details</div>';
+    }
+
+    // Heavy fields are only fetched the first time a result is expanded
+    function toggleDetail(resultDiv, id, instance) {
+        let detailDiv = resultDiv.querySelector('.result-expanded');
+        if (detailDiv) {
+            detailDiv.hidden = !detailDiv.hidden;
+            return;
+        }
+
+        detailDiv = document.createElement('div');
+        detailDiv.className = 'result-expanded';
+        // Clicks inside the details (selecting a pattern to copy) should not collapse them
+        detailDiv.addEventListener('click', e => e.stopPropagation());
+        detailDiv.innerHTML = '<div class="searching">Loading details...</div>';
+        resultDiv.appendChild(detailDiv);
+
+        fetch(`/search/${encodeURIComponent(id)}?instance=${encodeURIComponent(instance || 'primary')}`)
+            .then(response => response.json())
+            .then(data => {
+                detailDiv.innerHTML = data.error
+                    ? `<div class="error">${data.error}</div>`
+                    : renderDetail(data.result);
+            })
+            .catch(error => {
+                detailDiv.innerHTML = `<div class="error">Failed to load details: ${error.message}</div>`;
+            });
+    }
+
+    // Instances that were slow or failed; the results from the others are still shown
+    function showWarnings(warnings) {
+        if (!warnings || warnings.length === 0) return;
+        const warningDiv = document.createElement('div');
+        warningDiv.className = 'search-warnings';
+        warningDiv.innerHTML = warnings.map(warning => `<div>⚠ ${warning}</div>`).join('');
+        resultsContainer.insertBefore(warningDiv, document.getElementById('load-more-results'));
+    }
+
+    function updateLoadMore() {
+        let loadMoreButton = document.getElementById('load-more-results');
+        if (!nextCursor) {
+            if (loadMoreButton) loadMoreButton.remove();
+            return;
+        }
+        if (!loadMoreButton) {
+            loadMoreButton = document.createElement('button');
+            loadMoreButton.id = 'load-more-results';
+            loadMoreButton.className = 'load-more-btn';
+            loadMoreButton.addEventListener('click', loadMore);
+        }
+        loadMoreButton.disabled = false;
+        loadMoreButton.textContent = 'Load more';
+        resultsContainer.appendChild(loadMoreButton);
+    }
+
+    function loadMore() {
+        const loadMoreButton = document.getElementById('load-more-results');
+        if (loadMoreButton) {
+            loadMoreButton.disabled = true;
+            loadMoreButton.textContent = 'Loading...';
+        }
+
+        const query = currentQuery;
+        fetch(`/search?q=${encodeURIComponent(query)}&after=${encodeURIComponent(nextCursor)}`)
+            .then(response => response.json())
+            .then(data => {
+                if (query !== currentQuery) return;
+                if (data.error) {
+                    if (loadMoreButton) loadMoreButton.remove();
+                    resultsContainer.insertAdjacentHTML('beforeend', `<div class="error">${data.error}</div>`);
+                    return;
+                }
+                data.results.forEach(result => {
+                    resultsContainer.insertBefore(renderResult(result), loadMoreButton);
+                });
+                showWarnings(data.warnings);
+                nextCursor = data.next_cursor;
+                updateLoadMore();
+            })
+            .catch(error => {
+                if (loadMoreButton) {
+                    loadMoreButton.disabled = false;
+                    loadMoreButton.textContent = 'Load more';
+                }
+                console.error('Search error:', error);
+            });
+    }
+
     function performSearch() {
         const query = searchInput.value.trim();
         if (!query) return;
 
         resultsContainer.innerHTML = '<div class="searching">Searching OpenCTI...</div>';
+        currentQuery = query;
+        nextCursor = null;
 
         fetch(`/search?q=${encodeURIComponent(query)}`)
             .then(response => response.json())
             .then(data => {
+                if (query !== currentQuery) return;
                 resultsContainer.innerHTML = '';
                 
                 if (data.error) {
@@ -57,14 +180,21 @@ document.addEventListener('DOMContentLoaded', function() {
                     return;
                 }
 
+                showWarnings(data.warnings);
+
                 if (!data.results || data.results.length === 0) {
-                    resultsContainer.innerHTML = '<div class="no-results">No results found</div>';
+                    resultsContainer.insertAdjacentHTML('beforeend', '<div class="no-results">No results found</div>');
                     return;
                 }
 
+                if (data.total) {
+                    resultsContainer.insertAdjacentHTML('beforeend', `<div class="result-count">${data.total} result(s)</div>`);
+                }
                 data.results.forEach(result => {
                     resultsContainer.appendChild(renderResult(result));
                 });
+                nextCursor = data.next_cursor;
+                updateLoadMore();
             })
             .catch(error => {
                 resultsContainer.innerHTML = `<div class="error">Search failed: ${error.message}</div>`;
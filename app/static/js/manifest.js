@@ -1,6 +1,7 @@
 // CTIDashy_Flask/app/static/js/manifest.js
 let selectedSource = null;
 let selectedTarget = null;
+let comparePager = null;
 
 document.addEventListener('DOMContentLoaded', () => {
     initializeFileSelectors();
@@ -163,7 +164,7 @@ function formatFlowUUID(uuid) {
 
 function compareAllManifests() {
     const resultsContainer = document.getElementById('comparison-results');
-    resultsContainer.innerHTML = '<div class="loading">Comparing all manifests...</div>';
+    resultsContainer.innerHTML = '<div class="loading">Starting comparison...</div>';
     
     fetch('/compare_all_manifests', {
         method: 'POST',
@@ -174,7 +175,7 @@ function compareAllManifests() {
     .then(response => response.json())
     .then(data => {
         if (data.status === 'success') {
-            displayCompareAllResults(data.results);
+            trackCompareAllJob(data.job_id);
         } else {
             showError(data.message);
         }
@@ -184,51 +185,268 @@ function compareAllManifests() {
     });
 }
 
-function displayCompareAllResults(results) {
+function formatElapsed(elapsedMs) {
+    if (elapsedMs === undefined || elapsedMs === null) return '';
+    return elapsedMs >= 1000 ? `${(elapsedMs / 1000).toFixed(1)} s` : `${Math.round(elapsedMs)} ms`;
+}
+
+function resultElapsed(result) {
+    // Cached results were not recomputed, their time is the cache lookup
+    return `${formatElapsed(result.elapsed_ms)}${result.cached ? ' (cached)' : ''}`;
+}
+
+function trackCompareAllJob(jobId) {
+    trackManifestJob(jobId, {
+        title: 'Complete Comparison Results',
+        button: document.getElementById('compare-all-btn'),
+        renderResult: compareAllRenderer(),
+        describeProgress: job => `Compared ${formatJobProgress(job, 'manifests')}`,
+        describeCompletion: job => {
+            const summary = job.summary || {};
+            const cached = summary.cached ? `, ${summary.cached} unchanged pairs from cache` : '';
+            return `Found ${summary.differences || 0} total differences across ${summary.manifests || 0} manifests in ${formatElapsed(job.progress.elapsed_seconds * 1000)}${cached}`;
+        }
+    });
+}
+
+function trackManifestJob(jobId, options) {
     const resultsContainer = document.getElementById('comparison-results');
     resultsContainer.innerHTML = '';
-    
-    const totalDifferences = results.reduce((total, result) => 
-        total + (result.differences ? result.differences.length : 0), 0);
-    
+
     const summaryDiv = document.createElement('div');
     summaryDiv.className = 'comparison-summary';
     summaryDiv.innerHTML = `
-        <h3>Complete Comparison Results</h3>
-        <p>Found ${totalDifferences} total differences across ${results.length} manifests</p>
+        <h3>${options.title}</h3>
+        <p class="job-progress">Working...</p>
+        <button class="cancel-job-btn">Cancel</button>
     `;
     resultsContainer.appendChild(summaryDiv);
-    
-    results.forEach((result, index) => {
-        const manifestSection = document.createElement('div');
-        manifestSection.className = 'manifest-section';
-        
-        
+
+    const progressText = summaryDiv.querySelector('.job-progress');
+    const cancelButton = summaryDiv.querySelector('.cancel-job-btn');
+    cancelButton.addEventListener('click', () => {
+        cancelButton.disabled = true;
+        cancelJob(jobId);
+    });
+    if (options.button) options.button.disabled = true;
+
+    pollJob(jobId, {
+        onProgress: (job, results) => {
+            results.forEach(result => {
+                const section = options.renderResult(result);
+                if (section) resultsContainer.appendChild(section);
+            });
+            progressText.textContent = options.describeProgress(job);
+        },
+        onComplete: job => {
+            cancelButton.remove();
+            if (options.button) options.button.disabled = false;
+
+            if (job.status === 'completed') {
+                progressText.textContent = options.describeCompletion(job);
+            } else if (job.status === 'cancelled') {
+                progressText.textContent = `Cancelled after ${job.progress.done} of ${job.progress.total} manifests`;
+            } else {
+                progressText.innerHTML = `<span class="error">Job failed: ${job.error}</span>`;
+            }
+        },
+        onError: message => {
+            if (options.button) options.button.disabled = false;
+            showError('Job failed: ' + message);
+        }
+    });
+}
+
+function reconcileManifests() {
+    const resultsContainer = document.getElementById('comparison-results');
+    resultsContainer.innerHTML = '<div class="loading">Starting reconciliation...</div>';
+
+    fetch('/reconcile_manifests', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            date_from: document.getElementById('reconcile-from').value,
+            date_to: document.getElementById('reconcile-to').value
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.status === 'success') {
+            trackManifestJob(data.job_id, {
+                title: 'Reconciliation Against Entire High Side',
+                button: document.getElementById('reconcile-btn'),
+                renderResult: reconcileRenderer(),
+                describeProgress: job => `Reconciled ${formatJobProgress(job, 'low-side manifests')} against ${(job.summary || {}).high_hashes || 0} high-side hashes`,
+                describeCompletion: job => {
+                    const summary = job.summary || {};
+                    return `${summary.missing || 0} files missing from all ${summary.high_manifests || 0} high-side manifests, ${summary.relocated || 0} found under a different manifest (${formatElapsed(job.progress.elapsed_seconds * 1000)})`;
+                }
+            });
+        } else {
+            showError(data.message);
+        }
+    })
+    .catch(error => {
+        showError('Failed to reconcile manifests: ' + error.message);
+    });
+}
+
+// A manifest with many missing or relocated files arrives as several results, all but
+// the last marked continued; the section is built from the first and completed by the last
+function reconcileRenderer() {
+    let open = null;
+    return result => {
+        let section = null;
+        if (!open || open.manifest !== result.manifest) {
+            section = createReconcileSection(result);
+            open = { manifest: result.manifest, section: section, missing: null, relocated: null, received: 0 };
+        }
+
         if (result.error) {
-            manifestSection.innerHTML = `
-                <div class="manifest-error">
-                    <h4>${result.manifest}</h4>
-                    <p class="error">${result.error}</p>
-                </div>`;
-        } else if (!result.differences || result.differences.length === 0) {
-            manifestSection.innerHTML = `
-                <div class="no-differences">
-                    <h4>${result.manifest}</h4>
-                    <p>No differences found</p>
-                </div>`;
+            fillReconcileError(open.section, result);
         } else {
-            manifestSection.innerHTML = `
-                <h4>${result.manifest}</h4>
-                <p>Found ${result.differences.length} differences</p>
-            `;
-            const table = createDifferencesTable(result.differences);
-            manifestSection.appendChild(table);
+            if (result.missing.length > 0) {
+                if (!open.missing) open.missing = open.section.appendChild(createDifferencesTable([])).querySelector('tbody');
+                appendDifferenceRows(open.missing, result.missing);
+            }
+            if (result.relocated.length > 0) {
+                if (!open.relocated) open.relocated = open.section.appendChild(createRelocatedTable([])).querySelector('tbody');
+                appendRelocatedRows(open.relocated, result.relocated);
+            }
+            open.received += result.missing.length + result.relocated.length;
+            if (result.continued) {
+                open.section.querySelector('.reconcile-counts').textContent = `${open.received}+ files missing or under a different manifest so far`;
+            } else {
+                fillReconcileSummary(open.section, result);
+            }
         }
-        
-        resultsContainer.appendChild(manifestSection);
+
+        if (!result.continued) open = null;
+        return section;
+    };
+}
+
+function createReconcileSection(result) {
+    const section = document.createElement('div');
+    section.className = 'manifest-section';
+    section.innerHTML = `
+        <h4>${result.manifest} <span class="elapsed"></span></h4>
+        <p class="reconcile-counts"></p>
+    `;
+    return section;
+}
+
+function fillReconcileError(section, result) {
+    const error = document.createElement('div');
+    error.className = 'manifest-error';
+    error.innerHTML = `
+        <h4>${result.manifest} <span class="elapsed">${formatElapsed(result.elapsed_ms)}</span></h4>
+        <p class="error">${result.error}</p>`;
+    section.replaceChildren(error);
+}
+
+function fillReconcileSummary(section, result) {
+    const landedIn = Object.entries(result.landed_in || {})
+        .map(([name, count]) => `${name} (${count})`)
+        .join(', ');
+
+    section.querySelector('.elapsed').textContent = formatElapsed(result.elapsed_ms);
+    section.querySelector('.reconcile-counts').textContent =
+        `${result.matched} of ${result.rows} files found on the high side, ${result.missing_count} missing, ${result.relocated_count} under a different manifest`;
+    if (landedIn) {
+        const landed = document.createElement('p');
+        landed.className = 'landed-in';
+        landed.textContent = `Landed in: ${landedIn}`;
+        section.querySelector('.reconcile-counts').after(landed);
+    }
+}
+
+function createRelocatedTable(rows) {
+    const table = document.createElement('table');
+    table.className = 'comparison-table';
+    table.innerHTML = '<thead><tr><th>Filename</th><th>MD5Hash</th><th>Landed In</th></tr></thead>';
+
+    const tbody = document.createElement('tbody');
+    appendRelocatedRows(tbody, rows);
+    table.appendChild(tbody);
+    return table;
+}
+
+function appendRelocatedRows(tbody, rows) {
+    rows.forEach(row => {
+        const tr = document.createElement('tr');
+        ['Filename', 'MD5Hash', 'LandedIn'].forEach(key => {
+            const td = document.createElement('td');
+            td.textContent = row[key] || '';
+            if (key === 'MD5Hash') td.className = 'hash-cell';
+            tr.appendChild(td);
+        });
+        tbody.appendChild(tr);
     });
 }
 
+// A manifest with many differences arrives as several results, all but the last marked
+// continued; their rows go into the section the first one created
+function compareAllRenderer() {
+    let open = null;
+    return result => {
+        if (open && open.manifest === result.manifest) {
+            appendDifferenceRows(open.tbody, result.differences);
+            open.count += result.differences.length;
+            if (result.continued) {
+                open.summary.textContent = `Found ${open.count}+ differences`;
+            } else {
+                open.summary.textContent = `Found ${open.count} differences`;
+                open.section.querySelector('.elapsed').textContent = resultElapsed(result);
+                open = null;
+            }
+            return null;
+        }
+
+        const section = createManifestSection(result);
+        if (result.continued) {
+            open = {
+                manifest: result.manifest,
+                section: section,
+                summary: section.querySelector('p'),
+                tbody: section.querySelector('tbody'),
+                count: result.differences.length
+            };
+        }
+        return section;
+    };
+}
+
+function createManifestSection(result) {
+    const manifestSection = document.createElement('div');
+    manifestSection.className = 'manifest-section';
+
+    if (result.error) {
+        manifestSection.innerHTML = `
+            <div class="manifest-error">
+                <h4>${result.manifest} <span class="elapsed">${resultElapsed(result)}</span></h4>
+                <p class="error">${result.error}</p>
+            </div>`;
+    } else if (!result.differences || result.differences.length === 0) {
+        manifestSection.innerHTML = `
+            <div class="no-differences">
+                <h4>${result.manifest} <span class="elapsed">${resultElapsed(result)}</span></h4>
+                <p>No differences found</p>
+            </div>`;
+    } else {
+        manifestSection.innerHTML = `
+            <h4>${result.manifest} <span class="elapsed">${result.continued ? '' : resultElapsed(result)}</span></h4>
+            <p>Found ${result.differences.length}${result.continued ? '+' : ''} differences</p>
+        `;
+        const table = createDifferencesTable(result.differences);
+        manifestSection.appendChild(table);
+    }
+
+    return manifestSection;
+}
+
 function createDifferencesTable(differences) {
     const table = document.createElement('table');
     table.className = 'comparison-table';
@@ -245,6 +463,14 @@ function createDifferencesTable(differences) {
     table.appendChild(thead);
     
     const tbody = document.createElement('tbody');
+    appendDifferenceRows(tbody, differences);
+    table.appendChild(tbody);
+    
+    return table;
+}
+
+function appendDifferenceRows(tbody, differences) {
+    const headers = ['Filename', 'CTIfeed', 'MD5Hash', 'DateTime', 'FileSize', 'FlowUUID'];
     differences.forEach(diff => {
         const row = document.createElement('tr');
         headers.forEach(header => {
@@ -269,12 +495,9 @@ function createDifferencesTable(differences) {
         });
         tbody.appendChild(row);
     });
-    table.appendChild(tbody);
-    
-    return table;
 }
 
-function displayResults(differences, manifestName = null) {
+function displayResults(differences, manifestName = null, total = null) {
     const resultsContainer = document.getElementById('comparison-results');
     resultsContainer.innerHTML = '';
     
@@ -283,11 +506,12 @@ function displayResults(differences, manifestName = null) {
         return;
     }
     
+    // total is unknown (null) when the server compared in streaming mode
     const summaryDiv = document.createElement('div');
     summaryDiv.className = 'comparison-summary';
     summaryDiv.innerHTML = `
         <h3>${manifestName ? `Comparison Results for ${manifestName}` : 'Comparison Results'}</h3>
-        <p>Found ${differences.length} entries in Low Side missing from High Side</p>
+        <p>Found ${total !== null ? total : `${differences.length}+`} entries in Low Side missing from High Side</p>
     `;
     resultsContainer.appendChild(summaryDiv);
     
@@ -305,25 +529,24 @@ function compareManifests() {
     const resultsContainer = document.getElementById('comparison-results');
     resultsContainer.innerHTML = '<div class="loading">Comparing files...</div>';
     
-    fetch('/compare_manifests', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
+    if (comparePager) comparePager.stop();
+
+    const manifestName = selectedSource;
+    comparePager = paginate('/compare_manifests', {
+        source_file: selectedSource,
+        target_file: selectedTarget
+    }, {
+        onPage: (data, isFirstPage) => {
+            if (isFirstPage) {
+                displayResults(data.differences, manifestName, data.total);
+                return;
+            }
+            const tbody = resultsContainer.querySelector('.comparison-table tbody');
+            if (tbody) appendDifferenceRows(tbody, data.differences);
         },
-        body: JSON.stringify({
-            source_file: selectedSource,
-            target_file: selectedTarget
-        })
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.status === 'success') {
-            displayResults(data.differences, selectedSource);
-        } else {
-            showError(data.message);
-        }
-    })
-    .catch(error => {
-        showError(`Error: ${error.message || 'Unknown error occurred'}`);
+        onError: message => {
+            showError(`Error: ${message || 'Unknown error occurred'}`);
+        },
+        container: () => resultsContainer
     });
 }
\ No newline at end of file
@@ -0,0 +1,82 @@
+// CTIDashy_Flask/app/static/js/pagination.js
+
+const PAGE_SIZE = 200;
+
+// Fetch a cursor-paginated endpoint one page at a time. The next page loads when the
+// "Load more" button scrolls into view (or is clicked).
+// handlers: onPage(data, isFirstPage), onError(message), container() -> element the button goes under
+function paginate(url, body, handlers, pageSize = PAGE_SIZE) {
+    let cursor = null;
+    let loading = false;
+    let finished = false;
+    let stopped = false;
+
+    const loadMoreButton = document.createElement('button');
+    loadMoreButton.className = 'load-more-btn';
+    loadMoreButton.textContent = 'Load more';
+    loadMoreButton.addEventListener('click', loadNext);
+
+    const observer = 'IntersectionObserver' in window
+        ? new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) loadNext();
+        })
+        : null;
+
+    function stop() {
+        stopped = true;
+        if (observer) observer.disconnect();
+        loadMoreButton.remove();
+    }
+
+    function loadNext() {
+        if (loading || finished || stopped) return;
+        loading = true;
+        loadMoreButton.disabled = true;
+        loadMoreButton.textContent = 'Loading...';
+
+        fetch(url, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(Object.assign({}, body, { limit: pageSize, cursor: cursor }))
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (stopped) return;
+            loading = false;
+
+            if (data.error || data.status === 'error') {
+                stop();
+                handlers.onError(data.error || data.message);
+                return;
+            }
+
+            const isFirstPage = cursor === null;
+            cursor = data.next_cursor;
+            finished = !cursor;
+            handlers.onPage(data, isFirstPage);
+
+            if (finished) {
+                stop();
+                return;
+            }
+            loadMoreButton.disabled = false;
+            loadMoreButton.textContent = 'Load more';
+            handlers.container().appendChild(loadMoreButton);
+            if (observer) {
+                // Re-observing fires again straight away if the button is still on screen
+                observer.unobserve(loadMoreButton);
+                observer.observe(loadMoreButton);
+            }
+        })
+        .catch(error => {
+            if (stopped) return;
+            stop();
+            handlers.onError(error.message);
+        });
+    }
+
+    loadNext();
+    return { loadNext: loadNext, stop: stop };
+}
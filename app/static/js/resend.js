@@ -3,6 +3,9 @@
 // Global variable to track selected files
 let selectedFiles = [];
 
+// Pager for the search results currently shown
+let resultsPager = null;
+
 document.addEventListener('DOMContentLoaded', function() {
     initializeManifestSelection();
     initializeRefreshButton();
@@ -97,50 +100,40 @@ function performSearch() {
     const resultsContainer = document.getElementById('search-results');
     resultsContainer.innerHTML = '<div class="loading">Searching...</div>';
 
-    fetch('/search_manifest', {
-        method: 'POST',
-        headers: {'Content-Type': 'application/json'},
-        body: JSON.stringify({ search_term: searchTerm })
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.error) {
-            resultsContainer.innerHTML = `<div class="error">${data.error}</div>`;
-        } else {
-            displayResults(data.results);
-        }
-    })
-    .catch(error => {
-        resultsContainer.innerHTML = `<div class="error">Search failed: ${error.message}</div>`;
-    });
+    loadResults({ search_term: searchTerm }, 'Search failed');
 }
 
 function showManifestContent(manifestName) {
     const resultsContainer = document.getElementById('search-results');
     resultsContainer.innerHTML = '<div class="loading">Loading manifest...</div>';
 
-    fetch('/search_manifest', {
-        method: 'POST',
-        headers: {'Content-Type': 'application/json'},
-        body: JSON.stringify({ manifest_name: manifestName })
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.error) {
-            resultsContainer.innerHTML = `<div class="error">${data.error}</div>`;
-        } else {
-            displayResults(data.results);
-        }
-    })
-    .catch(error => {
-        resultsContainer.innerHTML = `<div class="error">Failed to load manifest: ${error.message}</div>`;
+    loadResults({ manifest_name: manifestName }, 'Failed to load manifest');
+}
+
+function loadResults(body, errorPrefix) {
+    const resultsContainer = document.getElementById('search-results');
+    if (resultsPager) resultsPager.stop();
+
+    resultsPager = paginate('/search_manifest', body, {
+        onPage: (data, isFirstPage) => displayResults(data.results, !isFirstPage),
+        onError: message => {
+            resultsContainer.innerHTML = `<div class="error">${errorPrefix}: ${message}</div>`;
+        },
+        container: () => resultsContainer
     });
 }
 
-function displayResults(results) {
+function displayResults(results, append = false) {
     const container = document.getElementById('search-results');
     const selectionControls = document.getElementById('selection-controls');
 
+    if (append) {
+        const offset = container.querySelectorAll('.result-card').length;
+        container.insertAdjacentHTML('beforeend', renderResultCards(results, offset));
+        initializeCheckboxListeners();
+        return;
+    }
+
     if (!results || results.length === 0) {
         container.innerHTML = '<div class="no-results">No results found</div>';
         if (selectionControls) selectionControls.style.display = 'none';
@@ -150,9 +143,20 @@ function displayResults(results) {
     // Show selection controls when results are displayed
     if (selectionControls) selectionControls.style.display = 'flex';
 
-    container.innerHTML = results.map((result, index) => `
+    container.innerHTML = renderResultCards(results, 0);
+
+    // Initialize checkbox event listeners
+    initializeCheckboxListeners();
+
+    // Reset selection state
+    selectedFiles = [];
+    updateSelectionState();
+}
+
+function renderResultCards(results, offset) {
+    return results.map((result, index) => `
         <div class="result-card">
-            <input type="checkbox" class="file-checkbox" data-index="${index}" data-file='${JSON.stringify(result)}'>
+            <input type="checkbox" class="file-checkbox" data-index="${offset + index}" data-file='${JSON.stringify(result)}'>
             <div class="result-header">${result.Filename || ''}</div>
             <div class="result-content">
                 <div class="result-field">
@@ -179,23 +183,22 @@ function displayResults(results) {
                     <span class="field-label">FlowUUID:</span>
                     <span class="field-value">${result.FlowUUID || ''}</span>
                 </div>
+                ${result.last_resent ? `
+                <div class="result-field last-resent">
+                    <span class="field-label">Last resent:</span>
+                    <span class="field-value">${new Date(result.last_resent.queued_at * 1000).toLocaleString()} by ${result.last_resent.requester || 'unknown'}</span>
+                </div>` : ''}
                 <button class="resend-button" onclick='initiateResend(${JSON.stringify(result)})'>
                     Resend
                 </button>
             </div>
         </div>
     `).join('');
-
-    // Initialize checkbox event listeners
-    initializeCheckboxListeners();
-
-    // Reset selection state
-    selectedFiles = [];
-    updateSelectionState();
 }
 
-function initiateResend(fileData) {
-    if (!confirm(`Confirm resend of file: ${fileData.Filename}?`)) {
+// force sends it again even if the resend ledger shows it was sent recently
+function initiateResend(fileData, force = false) {
+    if (!force && !confirm(`Confirm resend of file: ${fileData.Filename}?`)) {
         return;
     }
 
@@ -206,7 +209,7 @@ function initiateResend(fileData) {
         headers: {
             'Content-Type': 'application/json'
         },
-        body: JSON.stringify(fileData)
+        body: JSON.stringify({ ...fileData, force: force })
     })
     .then(response => response.json())
     .then(data => {
@@ -238,6 +241,7 @@ function createPopup(initialMessage) {
     document.body.appendChild(popup);
 
     return {
+        element: popup,
         setContent: (content) => {
             popup.querySelector('.popup-content').innerHTML = content +
                 '<button class="popup-close" onclick="this.closest(\'.transfer-popup\').remove()">×</button>';
@@ -251,7 +255,7 @@ function createPopup(initialMessage) {
 function createTransferDetails(fileData, response) {
     return `
         <div class="transfer-details">
-            <h3>Resend Request Created</h3>
+            <h3>${response.details.already_queued ? 'Resend Request Already Queued' : 'Resend Request Created'}</h3>
 
             <div class="detail-section">
                 <h4>File Information</h4>
@@ -262,7 +266,10 @@ function createTransferDetails(fileData, response) {
 
             <div class="detail-section">
                 <h4>Request File</h4>
-                <p><strong>Created:</strong> ${response.details.txt_path}</p>
+                ${response.details.txt_path || response.details.batch_path ? `<p><strong>${response.details.already_queued ? 'Queued' : 'Created'}:</strong> ${response.details.txt_path || response.details.batch_path}</p>` : ''}
+                ${response.details.resent_at ? `
+                <p>${response.message}</p>
+                <button class="resend-button" onclick='this.closest(".transfer-popup").remove(); initiateResend(${JSON.stringify(fileData)}, true)'>Resend anyway</button>` : ''}
             </div>
 
             <button class="popup-close" onclick="this.closest('.transfer-popup').remove()">×</button>
@@ -289,7 +296,8 @@ function initializeSelectionControls() {
 }
 
 function initializeCheckboxListeners() {
-    document.querySelectorAll('.file-checkbox').forEach(checkbox => {
+    document.querySelectorAll('.file-checkbox:not([data-bound])').forEach(checkbox => {
+        checkbox.dataset.bound = 'true';
         checkbox.addEventListener('change', updateSelectionState);
     });
 }
@@ -348,27 +356,29 @@ function resendSelected() {
 
     const popup = createPopup(`Processing ${selectedFiles.length} file(s)...`);
 
+    runBulkResend({ files: selectedFiles }, selectedFiles.length, popup, () => {
+        // Deselect all after successful bulk resend
+        deselectAllResults();
+    });
+}
+
+// request is either { files: [...] } or { criteria: {...} } for everything a filter matches
+function runBulkResend(request, total, popup, onSuccess) {
     fetch('/bulk_resend', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json'
         },
-        body: JSON.stringify({ files: selectedFiles })
+        body: JSON.stringify(request)
     })
     .then(response => response.json())
     .then(data => {
-        if (data.status === 'success') {
-            const summary = data.summary;
-            const content = createBulkResultsSummary(summary, data.results);
-            popup.setType('success');
-            popup.setContent(content);
-
-            // Deselect all after successful bulk resend
-            deselectAllResults();
-        } else {
+        if (data.status !== 'success') {
             popup.setType('error');
             popup.setContent(`<div class="transfer-error">Error: ${data.message}</div>`);
+            return;
         }
+        trackBulkResendJob(data.job_id, total, popup, onSuccess);
     })
     .catch(error => {
         popup.setType('error');
@@ -376,6 +386,59 @@ function resendSelected() {
     });
 }
 
+function trackBulkResendJob(jobId, total, popup, onSuccess) {
+    const results = { success: [], skipped: [], failed: [] };
+
+    popup.setContent(`
+        <div class="popup-message job-progress">Processing ${total} file(s)...</div>
+        <button class="cancel-job-btn">Cancel</button>
+    `);
+    const cancelButton = popup.element.querySelector('.cancel-job-btn');
+    cancelButton.addEventListener('click', () => {
+        cancelButton.disabled = true;
+        cancelJob(jobId);
+    });
+
+    pollJob(jobId, {
+        onProgress: (job, newResults) => {
+            newResults.forEach(result => {
+                (results[result.status === 'error' ? 'failed' : result.status] || results.failed).push(result);
+            });
+            const progressText = popup.element.querySelector('.job-progress');
+            if (progressText) {
+                progressText.textContent = `Processed ${formatJobProgress(job, 'files')}`;
+            }
+        },
+        onComplete: job => {
+            if (job.status === 'failed') {
+                popup.setType('error');
+                popup.setContent(`<div class="transfer-error">Error: ${job.error}</div>`);
+                return;
+            }
+
+            const summary = {
+                total: total,
+                succeeded: results.success.length,
+                skipped: results.skipped.length,
+                failed: results.failed.length,
+                batchFiles: (job.summary && job.summary.batch_files) || []
+            };
+            let content = createBulkResultsSummary(summary, results);
+            if (job.status === 'cancelled') {
+                content = `<div class="transfer-error">Cancelled after ${job.progress.done} of ${total} file(s)</div>` + content;
+            }
+            popup.setType('success');
+            popup.setContent(content);
+
+            if (onSuccess) onSuccess(job);
+        },
+        onError: message => {
+            popup.setType('error');
+            popup.setContent(`<div class="transfer-error">Error: ${message}</div>`);
+        }
+    });
+}
+
 function createBulkResultsSummary(summary, results) {
     let html = `
         <div class="transfer-details bulk-summary-popup">
@@ -384,6 +447,8 @@ function createBulkResultsSummary(summary, results) {
                 <h4>Summary</h4>
                 <p><strong>Total Requests:</strong> ${summary.total}</p>
                 <p><strong>Created:</strong> <span style="color: #2e7d32;">${summary.succeeded}</span></p>
+                <p><strong>Already Queued:</strong> ${summary.skipped}</p>
+                ${summary.batchFiles && summary.batchFiles.length ? `<p><strong>Batch Files:</strong> ${summary.batchFiles.join(', ')}</p>` : ''}
                 <p><strong>Failed:</strong> <span style="color: #d32f2f;">${summary.failed}</span></p>
             </div>
     `;
@@ -398,7 +463,7 @@ function createBulkResultsSummary(summary, results) {
                         <tbody>
         `;
         results.success.forEach(item => {
-            html += `<tr><td>${item.file}</td><td class="md5-cell">${item.txt_path ? item.txt_path.split('/').pop().replace('.txt', '') : ''}</td></tr>`;
+            html += `<tr><td>${item.file}</td><td class="md5-cell">${item.md5 || ''}</td></tr>`;
         });
         html += `
                         </tbody>
@@ -429,7 +494,10 @@ function createBulkResultsSummary(summary, results) {
 
 // Bulk Criteria Functions
 
-let bulkFilteredFiles = [];
+// Criteria and match count of the last bulk preview; Resend All sends the criteria, not the files
+let bulkCriteria = null;
+let bulkTotal = 0;
+let bulkPager = null;
 
 function initializeBulkControls() {
     const previewBtn = document.getElementById('preview-bulk-btn');
@@ -454,41 +522,41 @@ function previewBulkFiles() {
     const previewContainer = document.getElementById('bulk-preview');
     previewContainer.innerHTML = '<div class="loading">Filtering files...</div>';
 
-    fetch('/filter_files', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json'
-        },
-        body: JSON.stringify({
-            manifest_files: selectedManifests,
-            date_from: dateFrom,
-            date_to: dateTo,
-            feed_filter: feedFilter
-        })
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.status === 'success') {
-            bulkFilteredFiles = data.files;
-            displayBulkPreview(data.files);
+    const criteria = {
+        manifest_files: selectedManifests,
+        date_from: dateFrom,
+        date_to: dateTo,
+        feed_filter: feedFilter
+    };
+    if (bulkPager) bulkPager.stop();
+
+    bulkPager = paginate('/filter_files', criteria, {
+        onPage: (data, isFirstPage) => {
+            if (!isFirstPage) {
+                appendBulkPreviewRows(data.files);
+                return;
+            }
+
+            bulkCriteria = criteria;
+            bulkTotal = data.total;
+            displayBulkPreview(data.files, data.total);
 
             // Enable/disable resend all button
             const resendAllBtn = document.getElementById('resend-all-btn');
             const countSpan = document.getElementById('bulk-count');
             if (resendAllBtn && countSpan) {
-                resendAllBtn.disabled = data.files.length === 0;
-                countSpan.textContent = data.files.length;
+                resendAllBtn.disabled = data.total === 0;
+                countSpan.textContent = data.total;
             }
-        } else {
-            previewContainer.innerHTML = `<div class="error">${data.message}</div>`;
-        }
-    })
-    .catch(error => {
-        previewContainer.innerHTML = `<div class="error">Filter failed: ${error.message}</div>`;
+        },
+        onError: message => {
+            previewContainer.innerHTML = `<div class="error">Filter failed: ${message}</div>`;
+        },
+        container: () => previewContainer
     });
 }
 
-function displayBulkPreview(files) {
+function displayBulkPreview(files, total) {
     const container = document.getElementById('bulk-preview');
 
     if (!files || files.length === 0) {
@@ -496,72 +564,59 @@ function displayBulkPreview(files) {
         return;
     }
 
-    let html = `<div class="preview-summary">Found ${files.length} file(s) matching criteria:</div>`;
+    let html = `<div class="preview-summary">Found ${total} file(s) matching criteria:</div>`;
     html += '<div class="preview-file-list">';
     html += '<table class="file-list-table">';
     html += '<thead><tr><th>Filename</th><th>Feed</th><th>DateTime</th><th>MD5Hash</th></tr></thead>';
     html += '<tbody>';
+    html += renderBulkPreviewRows(files);
+    html += '</tbody></table></div>';
+    container.innerHTML = html;
+}
 
-    files.forEach(file => {
-        html += `
+function appendBulkPreviewRows(files) {
+    const tbody = document.querySelector('#bulk-preview .file-list-table tbody');
+    if (tbody) {
+        tbody.insertAdjacentHTML('beforeend', renderBulkPreviewRows(files));
+    }
+}
+
+function renderBulkPreviewRows(files) {
+    return files.map(file => `
             <tr>
                 <td>${file.Filename || ''}</td>
                 <td>${file.CTIfeed || ''}</td>
                 <td>${file.DateTime || ''}</td>
                 <td class="md5-cell">${file.MD5Hash || ''}</td>
             </tr>
-        `;
-    });
-
-    html += '</tbody></table></div>';
-    container.innerHTML = html;
+        `).join('');
 }
 
 function resendAllBulk() {
-    if (bulkFilteredFiles.length === 0) return;
+    if (!bulkCriteria || bulkTotal === 0) return;
 
-    if (!confirm(`Confirm bulk resend of ${bulkFilteredFiles.length} file(s) from filtered criteria?`)) {
+    if (!confirm(`Confirm bulk resend of ${bulkTotal} file(s) from filtered criteria?`)) {
         return;
     }
 
-    const popup = createPopup(`Processing ${bulkFilteredFiles.length} file(s)...`);
-
-    fetch('/bulk_resend', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json'
-        },
-        body: JSON.stringify({ files: bulkFilteredFiles })
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.status === 'success') {
-            const summary = data.summary;
-            const content = createBulkResultsSummary(summary, data.results);
-            popup.setType('success');
-            popup.setContent(content);
+    const popup = createPopup(`Processing ${bulkTotal} file(s)...`);
 
-            // Clear preview after successful bulk resend
-            bulkFilteredFiles = [];
-            const previewContainer = document.getElementById('bulk-preview');
-            if (previewContainer) {
-                previewContainer.innerHTML = '<div class="success">Bulk resend completed. Run preview again to see remaining files.</div>';
-            }
+    runBulkResend({ criteria: bulkCriteria }, bulkTotal, popup, () => {
+        // Clear preview after successful bulk resend
+        bulkCriteria = null;
+        bulkTotal = 0;
+        if (bulkPager) bulkPager.stop();
+        const previewContainer = document.getElementById('bulk-preview');
+        if (previewContainer) {
+            previewContainer.innerHTML = '<div class="success">Bulk resend completed. Run preview again to see remaining files.</div>';
+        }
 
-            // Disable resend all button
-            const resendAllBtn = document.getElementById('resend-all-btn');
-            const countSpan = document.getElementById('bulk-count');
-            if (resendAllBtn && countSpan) {
-                resendAllBtn.disabled = true;
-                countSpan.textContent = '0';
-            }
-        } else {
-            popup.setType('error');
-            popup.setContent(`<div class="transfer-error">Error: ${data.message}</div>`);
+        // Disable resend all button
+        const resendAllBtn = document.getElementById('resend-all-btn');
+        const countSpan = document.getElementById('bulk-count');
+        if (resendAllBtn && countSpan) {
+            resendAllBtn.disabled = true;
+            countSpan.textContent = '0';
         }
-    })
-    .catch(error => {
-        popup.setType('error');
-        popup.setContent(`<div class="transfer-error">Error: ${error.message}</div>`);
     });
 }
\ No newline at end of file
@@ -0,0 +1,274 @@
+# CTIDashy_Flask/app/watcher.py
+import os
+import json
+import time
+import logging
+import threading
+from flask import jsonify
+from app import app
+from app.config import CACHE_DIR, load_config
+from app.columnar import load_columns
+from app.ingest import is_manifest_name
+from app.manifest import compare_manifest_pair
+from app.manifest_index import sync_index
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no flock, every worker runs its own watcher
+    fcntl = None
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Held by the one worker process that runs the watcher
+LOCK_FILE = os.path.join(CACHE_DIR, 'watcher.lock')
+# Written after every scan so any worker can answer /watcher_status
+STATUS_FILE = os.path.join(CACHE_DIR, 'watcher.json')
+
+WATCHED_DIRS = ['low_side_manifest_dir', 'high_side_manifest_dir', 'resend_manifest_dir']
+
+# A manifest modified more recently than this may still be being written, it is picked up on a later pass
+SETTLE_SECONDS = 2.0
+
+# With inotify, directories are still rescanned this often in case an event was missed
+INOTIFY_RESCAN_SECONDS = 60.0
+
+# Seconds between attempts to take the lock when another worker runs the watcher
+LOCK_RETRY_SECONDS = 30.0
+
+# Recent entries kept in the status file
+STATUS_HISTORY = 20
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+class ManifestWatcher:
+    """Keeps the manifest caches warm so user requests only read prepared state.
+
+    New and changed manifests in the watched directories are parsed into the columnar
+    cache (read by compare, filter, bulk resend and bulk lookup) as soon as they land,
+    resend manifests are also added to the manifest index (read by search), and low/high
+    pairs with a changed side are compared into the compare cache (read by compare-all). inotify
+    wakes the watcher when available, otherwise the directories are polled every
+    watcher_poll_interval seconds. An flock on LOCK_FILE keeps it to one worker process.
+    """
+
+    def __init__(self):
+        self.mode = 'inotify' if INotify is not None else 'polling'
+        self.status = {'mode': self.mode, 'pid': os.getpid(), 'scans': 0, 'warmed': 0, 'compared': 0,
+                       'recent': [], 'errors': []}
+        # Signature (size, mtime_ns) of each manifest as it was last warmed
+        self._warmed = {}
+        self._lock_file = None
+        self._inotify = None
+        self._watches = {}
+
+    def _acquire_lock(self):
+        if self._lock_file is not None or fcntl is None:
+            return True
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        lock_file = open(LOCK_FILE, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        logger.info(f"Manifest watcher running in process {os.getpid()} ({self.mode})")
+        return True
+
+    def _release_lock(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _record(self, key, entry):
+        self.status[key] = (self.status[key] + [entry])[-STATUS_HISTORY:]
+
+    def _warm(self, file_path, streaming_threshold):
+        start = time.perf_counter()
+        # Manifests too big for the columnar cache are compared in streaming mode instead
+        if os.path.getsize(file_path) <= streaming_threshold:
+            load_columns(file_path)
+        self.status['warmed'] += 1
+        self._record('recent', {'path': file_path, 'time': time.time(),
+                                'elapsed_ms': round((time.perf_counter() - start) * 1000, 1)})
+
+    def scan(self, directories, config):
+        """Warm every new or changed manifest; returns True if some were left to settle"""
+        start = time.perf_counter()
+        now = time.time()
+        streaming_threshold = config.get('compare_streaming_threshold_mb', 256) * 1024 * 1024
+        # Only resend manifests are text-searched, the other sides are read from the columnar cache
+        indexed_dir = config.get('resend_manifest_dir', '')
+        unsettled = False
+        seen = set()
+        warmed = []
+        manifests = 0
+
+        for directory in directories:
+            changed = False
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if not is_manifest_name(entry.name):
+                            continue
+                        manifests += 1
+                        stat = entry.stat()
+                        seen.add(entry.path)
+                        signature = (stat.st_size, stat.st_mtime_ns)
+                        if self._warmed.get(entry.path) == signature:
+                            continue
+                        if now - stat.st_mtime < SETTLE_SECONDS:
+                            unsettled = True
+                            continue
+                        changed = True
+                        try:
+                            self._warm(entry.path, streaming_threshold)
+                            self._warmed[entry.path] = signature
+                            warmed.append(entry.path)
+                        except Exception as e:
+                            logger.error(f"Watcher could not parse {entry.path}: {str(e)}")
+                            self._record('errors', {'path': entry.path, 'time': now, 'error': str(e)})
+                            # Not retried until the file changes again
+                            self._warmed[entry.path] = signature
+                if directory == indexed_dir and (changed or directory not in self.status.get('directories', [])):
+                    sync_index(directory)
+            except OSError as e:
+                logger.error(f"Watcher could not scan {directory}: {str(e)}")
+                self._record('errors', {'path': directory, 'time': now, 'error': str(e)})
+
+        for path in [path for path in self._warmed if path not in seen]:
+            del self._warmed[path]
+        self._compare_changed(warmed, config)
+
+        self.status.update({
+            'directories': directories,
+            'manifests': manifests,
+            'scans': self.status['scans'] + 1,
+            'last_scan': now,
+            'scan_ms': round((time.perf_counter() - start) * 1000, 1)
+        })
+        self._write_status()
+        return unsettled
+
+    def _compare_changed(self, paths, config):
+        """Store compare-all results for the low/high pairs where either side was just warmed"""
+        low_dir = config.get('low_side_manifest_dir', '')
+        high_dir = config.get('high_side_manifest_dir', '')
+        if not (low_dir and high_dir and config.get('manifest_enabled', True)
+                and config.get('compare_cache_enabled', True)):
+            return
+
+        # The paths come from scanning the configured directories, which may be spelled differently
+        sides = {os.path.normcase(os.path.abspath(directory)) for directory in (low_dir, high_dir)}
+        names = sorted({os.path.basename(path) for path in paths
+                        if os.path.normcase(os.path.abspath(os.path.dirname(path))) in sides})
+        for name in names:
+            source_file = os.path.join(low_dir, name)
+            target_file = os.path.join(high_dir, name)
+            # The other side has not landed yet, it is compared when it does
+            if not (os.path.exists(source_file) and os.path.exists(target_file)):
+                continue
+            result = compare_manifest_pair(name, source_file, target_file)
+            if result['error']:
+                self._record('errors', {'path': source_file, 'time': time.time(), 'error': result['error']})
+            else:
+                self.status['compared'] += 1
+
+    def _write_status(self):
+        tmp_path = f"{STATUS_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.status, f)
+        os.replace(tmp_path, STATUS_FILE)
+
+    def _wait(self, directories, timeout):
+        """Sleep up to timeout seconds, waking early when inotify reports a manifest change"""
+        if self._inotify is None and self.mode == 'inotify':
+            self._inotify = INotify()
+
+        if self._inotify is None:
+            time.sleep(timeout)
+            return
+
+        for directory in [d for d in self._watches if d not in directories]:
+            try:
+                self._inotify.rm_watch(self._watches.pop(directory))
+            except OSError:
+                pass
+        mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.MOVED_FROM | flags.DELETE
+        try:
+            for directory in directories:
+                if directory not in self._watches:
+                    self._watches[directory] = self._inotify.add_watch(directory, mask)
+        except OSError as e:
+            # e.g. fs.inotify.max_user_watches reached or a network mount without inotify support
+            logger.warning(f"inotify unavailable, polling instead: {str(e)}")
+            self._inotify.close()
+            self._inotify = None
+            self._watches = {}
+            self.mode = self.status['mode'] = 'polling'
+            time.sleep(timeout)
+            return
+
+        # read_delay gathers the burst of events a copy produces into one wake-up
+        events = self._inotify.read(timeout=int(timeout * 1000), read_delay=200)
+        if events:
+            logger.debug(f"Watcher woke on {len(events)} events")
+
+    def run(self):
+        while True:
+            try:
+                config = load_config()
+                interval = max(1.0, float(config.get('watcher_poll_interval', 5)))
+                if not config.get('watcher_enabled', True):
+                    self._release_lock()
+                    time.sleep(interval)
+                    continue
+                if not self._acquire_lock():
+                    time.sleep(LOCK_RETRY_SECONDS)
+                    continue
+
+                directories = []
+                for key in WATCHED_DIRS:
+                    directory = config.get(key, '')
+                    if directory and os.path.isdir(directory) and directory not in directories:
+                        directories.append(directory)
+
+                unsettled = self.scan(directories, config)
+                timeout = INOTIFY_RESCAN_SECONDS if self.mode == 'inotify' else interval
+                self._wait(directories, SETTLE_SECONDS if unsettled else timeout)
+            except Exception as e:
+                logger.error(f"Manifest watcher error: {str(e)}")
+                time.sleep(LOCK_RETRY_SECONDS)
+
+def start_watcher():
+    """Start this process's watcher thread; only the worker holding the lock does any work"""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = ManifestWatcher()
+            threading.Thread(target=_watcher.run, name='manifest-watcher', daemon=True).start()
+        return _watcher
+
+@app.route('/watcher_status')
+def watcher_status():
+    try:
+        status = None
+        if os.path.exists(STATUS_FILE):
+            with open(STATUS_FILE, 'r', encoding='utf-8') as f:
+                status = json.load(f)
+        return jsonify({
+            'status': 'success',
+            'enabled': load_config().get('watcher_enabled', True),
+            'watcher': status
+        })
+    except Exception as e:
+        logger.error(f"Watcher status error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -0,0 +1,77 @@
+# CTIDashy_Flask/benchmarks/date_parsing.py
+"""Microbenchmark for manifest DateTime parsing.
+
+Compares the original per-row strptime loop with app.dates (format detection,
+slicing fast paths and the memoised fallback). Run from the repository root:
+
+    python -m benchmarks.date_parsing --rows 200000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import dates
+
+LEGACY_FORMATS = [
+    "%a %b %d %H:%M:%S UTC %Y",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%d/%m/%Y %H:%M:%S",
+    "%m/%d/%Y %H:%M:%S",
+]
+
+def legacy_parse(dt_str):
+    """The parser resend.py used before app.dates existed"""
+    if not dt_str:
+        return None
+    dt_str = dt_str.strip()
+    for fmt in LEGACY_FORMATS:
+        try:
+            return datetime.strptime(dt_str, fmt)
+        except ValueError:
+            continue
+    return None
+
+def generate_values(rows, fmt, distinct):
+    """DateTime strings for one manifest day; distinct caps how many different timestamps appear"""
+    start = datetime(2025, 1, 29)
+    stamps = [(start + timedelta(seconds=random.randrange(86400))).strftime(fmt) for _ in range(distinct)]
+    return [random.choice(stamps) for _ in range(rows)]
+
+def measure(label, func, values):
+    dates._parse.cache_clear()
+    started = time.perf_counter()
+    func(values)
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<28} {len(values) / elapsed:>14,.0f} rows/s  ({elapsed:.3f}s)")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--distinct', type=int, default=50_000, help='distinct timestamps per manifest')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    for fmt in LEGACY_FORMATS:
+        random.seed(args.seed)
+        values = generate_values(args.rows, fmt, min(args.distinct, args.rows))
+        detected = dates.detect_format(values)
+
+        # Both parsers must agree before their speed means anything
+        sample = values[:1000]
+        assert [legacy_parse(v) for v in sample] == [dates.parse_datetime(v, detected) for v in sample], fmt
+
+        print(f"{fmt!r}: {args.rows:,} rows, detected {detected!r}")
+        before = measure('before (strptime per row)', lambda v: [legacy_parse(x) for x in v], values)
+        measure('no format', lambda v: [dates.parse_datetime(x) for x in v], values)
+        after = measure('detected format', lambda v: [dates.parse_datetime(x, detected) for x in v], values)
+        print(f"  speed-up {before / after:.1f}x\n")
+
+if __name__ == '__main__':
+    main()
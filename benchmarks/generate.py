@@ -0,0 +1,111 @@
+# CTIDashy_Flask/benchmarks/generate.py
+"""Synthetic CTImanifest_*.csv sets for benchmarking.
+
+Writes low/ and high/ directories with one manifest per day. The high side holds
+--overlap of each low-side manifest's rows (in a different order) plus --high-extra
+rows of its own. Run from the repository root:
+
+    python -m benchmarks.generate /tmp/ctidashy-bench --days 7 --rows 100000
+"""
+import os
+import sys
+import csv
+import json
+import random
+import hashlib
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.dates import DATETIME_FORMATS
+from app.ingest import MANIFEST_COLUMNS
+
+# Written next to the manifests so a runner can tell whether a set matches its options
+META_FILE = 'benchmark.json'
+
+FEEDS = ['Mandiant', 'CrowdStrike', 'Recorded_Future', 'AlienVault', 'Abuse_ch',
+         'MISP', 'VirusTotal', 'Proofpoint', 'Talos', 'Spamhaus', 'GreyNoise', 'Shadowserver']
+
+def manifest_rows(rng, day, day_index, rows, feeds, fmt, spread_days, mixed):
+    """Rows of one day's manifest, timestamped up to spread_days before it"""
+    for i in range(rows):
+        stamp = day - timedelta(seconds=rng.randrange(max(1, spread_days) * 86400))
+        row_fmt = rng.choice(DATETIME_FORMATS) if mixed and rng.random() < mixed else fmt
+        md5 = hashlib.md5(f"{day_index}-{i}".encode('ascii')).hexdigest()
+        yield [
+            f"file_{day_index}_{i}.json",
+            rng.choice(feeds),
+            md5.upper() if rng.random() < 0.1 else md5,
+            stamp.strftime(row_fmt),
+            str(rng.randrange(1_000, 5_000_000)),
+            f"uuid-{day_index}-{i}",
+            'N'
+        ]
+
+def write_manifest(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(MANIFEST_COLUMNS)
+        writer.writerows(rows)
+
+def generate(out_dir, days=7, rows=100_000, feeds=8, overlap=0.95, high_extra=0.02,
+             spread_days=1, formats=None, mixed=0.0, seed=1):
+    """Write a manifest set and return its metadata; existing manifests are replaced"""
+    rng = random.Random(seed)
+    formats = formats or DATETIME_FORMATS
+    feed_names = FEEDS[:max(1, min(feeds, len(FEEDS)))]
+    low_dir = os.path.join(out_dir, 'low')
+    high_dir = os.path.join(out_dir, 'high')
+    os.makedirs(low_dir, exist_ok=True)
+    os.makedirs(high_dir, exist_ok=True)
+
+    names = []
+    first_day = datetime(2025, 1, 1)
+    for day_index in range(days):
+        day = first_day + timedelta(days=day_index)
+        name = f"CTImanifest_{day.strftime('%Y%m%d')}.csv"
+        fmt = formats[day_index % len(formats)]
+        low_rows = list(manifest_rows(rng, day, day_index, rows, feed_names, fmt, spread_days, mixed))
+        write_manifest(os.path.join(low_dir, name), low_rows)
+
+        high_rows = rng.sample(low_rows, int(len(low_rows) * overlap))
+        extra = manifest_rows(rng, day, f"{day_index}h", int(rows * high_extra), feed_names, fmt, spread_days, mixed)
+        high_rows.extend(extra)
+        write_manifest(os.path.join(high_dir, name), high_rows)
+        names.append(name)
+        print(f"  {name}: {len(low_rows):,} low / {len(high_rows):,} high rows ({fmt})")
+
+    meta = {
+        'days': days, 'rows': rows, 'feeds': len(feed_names), 'overlap': overlap, 'high_extra': high_extra,
+        'spread_days': spread_days, 'formats': formats, 'mixed': mixed, 'seed': seed,
+        'manifests': names, 'first_day': first_day.strftime('%Y-%m-%d')
+    }
+    with open(os.path.join(out_dir, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+def add_arguments(parser):
+    parser.add_argument('--days', type=int, default=7, help='manifests per side, one per day')
+    parser.add_argument('--rows', type=int, default=100_000, help='rows per low-side manifest')
+    parser.add_argument('--feeds', type=int, default=8, help=f'distinct CTIfeed values (max {len(FEEDS)})')
+    parser.add_argument('--overlap', type=float, default=0.95, help='share of low-side rows also on the high side')
+    parser.add_argument('--high-extra', type=float, default=0.02, help='high-only rows, as a share of --rows')
+    parser.add_argument('--spread-days', type=int, default=1, help='days back a row timestamp can be from its manifest')
+    parser.add_argument('--mixed', type=float, default=0.0,
+                        help='share of rows using a different DateTime format from the rest of their manifest')
+    parser.add_argument('--seed', type=int, default=1)
+
+def options(args):
+    return {'days': args.days, 'rows': args.rows, 'feeds': args.feeds, 'overlap': args.overlap,
+            'high_extra': args.high_extra, 'spread_days': args.spread_days, 'mixed': args.mixed, 'seed': args.seed}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('out_dir')
+    add_arguments(parser)
+    args = parser.parse_args()
+    generate(args.out_dir, **options(args))
+
+if __name__ == '__main__':
+    main()
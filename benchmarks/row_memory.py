@@ -0,0 +1,75 @@
+# CTIDashy_Flask/benchmarks/row_memory.py
+"""Memory per parsed manifest row.
+
+Parses a synthetic manifest with the dict per row the readers used before
+app.ingest.ManifestRow, then with ManifestRow, and reports the bytes each keeps
+alive per row. Run from the repository root:
+
+    python -m benchmarks.row_memory --rows 200000
+"""
+import os
+import io
+import csv
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import ingest
+from benchmarks import generate
+
+def legacy_parse(data):
+    """The rows read_manifest_file returned before ManifestRow existed"""
+    rows = []
+    reader = csv.reader(io.StringIO(data.decode('utf-8')))
+    next(reader, None)
+    for row in reader:
+        if len(row) >= 7:
+            rows.append(dict(zip(ingest.MANIFEST_COLUMNS, row)))
+    return rows
+
+def manifest_bytes(rows, feeds, seed):
+    rng = random.Random(seed)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(ingest.MANIFEST_COLUMNS)
+    writer.writerows(generate.manifest_rows(rng, datetime(2025, 1, 1), 0, rows, generate.FEEDS[:feeds],
+                                            '%Y-%m-%d %H:%M:%S', 1, 0.0))
+    return buffer.getvalue().encode('utf-8')
+
+def measure(label, func, data):
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = func(data)
+    elapsed = time.perf_counter() - started
+    kept, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_row = kept / len(rows)
+    print(f"  {label:<24} {per_row:>8,.0f} bytes/row  {kept / (1024 * 1024):>8,.1f} MB  ({elapsed:.3f}s traced)")
+    del rows
+    return per_row
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--feeds', type=int, default=8, help=f'distinct CTIfeed values (max {len(generate.FEEDS)})')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    data = manifest_bytes(args.rows, max(1, min(args.feeds, len(generate.FEEDS))), args.seed)
+
+    # Both readers must agree before their size means anything
+    sample = data[:data.find(b'\n', 100_000) + 1]
+    assert legacy_parse(sample) == [row.as_dict() for row in ingest._parse_lines(sample, skip_header=True)]
+
+    print(f"{args.rows:,} rows, {len(data) / (1024 * 1024):.1f} MB of CSV")
+    before = measure('before (dict per row)', legacy_parse, data)
+    after = measure('ManifestRow', lambda d: ingest._parse_lines(d, skip_header=True), data)
+    print(f"  {1 - after / before:.0%} less memory per row")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+# CTIDashy_Flask/benchmarks/run.py
+"""End-to-end benchmarks of the manifest and resend endpoints.
+
+Generates a synthetic manifest set (see benchmarks.generate), then times each
+scenario through the Flask test client: one cold request followed by --repeat warm
+ones. Every scenario runs in its own process with empty caches, so its peak RSS is
+its own. Run from the repository root:
+
+    python -m benchmarks.run --rows 100000 --days 7 --save bench.json
+    python -m benchmarks.run --rows 100000 --days 7 --baseline bench.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+
+try:
+    import resource
+except ImportError:
+    # Windows: peak RSS is not reported
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import generate
+
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), 'ctidashy-bench')
+
+# Page size the UI requests, so paged endpoints are timed as a user sees them
+PAGE_SIZE = 500
+
+# Seconds between polls of a background job
+JOB_POLL_SECONDS = 0.01
+
+SCENARIOS = ['compare_manifests', 'compare_all_manifests', 'search_manifest', 'filter_files', 'bulk_resend']
+
+class Workload:
+    """One scenario process: the app pointed at the benchmark set with its caches in a temp dir"""
+
+    def __init__(self, data_dir, meta, work_dir):
+        import app.config
+        import app.columnar
+        import app.compare_cache
+        import app.jobs
+        import app.manifest_index
+        import app.resend_ledger
+
+        self.meta = meta
+        self.names = meta['manifests']
+        self.resend_folder = os.path.join(work_dir, 'resend_queue')
+        cache_dir = os.path.join(work_dir, 'cache')
+        os.makedirs(cache_dir)
+
+        app.columnar.COLUMNAR_DIR = os.path.join(cache_dir, 'columnar')
+        app.compare_cache.CACHE_FILE = os.path.join(cache_dir, 'compare_cache.db')
+        app.jobs.JOBS_DIR = os.path.join(cache_dir, 'jobs')
+        app.manifest_index.INDEX_FILE = os.path.join(cache_dir, 'manifest_index.db')
+        app.resend_ledger.LEDGER_FILE = os.path.join(work_dir, 'resend_ledger.db')
+        app.config.CONFIG_FILE = os.path.join(work_dir, 'config.json')
+        with open(app.config.CONFIG_FILE, 'w', encoding='utf-8') as f:
+            json.dump({
+                'low_side_manifest_dir': os.path.join(data_dir, 'low'),
+                'high_side_manifest_dir': os.path.join(data_dir, 'high'),
+                'resend_manifest_dir': os.path.join(data_dir, 'low'),
+                'resend_folder': self.resend_folder,
+                # Every repeat resends the same hashes
+                'resend_dedupe_days': 0,
+                'watcher_enabled': False
+            }, f)
+
+        from app import app as flask_app
+        self.client = flask_app.test_client()
+
+    def post(self, url, body):
+        response = self.client.post(url, json=body)
+        if response.status_code not in (200, 202):
+            raise RuntimeError(f"{url} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response.get_json()
+
+    def wait(self, job_id):
+        while True:
+            state = self.client.get(f"/jobs/{job_id}?limit=0").get_json()['job']
+            if state['status'] in ('completed', 'failed', 'cancelled'):
+                if state['status'] != 'completed':
+                    raise RuntimeError(f"Job {job_id} {state['status']}: {state.get('error')}")
+                return state
+            time.sleep(JOB_POLL_SECONDS)
+
+    @property
+    def middle(self):
+        return self.names[len(self.names) // 2]
+
+    # Each scenario makes one request (and waits for its job) and returns the rows it covered
+
+    def compare_manifests(self):
+        self.post('/compare_manifests', {'source_file': self.middle, 'target_file': self.middle, 'limit': PAGE_SIZE})
+        return self.meta['rows']
+
+    def compare_all_manifests(self):
+        self.wait(self.post('/compare_all_manifests', {})['job_id'])
+        return self.meta['rows'] * len(self.names)
+
+    def search_manifest(self):
+        # Found in one manifest, so every manifest has to be searched
+        day_index = len(self.names) // 2
+        md5 = hashlib.md5(f"{day_index}-{self.meta['rows'] // 2}".encode('ascii')).hexdigest()
+        results = self.post('/search_manifest', {'search_term': md5, 'limit': PAGE_SIZE})['results']
+        if not results:
+            raise RuntimeError(f"search_manifest did not find {md5}")
+        return self.meta['rows'] * len(self.names)
+
+    def _criteria(self):
+        # One day of the set and one feed, close to what an analyst asks for
+        day = datetime.strptime(self.meta['first_day'], '%Y-%m-%d') + timedelta(days=len(self.names) // 2)
+        return {'manifest_files': [], 'date_from': day.strftime('%Y-%m-%d'), 'date_to': day.strftime('%Y-%m-%d'),
+                'feed_filter': generate.FEEDS[0]}
+
+    def filter_files(self):
+        self.post('/filter_files', {**self._criteria(), 'limit': PAGE_SIZE})
+        return self.meta['rows'] * len(self.names)
+
+    def bulk_resend(self):
+        # Requests left by the previous run would be skipped as already queued
+        shutil.rmtree(self.resend_folder, ignore_errors=True)
+        job = self.wait(self.post('/bulk_resend', {'criteria': {'manifest_files': [self.middle]}})['job_id'])
+        return job['progress']['total']
+
+def percentile(values, percent):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def run_scenario(name, data_dir, repeat):
+    """Time one scenario in this process and return its result"""
+    # Log lines written per request would be timed along with the work
+    logging.disable(logging.INFO)
+    with open(os.path.join(data_dir, generate.META_FILE), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+
+    work_dir = tempfile.mkdtemp(prefix='ctidashy-bench-')
+    try:
+        workload = Workload(data_dir, meta, work_dir)
+        scenario = getattr(workload, name)
+        timings = []
+        rows = 0
+        for _ in range(repeat + 1):
+            start = time.perf_counter()
+            rows = scenario()
+            timings.append((time.perf_counter() - start) * 1000)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    cold, warm = timings[0], timings[1:] or timings
+    return {
+        'rows': rows,
+        'cold_ms': round(cold, 1),
+        'p50_ms': round(percentile(warm, 50), 1),
+        'p95_ms': round(percentile(warm, 95), 1),
+        'mean_ms': round(sum(warm) / len(warm), 1),
+        'rows_per_second': round(rows / (percentile(warm, 50) / 1000)) if rows else None,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+def prepare_data(data_dir, options):
+    """Generate the manifest set unless data_dir already holds one made with these options"""
+    meta_path = os.path.join(data_dir, generate.META_FILE)
+    if os.path.exists(meta_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if all(meta.get(key) == value for key, value in options.items()):
+            return meta
+        # Only the generated manifests are removed, a set with fewer days must not keep the old ones
+        for side in ('low', 'high'):
+            shutil.rmtree(os.path.join(data_dir, side), ignore_errors=True)
+    print(f"Generating manifests in {data_dir}")
+    return generate.generate(data_dir, **options)
+
+def print_results(results, baseline=None):
+    header = f"{'scenario':<24}{'cold ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'rows/s':>14}{'peak MB':>10}"
+    print(header + ('    vs baseline p50' if baseline else ''))
+    for name, result in results.items():
+        line = (f"{name:<24}{result['cold_ms']:>10,.1f}{result['p50_ms']:>10,.1f}{result['p95_ms']:>10,.1f}"
+                f"{result['rows_per_second'] or 0:>14,}{result['peak_rss_mb'] or 0:>10,.1f}")
+        previous = (baseline or {}).get(name)
+        if previous:
+            line += f"    {(result['p50_ms'] / previous['p50_ms'] - 1) * 100:+.1f}%"
+        print(line)
+
+def regressions(results, baseline, tolerance):
+    """Scenarios whose p50 is more than tolerance slower than in the baseline"""
+    return [name for name, result in results.items()
+            if name in baseline and result['p50_ms'] > baseline[name]['p50_ms'] * (1 + tolerance)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data', default=DEFAULT_DATA_DIR, help='where the manifest set is generated and reused')
+    parser.add_argument('--repeat', type=int, default=5, help='warm runs per scenario, after the cold one')
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, help='run only these (repeatable)')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against results saved with --save; exits 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='p50 slow-down allowed against the baseline')
+    parser.add_argument('--only', choices=SCENARIOS, help=argparse.SUPPRESS)
+    generate.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.only:
+        # Child process started below: print one scenario's result as JSON
+        print(json.dumps(run_scenario(args.only, args.data, args.repeat)))
+        return
+
+    meta = prepare_data(args.data, generate.options(args))
+    print(f"{meta['days']} manifests x {meta['rows']:,} rows, {args.repeat} warm runs per scenario\n")
+
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.run', '--only', name, '--data', args.data, '--repeat', str(args.repeat)],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+        )
+        if output.returncode != 0:
+            print(f"{name} failed:\n{output.stderr[-2000:]}")
+            sys.exit(1)
+        results[name] = json.loads(output.stdout.strip().splitlines()[-1])
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        if saved['dataset'] != meta:
+            print('Warning: the baseline was run on a different manifest set\n')
+        baseline = saved['scenarios']
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'repeat': args.repeat,
+                'dataset': meta,
+                'scenarios': results
+            }, f, indent=2)
+        print(f"\nSaved to {args.save}")
+
+    if baseline:
+        slower = regressions(results, baseline, args.tolerance)
+        if slower:
+            print(f"\nRegressed by more than {args.tolerance:.0%}: {', '.join(slower)}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 from app import app
+from app.watcher import start_watcher
 import os
 
 def get_version():
@@ -16,6 +17,9 @@ def get_version():
 def inject_version():
     return dict(version=get_version())
 
+# Every worker starts one; only the worker holding the watcher lock does the work
+start_watcher()
+
 if __name__ == '__main__':
     print(f"Starting CTIDashy Flask App - Version: {get_version()}")
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file